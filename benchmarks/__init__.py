@@ -0,0 +1,5 @@
+""" Benchmarks
+
+	python -m benchmarks.bench_generate
+
+"""
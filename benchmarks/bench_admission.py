@@ -0,0 +1,56 @@
+""" Cost of turning away abusive token requests: full load_auth_code()/solve() vs AdmissionControl rejections
+
+	python -m benchmarks.bench_admission
+
+	'abusive client' replays a tampered auth code and a wrong verifier, every request fails.
+	Without admission each one decrypts or hashes, with it the client is over its bucket after
+	a few failures and the rest are rejected by a dict lookup. 'admitted request' is the overhead
+	added to a good request.
+
+"""
+
+import pkce
+from benchmarks.common import ops_per_sec, report
+
+N = 5000
+
+
+def load_unchecked(auth_code):
+	try:
+		pkce.load_auth_code(auth_code)
+	except Exception:
+		pass
+
+
+def load_admitted(admission, auth_code, client_id):
+	try:
+		admission.load_auth_code(auth_code, client_id=client_id)
+	except Exception:
+		pass
+
+
+if __name__ == '__main__':
+	from cryptography.fernet import Fernet
+	pkce.configure(fernet_key=Fernet.generate_key(), verbose=False)
+	pixy = pkce.generate()
+	auth_code = pkce.create_auth_code(code_challenge=pixy.code_challenge, code_challenge_method='S256', client_id='mrsimple')
+	tampered = auth_code[:-8] + 'AAAAAAAA'
+	wrong_verifier = pkce.make_verifier()
+	admission = pkce.AdmissionControl()
+
+	print("abusive client, requests turned away per second")
+	base = ops_per_sec(lambda: load_unchecked(tampered), N // 5)
+	report('load_auth_code() failing', base, 'requests/s')
+	report('AdmissionControl.load_auth_code()', ops_per_sec(lambda: load_admitted(admission, tampered, 'abuser'), N * 20), 'requests/s', base)
+	base = ops_per_sec(lambda: pkce.solve(wrong_verifier, pixy.code_challenge, 'S256'), N * 4)
+	report('solve() failing', base, 'requests/s')
+	report('AdmissionControl.solve()', ops_per_sec(lambda: admission.solve(wrong_verifier, pixy.code_challenge, 'S256', client_id='abuser'), N * 20), 'requests/s', base)
+
+	print("\nadmitted request overhead")
+	open_admission = pkce.AdmissionControl(client_rate=1e9, client_burst=1e9, code_attempts=10**9)
+	base = ops_per_sec(lambda: pkce.solve(pixy.code_verifier, pixy.code_challenge, 'S256'), N * 4)
+	report('solve()', base, 'requests/s')
+	report('AdmissionControl.solve()', ops_per_sec(lambda: open_admission.solve(pixy.code_verifier, pixy.code_challenge, 'S256',
+		client_id='mrsimple', auth_code=auth_code), N * 4), 'requests/s', base)
+	report('admit() alone', ops_per_sec(lambda: open_admission.admit('mrsimple', auth_code), N * 20), 'requests/s')
+	print(f"\n{admission.stats()}")
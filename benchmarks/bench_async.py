@@ -0,0 +1,68 @@
+""" Event loop latency while serving token requests: sync pkce calls vs the *_async variants
+
+	A ticker task sleeps 1ms in a loop and records how late it wakes up, while N concurrent
+	requests each run load_auth_code() + solve().
+
+	export FERNET_KEY=...
+	python -m benchmarks.bench_async
+
+"""
+
+import asyncio
+import time
+
+import pkce
+
+N = 2000
+
+
+def percentile(samples, q):
+	samples = sorted(samples)
+	return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+async def measure(handler, requests):
+	lags = []
+	done = asyncio.Event()
+
+	async def ticker():
+		while not done.is_set():
+			start = time.perf_counter()
+			await asyncio.sleep(0.001)
+			lags.append(time.perf_counter() - start - 0.001)
+
+	tick = asyncio.create_task(ticker())
+	await asyncio.sleep(0.01)
+	start = time.perf_counter()
+	await asyncio.gather(*(handler(*request) for request in requests))
+	elapsed = time.perf_counter() - start
+	done.set()
+	await tick
+	return N / elapsed, lags
+
+
+async def sync_handler(auth_code, code_verifier):
+	payload = pkce.load_auth_code(auth_code)
+	return pkce.solve(code_verifier, payload['code_challenge'], payload['code_challenge_method'])
+
+
+async def async_handler(auth_code, code_verifier):
+	payload = await pkce.load_auth_code_async(auth_code)
+	return await pkce.solve_async(code_verifier, payload['code_challenge'], payload['code_challenge_method'])
+
+
+async def main():
+	requests = [
+		(pkce.create_auth_code(code_challenge=pixy.code_challenge, code_challenge_method='S256'), pixy.code_verifier)
+		for pixy in pkce.generate_many(N)
+	]
+	print(f"{N} concurrent token requests")
+	print(f"{'':<20} {'requests/s':>12} {'lag p50 ms':>12} {'lag p99 ms':>12} {'lag max ms':>12}")
+	for name, handler in (('sync calls', sync_handler), ('async calls', async_handler)):
+		rate, lags = await measure(handler, requests)
+		lags = [lag * 1000 for lag in lags] or [0.0]
+		print(f"{name:<20} {rate:>12,.0f} {percentile(lags, 0.5):>12.2f} {percentile(lags, 0.99):>12.2f} {max(lags):>12.2f}")
+
+
+if __name__ == '__main__':
+	asyncio.run(main())
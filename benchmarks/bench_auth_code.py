@@ -0,0 +1,76 @@
+""" Codes per second: the old per-call create_auth_code()/load_auth_code() vs AuthCodeCodec,
+	and code length and throughput of the 'fernet' vs 'compact' code formats.
+
+	export FERNET_KEY=...
+	python -m benchmarks.bench_auth_code
+
+"""
+
+from copy import deepcopy
+
+import pkce
+from benchmarks.common import ops_per_sec, report
+from cryptography.fernet import Fernet
+
+KEY = Fernet.generate_key()
+CLAIMS = {
+	'code_challenge': pkce.generate().code_challenge,
+	'code_challenge_method': 'S256',
+	'client_id': 'mrsimple',
+	'redirect_uri': 'http://127.0.0.1:5007/auth/callback',
+	'scope': 'openid profile',
+	'state': pkce.short_code(),
+	'nonce': pkce.make_code(),
+}
+
+
+def old_create_auth_code(**kwargs):
+	""" create_auth_code() before AuthCodeCodec, imports, key check, Fernet and deepcopy on every call.
+	"""
+	from jose import jwt
+	from cryptography.fernet import Fernet
+	assert KEY
+	f = Fernet(KEY)
+	to_encode = deepcopy(kwargs)
+	timenow = jwt.datetime.utcnow()
+	to_encode.update({'exp': timenow + jwt.timedelta(minutes=5)})
+	to_encode.update({'iat': timenow})
+	to_encode.update({'aud': "auth_code"})
+	token = jwt.encode(to_encode, KEY.decode(), 'HS256')
+	return f.encrypt(token.encode()).decode()
+
+
+def old_load_auth_code(auth_code, audience="auth_code"):
+	from jose import jwt
+	from cryptography.fernet import Fernet
+	assert KEY
+	f = Fernet(KEY)
+	token = f.decrypt(auth_code.encode()).decode()
+	payload = jwt.decode(token, KEY.decode(), algorithms=['HS256'], audience="auth_code")
+	assert payload.get('aud') == audience, 'Wrong aud'
+	return payload
+
+
+if __name__ == '__main__':
+	N = 2000
+	codec = pkce.AuthCodeCodec(KEY)
+	auth_code = codec.encode(CLAIMS)
+
+	print("codes per second")
+	base = ops_per_sec(lambda: old_create_auth_code(**CLAIMS), N)
+	report('create_auth_code (before)', base, 'codes/s')
+	report('AuthCodeCodec.encode', ops_per_sec(lambda: codec.encode(CLAIMS), N), 'codes/s', base)
+	base = ops_per_sec(lambda: old_load_auth_code(auth_code), N)
+	report('load_auth_code (before)', base, 'codes/s')
+	report('AuthCodeCodec.decode', ops_per_sec(lambda: codec.decode(auth_code), N), 'codes/s', base)
+
+	compact = codec.encode(CLAIMS, code_format='compact')
+	print("\ncode formats")
+	print(f"{'fernet length':<40} {len(auth_code):>14} chars")
+	print(f"{'compact length':<40} {len(compact):>14} chars")
+	base = ops_per_sec(lambda: codec.encode(CLAIMS), N)
+	report('fernet encode', base, 'codes/s')
+	report('compact encode', ops_per_sec(lambda: codec.encode(CLAIMS, code_format='compact'), N), 'codes/s', base)
+	base = ops_per_sec(lambda: codec.decode(auth_code), N)
+	report('fernet decode', base, 'codes/s')
+	report('compact decode', ops_per_sec(lambda: codec.decode(compact), N), 'codes/s', base)
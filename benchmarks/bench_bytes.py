@@ -0,0 +1,36 @@
+""" str vs bytes input for solve(), make_challenge() and the verifier charset check
+
+	python -m benchmarks.bench_bytes
+
+"""
+
+import pkce
+from pkce.pkce import CODE_VERIFIER_PATTERN, _verifier_bytes
+from benchmarks.common import ops_per_sec, report
+
+N = 200_000
+
+pixy = pkce.generate()
+verifier, challenge = pixy.code_verifier, pixy.code_challenge
+raw_verifier, raw_challenge = verifier.encode(), challenge.encode()
+
+
+if __name__ == '__main__':
+	print("charset check")
+	base = ops_per_sec(lambda: CODE_VERIFIER_PATTERN.match(verifier), N)
+	report('regex, str', base)
+	report('byte table, str', ops_per_sec(lambda: _verifier_bytes(verifier), N), baseline=base)
+	report('byte table, bytes', ops_per_sec(lambda: _verifier_bytes(raw_verifier), N), baseline=base)
+
+	print("make_challenge()")
+	base = ops_per_sec(lambda: pkce.make_challenge(verifier), N)
+	report('str', base)
+	report('bytes', ops_per_sec(lambda: pkce.make_challenge(raw_verifier), N), baseline=base)
+
+	print("solve()")
+	base = ops_per_sec(lambda: pkce.solve(raw_verifier.decode(), raw_challenge.decode(), 'S256'), N)
+	report('bytes decoded to str by the caller', base)
+	report('str', ops_per_sec(lambda: pkce.solve(verifier, challenge, 'S256'), N), baseline=base)
+	report('bytes', ops_per_sec(lambda: pkce.solve(raw_verifier, raw_challenge, 'S256'), N), baseline=base)
+	view = memoryview(b'code_verifier=' + raw_verifier)[14:]
+	report('memoryview', ops_per_sec(lambda: pkce.solve(view, raw_challenge, 'S256'), N), baseline=base)
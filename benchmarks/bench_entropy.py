@@ -0,0 +1,69 @@
+""" Entropy syscalls and throughput: os.urandom() per call vs pkce.BufferedEntropy
+
+	python -m benchmarks.bench_entropy
+
+	'syscalls / 1k calls' counts the os.urandom() calls (one getrandom() each) of 10,000 calls to
+	each helper, from a new source, by wrapping os.urandom where secrets and pkce.entropy call it.
+
+"""
+
+import os
+import random
+
+import pkce
+import pkce.entropy
+from benchmarks.common import ops_per_sec, report
+
+N = 50_000
+HELPERS = {
+	'make_verifier()': pkce.make_verifier,
+	'make_code()': pkce.make_code,
+	'short_code()': pkce.short_code,
+	'generate()': pkce.generate,
+}
+
+
+def count_syscalls(fn, number=10_000):
+	count = 0
+
+	def counting_urandom(n):
+		nonlocal count
+		count += 1
+		return os.urandom(n)
+
+	saved = random._urandom, pkce.entropy.urandom
+	random._urandom = pkce.entropy.urandom = counting_urandom  #> secrets.token_bytes() goes through random._urandom
+	try:
+		for _ in range(number):
+			fn()
+	finally:
+		random._urandom, pkce.entropy.urandom = saved
+	return count * 1000 / number
+
+
+if __name__ == '__main__':
+	sources = {'os.urandom()': False, 'BufferedEntropy': pkce.BufferedEntropy()}
+	rates = {}
+	print(f"{'':<40} {'calls/s':>14}          {'syscalls / 1k calls':>20}")
+	for name, fn in HELPERS.items():
+		for source_name, source in sources.items():
+			pkce.configure(entropy=source)
+			rate = ops_per_sec(fn, N)
+			pkce.configure(entropy=source and pkce.BufferedEntropy())
+			syscalls = count_syscalls(fn)
+			base = rates.setdefault(name, rate)
+			speedup = f"x{rate / base:.2f}" if base is not rate else ''
+			print(f"{name + ' ' + source_name:<40} {rate:>14,.0f} {speedup:>8} {syscalls:>20,.1f}")
+	pkce.configure(entropy=False)
+
+	print("\nraw bytes, MB/s")
+	block = 1 << 16
+	base = ops_per_sec(lambda: os.urandom(block), 2000) * block / 1e6
+	report('os.urandom(64KiB)', base, 'MB/s')
+	entropy = pkce.BufferedEntropy()
+	report('BufferedEntropy.take(64KiB)', ops_per_sec(lambda: entropy.take(block), 2000) * block / 1e6, 'MB/s', base)
+	seeded = pkce.BufferedEntropy(seed=b'bench')
+	report('BufferedEntropy(seed=) SHAKE-256', ops_per_sec(lambda: seeded.take(block), 2000) * block / 1e6, 'MB/s', base)
+	base = ops_per_sec(lambda: os.urandom(96), N)
+	report('os.urandom(96)', base, 'calls/s')
+	report('BufferedEntropy.take(96)', ops_per_sec(lambda: entropy.take(96), N), 'calls/s', base)
@@ -0,0 +1,33 @@
+""" Pairs per second: pkce.generate() in a loop vs pkce.generate_many(n)
+
+	python -m benchmarks.bench_generate
+
+"""
+
+import pkce
+from benchmarks.common import ops_per_sec, report
+
+N = 10_000
+
+
+def loop():
+	generate = pkce.generate
+	for _ in range(N):
+		generate()
+
+
+def batch():
+	pkce.generate_many(N)
+
+
+def batch_iter():
+	for _ in pkce.generate_many(N):
+		pass
+
+
+if __name__ == '__main__':
+	print(f"pairs per second (n={N})")
+	base = ops_per_sec(loop, 1) * N
+	report('generate() loop', base, 'pairs/s')
+	report('generate_many(n)', ops_per_sec(batch, 1) * N, 'pairs/s', base)
+	report('generate_many(n) + iterate Pixy', ops_per_sec(batch_iter, 1) * N, 'pairs/s', base)
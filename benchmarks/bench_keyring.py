@@ -0,0 +1,33 @@
+""" Load latency as the number of keys grows: MultiFernet vs KeyRing key id lookup
+
+	python -m benchmarks.bench_keyring
+
+	The code was encrypted with the oldest key, the worst case for MultiFernet which tries
+	every key in turn. 'KeyRing lookup + decrypt' is the same Fernet work after the key id lookup,
+	codec.decode() adds the jwt decode on top.
+
+"""
+
+from cryptography.fernet import Fernet, MultiFernet
+
+import pkce
+from benchmarks.common import ops_per_sec, report
+
+N = 2000
+
+
+if __name__ == '__main__':
+	claims = {'code_challenge': pkce.generate().code_challenge, 'code_challenge_method': 'S256', 'client_id': 'mrsimple'}
+	for count in (1, 4, 16, 64):
+		keys = [Fernet.generate_key() for _ in range(count)]
+		ring = pkce.KeyRing({f'k{i}': key for i, key in enumerate(keys)}, primary='k0', ttl=300)
+		codec = pkce.AuthCodeCodec(ring)
+		auth_code = codec.encode(claims)
+		kid, _, body = auth_code.encode().partition(b'.')
+		multi = MultiFernet([Fernet(key) for key in reversed(keys)])  #> newest first, as after rotations
+
+		print(f"{count} keys, loads per second")
+		base = ops_per_sec(lambda: multi.decrypt(body), N)
+		report('MultiFernet.decrypt()', base, 'loads/s')
+		report('KeyRing lookup + decrypt', ops_per_sec(lambda: ring.get(kid).fernet.decrypt(body), N), 'loads/s', base)
+		report('KeyRing codec.decode()', ops_per_sec(lambda: codec.decode(auth_code), N), 'loads/s')
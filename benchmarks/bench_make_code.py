@@ -0,0 +1,33 @@
+""" Codes per second: the old regex make_code() vs the rejection sampling make_code() and make_codes()
+
+	python -m benchmarks.bench_make_code
+
+"""
+
+import re
+import base64
+from os import urandom
+
+import pkce
+from benchmarks.common import ops_per_sec, report
+
+N = 20_000
+
+
+def old_make_code(n: int = 43):
+	""" make_code() before rejection sampling, urandom(n*2), base64 and a regex, can come out short.
+	"""
+	n = 128 if not isinstance(n, int) else n
+	n = 128 if not 43 <= n <= 128 else n
+	short_code_raw = base64.urlsafe_b64encode(urandom(n*2)).decode('utf-8')
+	short_code = re.sub('[^a-zA-Z0-9]+', '', short_code_raw)
+	return short_code[:n]
+
+
+if __name__ == '__main__':
+	for n in (43, 128):
+		print(f"codes per second (n={n})")
+		base = ops_per_sec(lambda: old_make_code(n), N)
+		report('make_code() (regex)', base, 'codes/s')
+		report('make_code()', ops_per_sec(lambda: pkce.make_code(n), N), 'codes/s', base)
+		report('make_codes(1000)', ops_per_sec(lambda: pkce.make_codes(1000, n), N // 1000) * 1000, 'codes/s', base)
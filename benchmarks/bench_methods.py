@@ -0,0 +1,47 @@
+""" Challenge method dispatch: the make_challenge() closure and dict built per call vs the registry lookup
+
+	python -m benchmarks.bench_methods
+
+	old_make_challenge() is make_challenge() before the registry, it defines sha256_method and the
+	challenge_function dict on every call and checks the method twice.
+
+"""
+
+import base64
+import hashlib
+
+import pkce
+from benchmarks.common import ops_per_sec, report
+
+N = 100_000
+
+
+def old_make_challenge(code_verifier, code_challenge_method="S256"):
+	def sha256_method(code_verifier: bytes) -> str:
+		hashed_verifier = hashlib.sha256(code_verifier).digest()
+		encoded_verifier = base64.urlsafe_b64encode(hashed_verifier)
+		return encoded_verifier.decode('ascii').rstrip('=')
+
+	challenge_function = {
+		"S256": sha256_method,
+		"plain": lambda code_verifier: code_verifier.decode('ascii'),
+	}
+	pkce._check_verifier(code_verifier)
+	pkce._check_method(code_challenge_method, ['S256', 'plain'])
+	return challenge_function.get(code_challenge_method)(pkce.pkce._verifier_bytes(code_verifier))
+
+
+if __name__ == '__main__':
+	verifier = pkce.make_verifier()
+	for method in ('S256', 'plain'):
+		print(f"make_challenge({method})")
+		base = ops_per_sec(lambda: old_make_challenge(verifier, method), N)
+		report('closure + dict per call', base, 'calls/s')
+		report('registry lookup', ops_per_sec(lambda: pkce.make_challenge(verifier, method), N), 'calls/s', base)
+
+	print("solve() with each registered method")
+	for method, transform in (('S256', None), ('plain', None), ('S512', pkce.sha512_transform), ('B2B', pkce.blake2b_transform)):
+		if transform is not None:
+			pkce.register_method(method, transform)
+		pixy = pkce.generate(method)
+		report(f"solve({method})", ops_per_sec(lambda: pkce.solve(*pixy.tuple()), N), 'calls/s')
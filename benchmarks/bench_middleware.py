@@ -0,0 +1,192 @@
+""" Token endpoint load test: ASGI/WSGITokenMiddleware vs a naive framework level handler
+
+	python -m benchmarks.bench_middleware [requests] [concurrency]
+
+	Requests are driven in process, without sockets, so only the endpoint work is measured.
+	One in four requests has a wrong verifier. Bodies arrive in 128 byte chunks.
+
+	naive: collect the whole body, parse_qs() every field, then load_auth_code(), compare()
+	and solve() on the event loop, json.dumps() each error. 'loop lag' is the worst delay of a
+	1ms timer running next to the load, the time the event loop was blocked.
+
+"""
+
+import io
+import sys
+import json
+import time
+import asyncio
+from urllib.parse import urlencode, parse_qs
+
+import pkce
+from benchmarks.common import report
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+CHUNK = 128
+HEADERS = [(b'content-type', b'application/x-www-form-urlencoded')]
+
+
+def make_bodies(codec, n):
+	bodies = []
+	for i in range(n):
+		pixy = pkce.generate()
+		code = codec.encode(code_challenge=pixy.code_challenge, code_challenge_method='S256', client_id='mrsimple', redirect_uri='https://a.b/cb')
+		verifier = pixy.code_verifier if i % 4 else pkce.make_verifier()
+		bodies.append(urlencode({'grant_type': 'authorization_code', 'code': code, 'code_verifier': verifier,
+			'client_id': 'mrsimple', 'redirect_uri': 'https://a.b/cb', 'scope': 'openid profile'}).encode())
+	return bodies
+
+
+async def issue_tokens(scope, receive, send):
+	await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'application/json')]})
+	await send({'type': 'http.response.body', 'body': b'{"access_token":"x","token_type":"Bearer"}'})
+
+
+def naive_asgi(codec, replay_store):
+	async def app(scope, receive, send):
+		body = b''
+		while True:
+			message = await receive()
+			body += message.get('body', b'')
+			if not message.get('more_body'):
+				break
+		form = {name: values[0] for name, values in parse_qs(body.decode()).items()}
+		try:
+			payload = codec.decode(form['code'], replay_store=replay_store)
+			if not (pkce.compare(payload['client_id'], form.get('client_id')) and pkce.compare(payload['redirect_uri'], form.get('redirect_uri'))):
+				raise pkce.InvalidAuthCode()
+			result = pkce.solve(form.get('code_verifier'), payload['code_challenge'], payload['code_challenge_method'])
+		except pkce.InvalidAuthCode as e:
+			result = e.response
+		if result is not True:
+			error = json.dumps(result).encode()
+			await send({'type': 'http.response.start', 'status': 400, 'headers': [(b'content-type', b'application/json')]})
+			await send({'type': 'http.response.body', 'body': error})
+			return
+		await issue_tokens(scope, receive, send)
+	return app
+
+
+async def drive(app, bodies):
+	scope = {'type': 'http', 'path': '/token', 'method': 'POST', 'headers': HEADERS}
+	latencies = []
+	statuses = {}
+	pending = iter(bodies)
+	lag = 0.0
+	running = True
+
+	async def ticker():
+		nonlocal lag
+		while running:
+			start = time.perf_counter()
+			await asyncio.sleep(0.001)
+			lag = max(lag, time.perf_counter() - start - 0.001)
+
+	async def worker():
+		for body in pending:
+			chunks = [body[i:i + CHUNK] for i in range(0, len(body), CHUNK)]
+			index = 0
+
+			async def receive():
+				nonlocal index
+				await asyncio.sleep(0)  #> the next chunk arrives later
+				index += 1
+				return {'type': 'http.request', 'body': chunks[index - 1], 'more_body': index < len(chunks)}
+
+			async def send(message):
+				if message['type'] == 'http.response.start':
+					statuses[message['status']] = statuses.get(message['status'], 0) + 1
+
+			start = time.perf_counter()
+			await app(scope, receive, send)
+			latencies.append(time.perf_counter() - start)
+
+	tick = asyncio.ensure_future(ticker())
+	start = time.perf_counter()
+	await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+	elapsed = time.perf_counter() - start
+	running = False
+	await tick
+	latencies.sort()
+	return len(bodies) / elapsed, latencies[int(0.99 * len(latencies))], lag, statuses
+
+
+def wsgi_rate(make_app, bodies, repeat=3):
+	""" Best of 'repeat' runs, each with a new app and replay store.
+	"""
+	best = float('inf')
+	for _ in range(repeat):
+		app = make_app()
+		start = time.perf_counter()
+		for body in bodies:
+			environ = {'PATH_INFO': '/token', 'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+				'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body)}
+			b''.join(app(environ, lambda status, headers: None))
+		best = min(best, time.perf_counter() - start)
+	return len(bodies) / best
+
+
+def parse_incremental(body):
+	parser = pkce.FormParser()
+	parser.feed(body)
+	return parser.close()
+
+
+def wsgi_parse_rate(parse, bodies, repeat=5):
+	best = float('inf')
+	for _ in range(repeat):
+		start = time.perf_counter()
+		for body in bodies:
+			parse(body)
+		best = min(best, time.perf_counter() - start)
+	return len(bodies) / best
+
+
+def naive_wsgi(codec, replay_store):
+	def app(environ, start_response):
+		body = environ['wsgi.input'].read(int(environ['CONTENT_LENGTH']))
+		form = {name: values[0] for name, values in parse_qs(body.decode()).items()}
+		try:
+			payload = codec.decode(form['code'], replay_store=replay_store)
+			if not (pkce.compare(payload['client_id'], form.get('client_id')) and pkce.compare(payload['redirect_uri'], form.get('redirect_uri'))):
+				raise pkce.InvalidAuthCode()
+			result = pkce.solve(form.get('code_verifier'), payload['code_challenge'], payload['code_challenge_method'])
+		except pkce.InvalidAuthCode as e:
+			result = e.response
+		if result is not True:
+			start_response('400 Bad Request', [('Content-Type', 'application/json')])
+			return [json.dumps(result).encode()]
+		start_response('200 OK', [('Content-Type', 'application/json')])
+		return [b'{"access_token":"x","token_type":"Bearer"}']
+	return app
+
+
+def wsgi_tokens(environ, start_response):
+	start_response('200 OK', [('Content-Type', 'application/json')])
+	return [b'{"access_token":"x","token_type":"Bearer"}']
+
+
+if __name__ == '__main__':
+	from cryptography.fernet import Fernet
+	codec = pkce.AuthCodeCodec(Fernet.generate_key(), code_format='compact')
+
+	print(f"ASGI, {N:,} requests at concurrency {CONCURRENCY}")
+	print(f"{'':<40} {'requests/s':>14}    {'p99 ms':>7} {'loop lag ms':>11}")
+	for name, app in (
+		('naive handler', naive_asgi(codec, pkce.MemoryReplayStore())),
+		('ASGITokenMiddleware', pkce.ASGITokenMiddleware(issue_tokens, codec=codec, replay_store=pkce.MemoryReplayStore())),
+	):
+		rate, p99, lag, statuses = asyncio.run(drive(app, make_bodies(codec, N)))
+		print(f"{name:<40} {rate:>14,.0f}    {p99 * 1000:>7.2f} {lag * 1000:>11.2f}   {statuses}")
+
+	print(f"\nWSGI, {N:,} requests")
+	bodies = make_bodies(codec, N)
+	base = wsgi_rate(lambda: naive_wsgi(codec, pkce.MemoryReplayStore()), bodies)
+	report('naive handler', base, 'requests/s')
+	report('WSGITokenMiddleware', wsgi_rate(lambda: pkce.WSGITokenMiddleware(wsgi_tokens, codec=codec, replay_store=pkce.MemoryReplayStore()), bodies), 'requests/s', base)
+
+	print("\nform parsing only, bodies per second")
+	base = wsgi_parse_rate(lambda body: {name: values[0] for name, values in parse_qs(body.decode()).items()}, bodies)
+	report('parse_qs', base, 'bodies/s')
+	report('FormParser', wsgi_parse_rate(parse_incremental, bodies), 'bodies/s', base)
@@ -0,0 +1,81 @@
+""" PendingAuthorizationStore: memory per live entry, put/redeem throughput and expiry cost
+
+	python -m benchmarks.bench_pending [entries]
+
+	The naive store is a dict of auth code -> dict of the claims, expired by scanning every entry.
+
+"""
+
+import sys
+import time
+import tracemalloc
+
+import pkce
+from benchmarks.common import ops_per_sec, report
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+
+def entries(n):
+	""" Request bodies as bytes, both stores decode their own strings like a server parsing a form.
+	"""
+	batch = pkce.generate_many(n)
+	codes = pkce.make_codes(n)
+	return [(code.encode(), pixy.code_challenge.encode(), pkce.short_code().encode()) for code, pixy in zip(codes, batch)]
+
+
+def naive_put(store, code, challenge, state, ttl=300):
+	store[code] = {'code_challenge': challenge, 'code_challenge_method': 'S256', 'client_id': 'mrsimple',
+		'redirect_uri': 'https://example.com/callback', 'state': state, 'expires_at': time.time() + ttl}
+
+
+def naive_expire(store):
+	now = time.time()
+	for code in [code for code, entry in store.items() if entry['expires_at'] <= now]:
+		del store[code]
+
+
+def measure_memory(fill):
+	tracemalloc.start()
+	store = fill()
+	size = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	return store, size
+
+
+if __name__ == '__main__':
+	items = entries(N)
+
+	def fill_naive():
+		store = {}
+		for code, challenge, state in items:
+			naive_put(store, code.decode(), challenge.decode(), state.decode())
+		return store
+
+	def fill_pending():
+		store = pkce.PendingAuthorizationStore(ttl=300)
+		for code, challenge, state in items:
+			store.put(code.decode(), challenge.decode(), 'S256', client_id='mrsimple', redirect_uri='https://example.com/callback', state=state.decode())
+		return store
+
+	print(f"memory per live entry ({N:,} entries)")
+	naive, naive_bytes = measure_memory(fill_naive)
+	pending, pending_bytes = measure_memory(fill_pending)
+	print(f"{'dict of dicts':<36} {naive_bytes / N:>10,.0f} bytes/entry")
+	print(f"{'PendingAuthorizationStore':<36} {pending_bytes / N:>10,.0f} bytes/entry  {pending_bytes / naive_bytes:.0%} of the dict")
+
+	print("expire, nothing due")
+	base = ops_per_sec(lambda: naive_expire(naive), 5)
+	report('full scan', base, 'sweeps/s')
+	report('timing wheel', ops_per_sec(pending.expire, 5), 'sweeps/s', base)
+
+	print("put + redeem")
+	store = pkce.PendingAuthorizationStore()
+	pixy = pkce.generate()
+	code = pkce.make_code()
+
+	def round_trip():
+		store.put(code, pixy.code_challenge, 'S256', client_id='mrsimple', redirect_uri='https://example.com/callback', state='xyz')
+		store.redeem(code, pixy.code_verifier)
+
+	report('put + redeem', ops_per_sec(round_trip, 20_000), 'codes/s')
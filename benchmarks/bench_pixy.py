@@ -0,0 +1,61 @@
+""" Pixy memory per instance and dict()/tuple() conversion, the old @dataclass vs the slotted frozen Pixy
+
+	python -m benchmarks.bench_pixy
+
+"""
+
+import tracemalloc
+from dataclasses import dataclass, asdict, astuple
+
+import pkce
+from benchmarks.common import ops_per_sec, report
+
+N = 100_000
+
+
+@dataclass
+class OldPixy:
+	""" Pixy before it was slotted and frozen.
+	"""
+	code_verifier: str
+	code_challenge: str
+	code_challenge_method: str
+
+	def dict(self):
+		return asdict(self)
+
+	def tuple(self):
+		return astuple(self)
+
+	def __iter__(self):
+		return iter(self.__dict__.items())
+
+
+def bytes_per_instance(cls, fields):
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	instances = [cls(*fields) for _ in range(N)]
+	used = tracemalloc.get_traced_memory()[0] - before
+	tracemalloc.stop()
+	del instances
+	return used / N
+
+
+if __name__ == '__main__':
+	fields = pkce.generate().tuple()  #> the strings are shared, only the instances are measured
+	print(f"memory per instance (n={N})")
+	print(f"{'OldPixy (@dataclass)':<40} {bytes_per_instance(OldPixy, fields):>14.0f} bytes")
+	print(f"{'Pixy (slots, frozen)':<40} {bytes_per_instance(pkce.Pixy, fields):>14.0f} bytes")
+
+	old, new = OldPixy(*fields), pkce.Pixy(*fields)
+	print("\nconversions")
+	for name, old_fn, new_fn in (
+		('dict()', old.dict, new.dict),
+		('tuple()', old.tuple, new.tuple),
+		('dict(pixy)', lambda: dict(old), lambda: dict(new)),
+		('solve(**dict(pixy))', lambda: pkce.solve(**dict(old)), lambda: pkce.solve(**dict(new))),
+		('construct', lambda: OldPixy(*fields), lambda: pkce.Pixy(*fields)),
+	):
+		base = ops_per_sec(old_fn, 50_000)
+		report(f"{name} old", base)
+		report(f"{name} new", ops_per_sec(new_fn, 50_000), baseline=base)
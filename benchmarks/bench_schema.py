@@ -0,0 +1,50 @@
+""" Code length and decode time of the 'binary' schema code format vs 'compact' json and 'fernet'
+
+	python -m benchmarks.bench_schema
+
+	'decode + token fields' reads what the token endpoint needs: code_challenge, code_challenge_method,
+	client_id and redirect_uri. 'payload only' is the claims decoding after decryption,
+	json.loads() vs LazyPayload reading the same four fields.
+
+"""
+
+import json
+
+import pkce
+from benchmarks.common import ops_per_sec, report
+from benchmarks.bench_auth_code import KEY, CLAIMS
+
+N = 5000
+TOKEN_FIELDS = ('code_challenge', 'code_challenge_method', 'client_id', 'redirect_uri')
+
+
+def token_fields(payload):
+	return [payload[name] for name in TOKEN_FIELDS]
+
+
+if __name__ == '__main__':
+	codec = pkce.AuthCodeCodec(KEY)
+	claims = {'response_type': 'code', **CLAIMS}
+	codes = {code_format: codec.encode(claims, code_format=code_format) for code_format in pkce.codec.CODE_FORMATS}
+
+	print("code length, 8 claims")
+	for code_format, auth_code in codes.items():
+		report(f"{code_format} length", len(auth_code), 'chars')
+
+	print("\ndecodes per second")
+	base = ops_per_sec(lambda: codec.decode(codes['fernet']), N // 5)
+	report('fernet decode + token fields', base, 'codes/s')
+	base = ops_per_sec(lambda: token_fields(codec.decode(codes['compact'])), N)
+	report('compact decode + token fields', base, 'codes/s')
+	report('binary decode + token fields', ops_per_sec(lambda: token_fields(codec.decode(codes['binary'])), N), 'codes/s', base)
+
+	print("\npayload only, decodes per second")
+	to_encode = {**claims, 'exp': 1700000300, 'iat': 1700000000}
+	text = json.dumps(to_encode, separators=(',', ':')).encode()
+	data = pkce.DEFAULT_SCHEMA.encode(to_encode)
+	print(f"{'json / schema plaintext':<40} {len(text):>7} / {len(data)} bytes")
+	base = ops_per_sec(lambda: token_fields(json.loads(text)), N * 4)
+	report('json.loads + token fields', base, 'payloads/s')
+	report('LazyPayload + token fields', ops_per_sec(lambda: token_fields(pkce.DEFAULT_SCHEMA.decode(data)), N * 4), 'payloads/s', base)
+	report('LazyPayload + exp only', ops_per_sec(lambda: pkce.DEFAULT_SCHEMA.decode(data)['exp'], N * 4), 'payloads/s', base)
+	report('LazyPayload + every field', ops_per_sec(lambda: dict(pkce.DEFAULT_SCHEMA.decode(data)), N * 4), 'payloads/s', base)
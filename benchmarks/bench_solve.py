@@ -0,0 +1,47 @@
+""" solve() per outcome: the old raise/except solve() vs the exception-free solve() and verify()
+
+	python -m benchmarks.bench_solve
+
+"""
+
+import secrets
+
+import pkce
+from pkce.pkce import _check_verifier, _check_challenge, _check_method
+from benchmarks.common import ops_per_sec, report
+
+N = 100_000
+
+
+def old_solve(code_verifier=None, code_challenge=None, code_challenge_method="plain"):
+	""" solve() before the fast path, every failure raised and caught.
+	"""
+	try:
+		_check_verifier(code_verifier)
+		_check_challenge(code_challenge)
+		_check_method(code_challenge_method)
+		if secrets.compare_digest(pkce.make_challenge(code_verifier, code_challenge_method), code_challenge) is True:
+			return True
+		raise pkce.NotEqual('Could not solve')
+	except (pkce.TransformAlgorithm, pkce.MissingChallenge, pkce.NotEqual, pkce.InvalidRequestError) as e:
+		return e.response
+	except Exception:
+		return {"error": "invalid_request", "error_description": "unknown error"}
+
+
+pixy = pkce.generate()
+OUTCOMES = {
+	'success': pixy.tuple(),
+	'bad verifier': ('password123', pixy.code_challenge, 'S256'),
+	'bad method': (pixy.code_verifier, pixy.code_challenge, 'S512'),
+	'mismatch': (pixy.code_verifier, pkce.generate().code_challenge, 'S256'),
+}
+
+
+if __name__ == '__main__':
+	for outcome, args in OUTCOMES.items():
+		print(outcome)
+		base = ops_per_sec(lambda: old_solve(*args), N)
+		report('  solve() (raise/except)', base)
+		report('  solve()', ops_per_sec(lambda: pkce.solve(*args), N), baseline=base)
+		report('  verify()', ops_per_sec(lambda: pkce.verify(*args), N), baseline=base)
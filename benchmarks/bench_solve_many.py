@@ -0,0 +1,39 @@
+""" Items per second: pkce.solve() in a loop vs pkce.solve_many() in process and over a process pool
+
+	python -m benchmarks.bench_solve_many
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pkce
+from benchmarks.common import ops_per_sec, report
+
+N = 50_000
+
+ITEMS = [pixy.tuple() for pixy in pkce.generate_many(N)]
+ITEMS[::4] = [(verifier, 'not the challenge', method) for verifier, challenge, method in ITEMS[::4]]
+
+
+def loop():
+	solve = pkce.solve
+	for item in ITEMS:
+		solve(*item)
+
+
+def many():
+	for _ in pkce.solve_many(ITEMS):
+		pass
+
+
+if __name__ == '__main__':
+	print(f"items per second (n={N}, 25% mismatches)")
+	base = ops_per_sec(loop, 1, 3) * N
+	report('solve() loop', base, 'items/s')
+	report('solve_many()', ops_per_sec(many, 1, 3) * N, 'items/s', base)
+	with ProcessPoolExecutor() as pool:
+		def pooled():
+			for _ in pkce.solve_many(ITEMS, executor=pool, chunk_size=4096):
+				pass
+		pooled()  #> warm up the workers
+		report('solve_many(executor=ProcessPoolExecutor)', ops_per_sec(pooled, 1, 3) * N, 'items/s', base)
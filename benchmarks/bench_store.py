@@ -0,0 +1,73 @@
+""" PixyStore lookups per second across worker processes, against a shared SQLite table
+
+	python -m benchmarks.bench_store [workers ...]
+
+	Every worker opens the file itself, like gunicorn workers would, and looks up random states.
+
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+from multiprocessing import Pool
+
+import pkce
+
+ENTRIES = 20_000
+LOOKUPS = 50_000
+
+
+def sqlite_fill(path, states, pixies):
+	db = sqlite3.connect(path, isolation_level=None)
+	db.execute('PRAGMA journal_mode=WAL')
+	db.execute('CREATE TABLE pixy (state TEXT PRIMARY KEY, verifier TEXT, challenge TEXT, method TEXT)')
+	db.executemany('INSERT INTO pixy VALUES (?, ?, ?, ?)', [(state, *pixy.tuple()) for state, pixy in zip(states, pixies)])
+	db.close()
+
+
+def sqlite_worker(args):
+	path, states = args
+	db = sqlite3.connect(path, isolation_level=None)
+	start = time.perf_counter()
+	for state in states:
+		pkce.Pixy(*db.execute('SELECT verifier, challenge, method FROM pixy WHERE state = ?', (state,)).fetchone())
+	return len(states) / (time.perf_counter() - start)
+
+
+def store_worker(args):
+	path, states = args
+	store = pkce.PixyStore(path)
+	start = time.perf_counter()
+	for state in states:
+		store.get(state)
+	return len(states) / (time.perf_counter() - start)
+
+
+def run(worker, path, states, workers):
+	""" Total lookups per second, the sum of the workers' rates.
+	"""
+	jobs = [(path, random.choices(states, k=LOOKUPS)) for _ in range(workers)]
+	with Pool(workers) as pool:
+		return sum(pool.map(worker, jobs))
+
+
+if __name__ == '__main__':
+	counts = [int(arg) for arg in sys.argv[1:]] or [1, 2, 4]
+	states = [pkce.short_code() for _ in range(ENTRIES)]
+	pixies = list(pkce.generate_many(ENTRIES))
+	with tempfile.TemporaryDirectory() as directory:
+		store_path, sqlite_path = os.path.join(directory, 'pixy.store'), os.path.join(directory, 'pixy.db')
+		with pkce.PixyStore(store_path, capacity=2 * ENTRIES) as store:
+			for state, pixy in zip(states, pixies):
+				store.put(state, pixy)
+		sqlite_fill(sqlite_path, states, pixies)
+
+		print(f"lookups per second, {ENTRIES:,} entries, {os.cpu_count()} cpus")
+		print(f"{'workers':>8} {'sqlite':>12} {'PixyStore':>12}")
+		for workers in counts:
+			base = run(sqlite_worker, sqlite_path, states, workers)
+			rate = run(store_worker, store_path, states, workers)
+			print(f"{workers:>8} {base:>12,.0f} {rate:>12,.0f}   x{rate / base:.2f}")
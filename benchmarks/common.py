@@ -0,0 +1,26 @@
+"########################"
+"#   BENCHMARK HELPERS  #"
+"########################"
+
+import time
+
+
+def ops_per_sec(fn, number: int, repeat: int=5) -> float:
+	""" Best of 'repeat' runs of calling fn() 'number' times, as calls per second.
+	"""
+	best = float('inf')
+	for _ in range(repeat):
+		start = time.perf_counter()
+		for _ in range(number):
+			fn()
+		best = min(best, time.perf_counter() - start)
+	return number / best
+
+
+def report(name: str, rate: float, unit: str='ops/s', baseline: float=None):
+	""" Print one result line, with the speedup when a baseline rate is given.
+	"""
+	line = f"{name:<40} {rate:>14,.0f} {unit}"
+	if baseline:
+		line += f"   x{rate / baseline:.2f}"
+	print(line)
@@ -0,0 +1,260 @@
+""" End to end load harness: a stand-in authorization server and a load generator running the full PKCE flow
+
+	python -m benchmarks.e2e --flows 5000 --concurrency 32           #> starts a server process, then the load
+	python -m benchmarks.e2e serve --port 8765 --code-format compact  #> server only
+	python -m benchmarks.e2e load --port 8765 --flows 5000           #> load against a running server
+
+	The server is asyncio and the stdlib only, with keep-alive HTTP/1.1:
+
+		GET  /authorize  response_type, client_id, redirect_uri, code_challenge, code_challenge_method, state
+		                 -> 302 redirect_uri?code=...&state=..., the code from pkce.create_auth_code()
+		POST /token      grant_type, code, code_verifier, client_id, redirect_uri (form encoded)
+		                 -> pkce.load_auth_code() with a replay store, pkce.compare() of client_id and redirect_uri,
+		                    pkce.solve(), then 200 with an access token or 400 with the error response
+
+	Each load worker keeps one connection and runs complete flows: pkce.generate(), /authorize,
+	pkce.compare() of the returned state, /token. Throughput and p50/p99/p999 latency are reported
+	for each endpoint and for the whole flow.
+
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import multiprocessing
+from urllib.parse import urlencode, urlsplit, parse_qsl
+
+import pkce
+
+REDIRECT_URI = 'http://127.0.0.1/callback'
+CLIENT_ID = 'mrsimple'
+
+_REASONS = {200: 'OK', 302: 'Found', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+"########################"
+"#        SERVER        #"
+"########################"
+
+
+class AuthServer:
+	""" Stand-in authorization server, the /authorize and /token steps of the README flow.
+	"""
+
+	def __init__(self, code_format='fernet'):
+		self.code_format = code_format
+		self.replay_store = pkce.MemoryReplayStore()
+
+	def authorize(self, query):
+		if query.get('response_type') != 'code' or not query.get('redirect_uri'):
+			return 400, {'Content-Type': 'application/json'}, json.dumps(pkce.InvalidRequestError.response).encode()
+		code = pkce.create_auth_code(
+			code_format=self.code_format,
+			code_challenge=query.get('code_challenge'),
+			code_challenge_method=query.get('code_challenge_method', 'plain'),
+			client_id=query.get('client_id'),
+			redirect_uri=query['redirect_uri'],
+		)
+		location = query['redirect_uri'] + '?' + urlencode({'code': code, 'state': query.get('state', '')})
+		return 302, {'Location': location}, b''
+
+	def token(self, form):
+		if form.get('grant_type') != 'authorization_code':
+			return 400, {'Content-Type': 'application/json'}, json.dumps(pkce.InvalidRequestError.response).encode()
+		try:
+			payload = pkce.load_auth_code(form.get('code', ''), replay_store=self.replay_store)
+		except pkce.InvalidAuthCode as e:
+			return 400, {'Content-Type': 'application/json'}, json.dumps(e.response).encode()
+		except Exception:
+			return 400, {'Content-Type': 'application/json'}, json.dumps(pkce.InvalidAuthCode.response).encode()
+		if not (pkce.compare(payload.get('client_id'), form.get('client_id')) and pkce.compare(payload.get('redirect_uri'), form.get('redirect_uri'))):
+			return 400, {'Content-Type': 'application/json'}, json.dumps(pkce.InvalidAuthCode.response).encode()
+		result = pkce.solve(form.get('code_verifier'), payload['code_challenge'], payload['code_challenge_method'])
+		if result is not True:
+			return 400, {'Content-Type': 'application/json'}, json.dumps(result).encode()
+		body = {'access_token': pkce.make_code(), 'token_type': 'Bearer', 'expires_in': 3600}
+		return 200, {'Content-Type': 'application/json'}, json.dumps(body).encode()
+
+	async def handle(self, reader, writer):
+		try:
+			while True:
+				try:
+					head = await reader.readuntil(b'\r\n\r\n')
+				except (asyncio.IncompleteReadError, ConnectionError):
+					return
+				request_line, *header_lines = head.decode('latin-1').split('\r\n')
+				method, target, _ = request_line.split(' ', 2)
+				headers = dict(line.split(': ', 1) for line in header_lines if ': ' in line)
+				length = int(headers.get('Content-Length', 0))
+				body = await reader.readexactly(length) if length else b''
+				path, _, query = target.partition('?')
+				if path == '/authorize':
+					status, response_headers, response = self.authorize(dict(parse_qsl(query))) if method == 'GET' else (405, {}, b'')
+				elif path == '/token':
+					status, response_headers, response = self.token(dict(parse_qsl(body.decode()))) if method == 'POST' else (405, {}, b'')
+				else:
+					status, response_headers, response = 404, {}, b''
+				writer.write(_response(status, response_headers, response))
+				await writer.drain()
+		finally:
+			writer.close()
+
+
+def _response(status, headers, body):
+	head = [f"HTTP/1.1 {status} {_REASONS[status]}", f"Content-Length: {len(body)}"]
+	head += [f"{name}: {value}" for name, value in headers.items()]
+	return ('\r\n'.join(head) + '\r\n\r\n').encode() + body
+
+
+async def serve(host, port, code_format, ready=None):
+	server = await asyncio.start_server(AuthServer(code_format).handle, host, port)
+	if ready is not None:
+		ready.set()
+	async with server:
+		await server.serve_forever()
+
+
+def _serve_process(host, port, code_format, fernet_key, ready):
+	pkce.configure(fernet_key=fernet_key)
+	asyncio.run(serve(host, port, code_format, ready))
+
+
+"########################"
+"#    LOAD GENERATOR    #"
+"########################"
+
+
+class Connection:
+	""" One keep-alive HTTP/1.1 connection, requests are sent one at a time.
+	"""
+
+	def __init__(self, host, port):
+		self.host, self.port = host, port
+		self.reader = self.writer = None
+
+	async def request(self, method, target, body=b''):
+		if self.writer is None:
+			self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+		head = f"{method} {target} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+		if body:
+			head += "Content-Type: application/x-www-form-urlencoded\r\n"
+		self.writer.write(head.encode() + b'\r\n' + body)
+		head = await self.reader.readuntil(b'\r\n\r\n')
+		status_line, *header_lines = head.decode('latin-1').split('\r\n')
+		headers = dict(line.split(': ', 1) for line in header_lines if ': ' in line)
+		response = await self.reader.readexactly(int(headers.get('Content-Length', 0)))
+		return int(status_line.split(' ')[1]), headers, response
+
+	def close(self):
+		if self.writer is not None:
+			self.writer.close()
+
+
+async def run_flow(connection, timings):
+	""" One complete flow, appends the latency of each step to timings, returns True on an access token.
+	"""
+	start = time.perf_counter()
+	pixy = pkce.generate()
+	state = pkce.short_code()
+	query = urlencode({'response_type': 'code', 'client_id': CLIENT_ID, 'redirect_uri': REDIRECT_URI, 'state': state,
+		'code_challenge': pixy.code_challenge, 'code_challenge_method': pixy.code_challenge_method})
+	status, headers, _ = await connection.request('GET', '/authorize?' + query)
+	authorized = time.perf_counter()
+	timings['authorize'].append(authorized - start)
+	if status != 302:
+		return False
+	callback = dict(parse_qsl(urlsplit(headers['Location']).query))
+	if not pkce.compare(state, callback.get('state')):
+		return False
+
+	form = urlencode({'grant_type': 'authorization_code', 'code': callback['code'], 'code_verifier': pixy.code_verifier,
+		'client_id': CLIENT_ID, 'redirect_uri': REDIRECT_URI}).encode()
+	status, _, body = await connection.request('POST', '/token', form)
+	end = time.perf_counter()
+	timings['token'].append(end - authorized)
+	timings['flow'].append(end - start)
+	return status == 200 and 'access_token' in json.loads(body)
+
+
+async def load(host, port, flows, concurrency):
+	timings = {'authorize': [], 'token': [], 'flow': []}
+	failures = 0
+	remaining = flows
+
+	async def worker():
+		nonlocal failures, remaining
+		connection = Connection(host, port)
+		try:
+			while remaining > 0:
+				remaining -= 1
+				if not await run_flow(connection, timings):
+					failures += 1
+		finally:
+			connection.close()
+
+	start = time.perf_counter()
+	await asyncio.gather(*(worker() for _ in range(concurrency)))
+	return timings, failures, time.perf_counter() - start
+
+
+def percentile(samples, q):
+	return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def print_report(timings, failures, elapsed, concurrency):
+	flows = len(timings['flow'])
+	print(f"{flows:,} flows in {elapsed:.1f}s at concurrency {concurrency}, {flows / elapsed:,.0f} flows/s, {failures} failed")
+	print(f"{'endpoint':<12} {'requests/s':>12} {'p50 ms':>9} {'p99 ms':>9} {'p999 ms':>9}")
+	for name, samples in timings.items():
+		samples.sort()
+		if not samples:
+			continue
+		print(f"{name:<12} {len(samples) / elapsed:>12,.0f} {percentile(samples, 0.5) * 1000:>9.2f} "
+			f"{percentile(samples, 0.99) * 1000:>9.2f} {percentile(samples, 0.999) * 1000:>9.2f}")
+
+
+def _fernet_key():
+	if not pkce.pkce.FERNET_KEY:
+		from cryptography.fernet import Fernet
+		pkce.configure(fernet_key=Fernet.generate_key())
+	return pkce.pkce.FERNET_KEY
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog='python -m benchmarks.e2e', description='end to end PKCE flow load harness')
+	parser.add_argument('command', nargs='?', choices=('run', 'serve', 'load'), default='run')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8765)
+	parser.add_argument('--flows', type=int, default=5000, help='complete flows to run')
+	parser.add_argument('--concurrency', type=int, default=32, help='concurrent clients, one connection each')
+	parser.add_argument('--code-format', choices=('fernet', 'compact', 'binary'), default='fernet', help='auth code format of the server')
+	args = parser.parse_args(argv)
+
+	if args.command == 'serve':
+		_fernet_key()
+		print(f"serving on http://{args.host}:{args.port}", file=sys.stderr)
+		asyncio.run(serve(args.host, args.port, args.code_format))
+		return 0
+	if args.command == 'load':
+		print_report(*asyncio.run(load(args.host, args.port, args.flows, args.concurrency)), args.concurrency)
+		return 0
+
+	ready = multiprocessing.Event()
+	server = multiprocessing.Process(target=_serve_process, args=(args.host, args.port, args.code_format, _fernet_key(), ready), daemon=True)
+	server.start()
+	try:
+		if not ready.wait(10):
+			raise RuntimeError('the server did not start')
+		print(f"server pid {server.pid}, code format {args.code_format}, {os.cpu_count()} cpus")
+		print_report(*asyncio.run(load(args.host, args.port, args.flows, args.concurrency)), args.concurrency)
+	finally:
+		server.terminate()
+		server.join()
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,216 @@
+""" Benchmark suite for every public function, with JSON baselines and a regression gate.
+
+	python -m benchmarks.suite run --out baseline.json
+	python -m benchmarks.suite run --out current.json
+	python -m benchmarks.suite compare baseline.json current.json --threshold 0.10
+
+	For each case it reports ops/sec (best of --repeat runs), latency percentiles from
+	timing single calls, and allocations per call: the tracemalloc peak in bytes of one call,
+	and the net number of memory blocks still allocated per call.
+
+	compare exits with status 1 when a case's ops/sec drops, or its p50/p99 latency rises,
+	by more than the threshold (0.10 == 10%).
+
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+import pkce
+
+
+def _cases():
+	""" name -> zero argument callable, auth code cases need cryptography installed.
+	"""
+	pixy = pkce.generate()
+	verifier, challenge = pixy.code_verifier, pixy.code_challenge
+	other = pkce.generate().code_challenge
+	code = pkce.make_code()
+	cases = {
+		'generate': pkce.generate,
+		'make_verifier': pkce.make_verifier,
+		'make_challenge': lambda: pkce.make_challenge(verifier),
+		'solve[success]': lambda: pkce.solve(verifier, challenge, 'S256'),
+		'solve[bad_verifier]': lambda: pkce.solve('password123', challenge, 'S256'),
+		'solve[bad_method]': lambda: pkce.solve(verifier, challenge, 'S512'),
+		'solve[mismatch]': lambda: pkce.solve(verifier, other, 'S256'),
+		'compare': lambda: pkce.compare(code, code),
+		'make_code': pkce.make_code,
+		'short_code': pkce.short_code,
+	}
+	try:
+		from cryptography.fernet import Fernet
+	except ImportError:
+		print('cryptography is not installed, skipping create_auth_code and load_auth_code', file=sys.stderr)
+		return cases
+	if not pkce.pkce.FERNET_KEY:
+		pkce.configure(fernet_key=Fernet.generate_key())
+	claims = {'code_challenge': challenge, 'code_challenge_method': 'S256', 'client_id': 'mrsimple', 'state': pkce.short_code()}
+	auth_code = pkce.create_auth_code(**claims)
+	cases['create_auth_code'] = lambda: pkce.create_auth_code(**claims)
+	cases['load_auth_code'] = lambda: pkce.load_auth_code(auth_code)
+	return cases
+
+
+def _percentile(samples, q):
+	return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def measure(fn, number: int, repeat: int, samples: int) -> dict:
+	""" ops/sec, latency percentiles in microseconds and allocations per call for fn().
+	"""
+	fn()  #> warm up, lazy imports and caches
+	best = float('inf')
+	for _ in range(repeat):
+		start = time.perf_counter()
+		for _ in range(number):
+			fn()
+		best = min(best, time.perf_counter() - start)
+
+	perf_counter_ns = time.perf_counter_ns
+	latencies = []
+	for _ in range(samples):
+		start = perf_counter_ns()
+		fn()
+		latencies.append(perf_counter_ns() - start)
+	latencies.sort()
+
+	gc.collect()
+	blocks = sys.getallocatedblocks()
+	for _ in range(number):
+		fn()
+	net_blocks = (sys.getallocatedblocks() - blocks) / number
+
+	reset_peak = getattr(tracemalloc, 'reset_peak', None)  #> python 3.9+
+	tracemalloc.start()
+	peaks = []
+	for _ in range(min(samples, 200)):
+		if reset_peak is not None:
+			reset_peak()
+		else:
+			tracemalloc.stop()  #> a restart also resets the peak, slower
+			tracemalloc.start()
+		current = tracemalloc.get_traced_memory()[0]
+		fn()
+		peaks.append(tracemalloc.get_traced_memory()[1] - current)
+	tracemalloc.stop()
+
+	return {
+		'ops_per_sec': number / best,
+		'p50_us': _percentile(latencies, 0.50) / 1000,
+		'p90_us': _percentile(latencies, 0.90) / 1000,
+		'p99_us': _percentile(latencies, 0.99) / 1000,
+		'max_us': latencies[-1] / 1000,
+		'alloc_peak_bytes': sum(peaks) / len(peaks),
+		'net_blocks_per_call': net_blocks,
+	}
+
+
+def run(args):
+	cases = _cases()
+	only = set(args.only.split(',')) if args.only else None
+	results = {}
+	print(f"{'case':<24} {'ops/s':>12} {'p50 us':>9} {'p99 us':>9} {'alloc B':>9} {'blocks':>7}")
+	for name, fn in cases.items():
+		if only and name not in only and name.split('[')[0] not in only:
+			continue
+		result = results[name] = measure(fn, args.number, args.repeat, args.samples)
+		print(f"{name:<24} {result['ops_per_sec']:>12,.0f} {result['p50_us']:>9.2f} {result['p99_us']:>9.2f} "
+			f"{result['alloc_peak_bytes']:>9,.0f} {result['net_blocks_per_call']:>7.2f}")
+
+	report = {
+		'meta': {
+			'python': platform.python_version(),
+			'implementation': platform.python_implementation(),
+			'machine': platform.machine(),
+			'system': platform.system(),
+			'cpu_count': os.cpu_count(),
+			'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+			'number': args.number,
+			'repeat': args.repeat,
+			'samples': args.samples,
+		},
+		'results': results,
+	}
+	if args.out:
+		with open(args.out, 'w') as f:
+			json.dump(report, f, indent=2)
+		print(f"saved {args.out}")
+	return 0
+
+
+def regressions(baseline: dict, current: dict, threshold: float) -> list:
+	""" Return (case, metric, baseline, current, change) for every metric past the threshold.
+
+		Lower ops/sec or higher latency is a regression, cases missing on either side are ignored.
+	"""
+	found = []
+	for name, before in baseline['results'].items():
+		after = current['results'].get(name)
+		if after is None:
+			continue
+		change = after['ops_per_sec'] / before['ops_per_sec'] - 1
+		if change < -threshold:
+			found.append((name, 'ops_per_sec', before['ops_per_sec'], after['ops_per_sec'], change))
+		for metric in ('p50_us', 'p99_us'):
+			if before[metric] > 0:
+				change = after[metric] / before[metric] - 1
+				if change > threshold:
+					found.append((name, metric, before[metric], after[metric], change))
+	return found
+
+
+def compare(args):
+	with open(args.baseline) as f:
+		baseline = json.load(f)
+	with open(args.current) as f:
+		current = json.load(f)
+
+	print(f"{'case':<24} {'baseline ops/s':>15} {'current ops/s':>15} {'change':>8}")
+	for name, before in baseline['results'].items():
+		after = current['results'].get(name)
+		if after is None:
+			print(f"{name:<24} {before['ops_per_sec']:>15,.0f} {'missing':>15}")
+			continue
+		change = after['ops_per_sec'] / before['ops_per_sec'] - 1
+		print(f"{name:<24} {before['ops_per_sec']:>15,.0f} {after['ops_per_sec']:>15,.0f} {change:>+8.1%}")
+
+	found = regressions(baseline, current, args.threshold)
+	for name, metric, before, after, change in found:
+		print(f"REGRESSION {name} {metric}: {before:,.2f} -> {after:,.2f} ({change:+.1%})")
+	if found:
+		return 1
+	print(f"no regression past {args.threshold:.0%}")
+	return 0
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description='pkce benchmark suite')
+	commands = parser.add_subparsers(dest='command', required=True)
+
+	run_parser = commands.add_parser('run', help='run the benchmarks')
+	run_parser.add_argument('--out', help='save the results as JSON')
+	run_parser.add_argument('--only', help='comma separated case names, ie solve,generate')
+	run_parser.add_argument('--number', type=int, default=2000, help='calls per timed run')
+	run_parser.add_argument('--repeat', type=int, default=5, help='timed runs, the best is kept')
+	run_parser.add_argument('--samples', type=int, default=2000, help='single call latency samples')
+	run_parser.set_defaults(func=run)
+
+	compare_parser = commands.add_parser('compare', help='fail when current regressed from baseline')
+	compare_parser.add_argument('baseline')
+	compare_parser.add_argument('current')
+	compare_parser.add_argument('--threshold', type=float, default=0.10, help='allowed change, 0.10 == 10%%')
+	compare_parser.set_defaults(func=compare)
+
+	args = parser.parse_args(argv)
+	return args.func(args)
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -6,23 +6,77 @@
 # 	load_auth_code
 # )
 
+# Submodules are imported on first attribute access (PEP 562), `import pkce` only loads this file.
+# ie pkce.generate imports pkce.pkce, pkce.AuthCodeCodec imports pkce.codec.
 
-from .pkce import (generate,
-	make_verifier,
-	make_challenge,
-	solve,
-	create_auth_code,
-	load_auth_code,
-	TransformAlgorithm,
-	VerifierLength,
-	MissingChallenge,
-	NotEqual,
-	InvalidRequestError,
-	_check_length,
-	_check_verifier,
-	_check_challenge,
-	_check_method,
-	compare
-)
-
-from .utils import (short_code, make_code)
\ No newline at end of file
+_EXPORTS = {
+	'.pkce': (
+		'generate',
+		'Pixy',
+		'make_verifier',
+		'make_challenge',
+		'solve',
+		'verify',
+		'SolveResult',
+		'SOLVE_ERRORS',
+		'create_auth_code',
+		'load_auth_code',
+		'configure',
+		'register_method',
+		'CHALLENGE_METHODS',
+		's256_transform',
+		'plain_transform',
+		'sha512_transform',
+		'blake2b_transform',
+		'TransformAlgorithm',
+		'VerifierLength',
+		'MissingChallenge',
+		'NotEqual',
+		'InvalidRequestError',
+		'InvalidAuthCode',
+		'UNKNOWN_ERROR',
+		'ReusedAuthCode',
+		'TooManyRequests',
+		'RejectedAuthCode',
+		'_check_length',
+		'_check_verifier',
+		'_check_challenge',
+		'_check_method',
+		'compare',
+	),
+	'.utils': ('short_code', 'make_code', 'make_codes'),
+	'.batch': ('generate_many', 'PixyBatch', 'solve_many'),
+	'.pool': ('PixyPool',),
+	'.codec': ('AuthCodeCodec',),
+	'.keyring': ('KeyRing',),
+	'.schema': ('PayloadSchema', 'LazyPayload', 'DEFAULT_SCHEMA'),
+	'.replay': ('MemoryReplayStore', 'SQLiteReplayStore', 'RotatingBloomFilter'),
+	'.pending': ('PendingAuthorizationStore', 'PendingAuthorization'),
+	'.admission': ('AdmissionControl',),
+	'.middleware': ('WSGITokenMiddleware', 'ASGITokenMiddleware', 'TokenVerifier', 'FormParser'),
+	'.entropy': ('BufferedEntropy', 'set_entropy', 'get_entropy'),
+	'.store': ('PixyStore',),
+	'.metrics': ('Instrumentation', 'HistogramSink', 'set_instrumentation', 'get_instrumentation'),
+	'.aio': ('solve_async', 'create_auth_code_async', 'load_auth_code_async', 'configure_async', 'AsyncRunner'),
+}
+
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+_SUBMODULES = {module[1:] for module in _EXPORTS}
+
+__all__ = [name for name in _MODULES if not name.startswith('_')]
+
+
+def __getattr__(name):
+	from importlib import import_module
+	if name in _MODULES:
+		value = getattr(import_module(_MODULES[name], __name__), name)
+	elif name in _SUBMODULES:
+		value = import_module('.' + name, __name__)
+	else:
+		raise AttributeError(f"module 'pkce' has no attribute '{name}'")
+	globals()[name] = value  #> next lookup skips __getattr__
+	return value
+
+
+def __dir__():
+	return sorted(set(globals()) | set(_MODULES) | _SUBMODULES)
@@ -0,0 +1,182 @@
+"########################"
+"#   ADMISSION CONTROL  #"
+"########################"
+
+import time
+import threading
+from collections import OrderedDict
+
+from . import pkce as _pkce
+from .pkce import TooManyRequests, RejectedAuthCode
+from .replay import canonical_code
+from .keyring import KID_MAX_LENGTH
+
+"""
+
+AdmissionControl
+
+	Cheap checks in front of the token endpoint, abusive traffic is turned away with a dict
+	lookup before load_auth_code() decrypts or solve() hashes anything.
+
+		per client_id:  token bucket of 'client_rate' requests a second, up to 'client_burst',
+		                a failure costs 'failure_cost' more tokens   --> pkce.TooManyRequests
+		per auth code:  'code_attempts' attempts every 'negative_ttl' seconds,
+		                a code that failed is rejected for 'negative_ttl' seconds --> pkce.RejectedAuthCode
+
+	>>> admission = pkce.AdmissionControl(client_rate=10, client_burst=20)
+	>>> payload = admission.load_auth_code(auth_code, client_id='mrsimple', replay_store=store)  #> raises like load_auth_code()
+	>>> admission.solve(code_verifier, payload['code_challenge'], payload['code_challenge_method'], client_id='mrsimple', auth_code=auth_code, admit=False)
+	True
+	>>> admission.admit(client_id='mrsimple')  #> or check and record by hand around your own calls
+	{'error': 'invalid_request', 'error_description': 'too many requests'}
+	>>> admission.failure(client_id='mrsimple', auth_code=auth_code)
+
+NOTE:
+	State is per process and bounded, each of the clients, codes and failed codes tables keeps
+	at most 'max_entries' keys, least recently used first out. An evicted client starts again
+	with a full bucket. Codes are kept by hash() of the canonical code, never the code itself,
+	so a code spelled another way (padding, whitespace, a dropped kid) is the same code.
+
+"""
+
+
+def _code_key(auth_code) -> int:
+	""" hash() of the canonical code without its kid, every spelling the decoders accept has the same key.
+	"""
+	if isinstance(auth_code, str):
+		auth_code = auth_code.encode()
+	return hash(canonical_code(auth_code[auth_code.find(b'.', 0, KID_MAX_LENGTH + 1) + 1:]))
+
+
+class AdmissionControl:
+	""" Per client_id and per auth code token buckets and a negative cache of failed codes, sharded with a lock per shard.
+	"""
+
+	def __init__(self, client_rate: float=10.0, client_burst: float=20.0, failure_cost: float=4.0, code_attempts: int=3,
+			negative_ttl: float=60.0, max_entries: int=100_000, shards: int=16):
+		self.client_rate = client_rate
+		self.client_burst = client_burst
+		self.failure_cost = failure_cost
+		self.code_attempts = code_attempts
+		self.negative_ttl = negative_ttl
+		self._code_rate = code_attempts / negative_ttl
+		self._limit = max(1, max_entries // shards)
+		self._clients = [OrderedDict() for _ in range(shards)]  #> client_id -> [tokens, updated at]
+		self._codes = [OrderedDict() for _ in range(shards)]  #> _code_key(auth_code) -> [tokens, updated at]
+		self._failed = [OrderedDict() for _ in range(shards)]  #> _code_key(auth_code) -> rejected until
+		self._locks = [threading.Lock() for _ in range(shards)]
+		self.admitted = 0
+		self.rejected = 0
+
+	def _take(self, table, key, rate, burst, cost, now) -> bool:
+		""" Take 'cost' tokens from the bucket of 'key', False when there are not enough. Call with the shard lock.
+		"""
+		bucket = table.get(key)
+		if bucket is None:
+			if len(table) >= self._limit:
+				table.popitem(last=False)
+			bucket = table[key] = [burst, now]
+		else:
+			table.move_to_end(key)
+			bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+			bucket[1] = now
+		if bucket[0] < cost:
+			return False
+		bucket[0] -= cost
+		return True
+
+	def admit(self, client_id=None, auth_code=None):
+		""" True when the request may go on, else the 'response' dict of TooManyRequests or RejectedAuthCode.
+
+			Takes a token from the code bucket then the client bucket, a code rejection takes no client token.
+		"""
+		error = self._admit(client_id, auth_code)
+		return True if error is None else error.response
+
+	def _admit(self, client_id, auth_code):
+		""" None or the error class of the rejection.
+		"""
+		now = time.monotonic()
+		if auth_code is not None:
+			key = _code_key(auth_code)
+			index = key % len(self._locks)
+			with self._locks[index]:
+				failed = self._failed[index]
+				until = failed.get(key)
+				if until is not None and until <= now:
+					del failed[key]
+					until = None
+				if until is not None or not self._take(self._codes[index], key, self._code_rate, self.code_attempts, 1, now):
+					return self._reject(RejectedAuthCode)
+		if client_id is not None:
+			index = hash(client_id) % len(self._locks)
+			with self._locks[index]:
+				if not self._take(self._clients[index], client_id, self.client_rate, self.client_burst, 1, now):
+					return self._reject(TooManyRequests)
+		self.admitted += 1
+		return None
+
+	def _reject(self, error):
+		self.rejected += 1
+		if _pkce._instrumentation is not None:
+			_pkce._instrumentation.error('admission', error.__name__)
+		return error
+
+	def failure(self, client_id=None, auth_code=None):
+		""" Record a failed load or solve: the code is rejected for 'negative_ttl' seconds and the client pays 'failure_cost'.
+		"""
+		now = time.monotonic()
+		if auth_code is not None:
+			key = _code_key(auth_code)
+			index = key % len(self._locks)
+			with self._locks[index]:
+				failed = self._failed[index]
+				if key not in failed and len(failed) >= self._limit:
+					failed.popitem(last=False)
+				failed[key] = now + self.negative_ttl
+				failed.move_to_end(key)
+		if client_id is not None and self.failure_cost:
+			index = hash(client_id) % len(self._locks)
+			with self._locks[index]:
+				bucket = self._clients[index].get(client_id)
+				if bucket is not None:  #> admit() made it, the bucket may go negative
+					bucket[0] -= self.failure_cost
+
+	def load_auth_code(self, auth_code, client_id=None, audience="auth_code", replay_store=None, codec=None):
+		""" pkce.load_auth_code() (or codec.decode()) behind admit(), a failed load is recorded with failure().
+
+			Raises TooManyRequests or RejectedAuthCode before any decryption, else what load_auth_code() raises.
+		"""
+		error = self._admit(client_id, auth_code)
+		if error is not None:
+			raise error()
+		try:
+			if codec is not None:
+				return codec.decode(auth_code, audience, replay_store)
+			return _pkce.load_auth_code(auth_code, audience, replay_store)
+		except Exception:
+			self.failure(client_id, auth_code)
+			raise
+
+	def solve(self, code_verifier, code_challenge, code_challenge_method='plain', client_id=None, auth_code=None, admit: bool=True):
+		""" pkce.solve() behind admit(), returns True or a 'response' dict, a failure is recorded with failure().
+
+			admit=False only records the failure, for a code that was just admitted by load_auth_code().
+		"""
+		if admit:
+			error = self._admit(client_id, auth_code)
+			if error is not None:
+				return error.response
+		response = _pkce.solve(code_verifier, code_challenge, code_challenge_method)
+		if response is not True:
+			self.failure(client_id, auth_code)
+		return response
+
+	def stats(self):
+		return {
+			'admitted': self.admitted,
+			'rejected': self.rejected,
+			'clients': sum(len(table) for table in self._clients),
+			'codes': sum(len(table) for table in self._codes),
+			'failed_codes': sum(len(table) for table in self._failed),
+		}
@@ -0,0 +1,154 @@
+"########################"
+"#    ASYNCIO HELPERS   #"
+"########################"
+
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from . import pkce as _pkce
+
+"""
+
+solve_async
+create_auth_code_async
+load_auth_code_async
+
+	Same arguments and results as the sync functions, the work runs on an executor so the
+	event loop is never blocked. Calls made in the same loop tick are sent to the executor as
+	one batch, and at most 'max_pending' calls are queued, later callers wait for room.
+
+	>>> await pkce.solve_async(code_verifier, code_challenge, 'S256')
+	True
+	>>> pkce.configure_async(max_workers=8, max_pending=4096)
+
+"""
+
+
+def _run_batch(calls):
+	""" Run a batch of (function, args, kwargs) calls in an executor worker, return (ok, result) pairs.
+	"""
+	results = []
+	for function, args, kwargs in calls:
+		try:
+			results.append((True, function(*args, **kwargs)))
+		except Exception as e:
+			results.append((False, e))
+	return results
+
+
+class _LoopState:
+	__slots__ = ('semaphore', 'calls', 'futures')
+
+	def __init__(self, max_pending):
+		self.semaphore = asyncio.Semaphore(max_pending)
+		self.calls = []
+		self.futures = []
+
+
+class AsyncRunner:
+	""" Runs pkce functions on a bounded executor from asyncio code, batching calls per loop tick.
+
+		executor: any concurrent.futures executor, default a ThreadPoolExecutor(max_workers).
+			With a ProcessPoolExecutor the worker processes need FERNET_KEY in their environment,
+			and a replay_store passed to load_auth_code() is not shared with them.
+		max_pending: calls queued or running at once, then callers wait (backpressure).
+		max_batch: largest number of calls sent to the executor in one job.
+	"""
+
+	def __init__(self, executor=None, max_workers: int=4, max_pending: int=1024, max_batch: int=256):
+		if max_pending < 1 or max_batch < 1:
+			raise ValueError("'max_pending' and 'max_batch' must be positive")
+		self.executor = executor
+		self.max_workers = max_workers
+		self.max_pending = max_pending
+		self.max_batch = max_batch
+		self._state = weakref.WeakKeyDictionary()
+
+	def _get_executor(self):
+		if self.executor is None:
+			self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='pkce')
+		return self.executor
+
+	async def run(self, function, *args, **kwargs):
+		""" Run function(*args, **kwargs) on the executor, batched with the other calls of this loop tick.
+		"""
+		loop = asyncio.get_running_loop()
+		state = self._state.get(loop)
+		if state is None:
+			state = self._state[loop] = _LoopState(self.max_pending)
+
+		async with state.semaphore:
+			future = loop.create_future()
+			if not state.calls:
+				loop.call_soon(self._flush, loop, state)
+			state.calls.append((function, args, kwargs))
+			state.futures.append(future)
+			if len(state.calls) >= self.max_batch:
+				self._flush(loop, state)
+			return await future
+
+	def _flush(self, loop, state):
+		if not state.calls:
+			return
+		calls, futures = state.calls, state.futures
+		state.calls, state.futures = [], []
+		job = loop.run_in_executor(self._get_executor(), _run_batch, calls)
+		job.add_done_callback(lambda job: self._deliver(job, futures))
+
+	@staticmethod
+	def _deliver(job, futures):
+		if job.cancelled() or job.exception() is not None:
+			for future in futures:
+				if not future.done():
+					future.set_exception(job.exception() if not job.cancelled() else asyncio.CancelledError())
+			return
+		for future, (ok, result) in zip(futures, job.result()):
+			if future.done():  #> caller was cancelled
+				continue
+			if ok:
+				future.set_result(result)
+			else:
+				future.set_exception(result)
+
+	async def solve(self, code_verifier=None, code_challenge=None, code_challenge_method="plain"):
+		return await self.run(_pkce.solve, code_verifier, code_challenge, code_challenge_method)
+
+	async def create_auth_code(self, *, code_format=None, **kwargs):
+		return await self.run(_pkce.create_auth_code, code_format=code_format, **kwargs)
+
+	async def load_auth_code(self, auth_code, audience="auth_code", replay_store=None):
+		return await self.run(_pkce.load_auth_code, auth_code, audience, replay_store)
+
+	def shutdown(self, wait: bool=True):
+		if self.executor is not None:
+			self.executor.shutdown(wait)
+
+
+_runner = AsyncRunner()
+
+
+def configure_async(executor=None, max_workers: int=4, max_pending: int=1024, max_batch: int=256):
+	""" Replace the runner used by solve_async(), create_auth_code_async() and load_auth_code_async().
+	"""
+	global _runner
+	_runner = AsyncRunner(executor, max_workers, max_pending, max_batch)
+	return _runner
+
+
+async def solve_async(code_verifier=None, code_challenge=None, code_challenge_method="plain"):
+	""" pkce.solve() off the event loop.
+	"""
+	return await _runner.solve(code_verifier, code_challenge, code_challenge_method)
+
+
+async def create_auth_code_async(*, code_format=None, **kwargs):
+	""" pkce.create_auth_code() off the event loop.
+	"""
+	return await _runner.create_auth_code(code_format=code_format, **kwargs)
+
+
+async def load_auth_code_async(auth_code, audience="auth_code", replay_store=None):
+	""" pkce.load_auth_code() off the event loop.
+	"""
+	return await _runner.load_auth_code(auth_code, audience, replay_store)
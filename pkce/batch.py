@@ -0,0 +1,191 @@
+"########################"
+"#   BATCH FUNCTIONS    #"
+"########################"
+
+import hashlib
+import base64
+from os import cpu_count
+from collections import deque
+from collections.abc import Mapping
+from itertools import islice
+
+from .pkce import (Pixy,
+	solve,
+	_check_length,
+	_check_method,
+	CHALLENGE_METHODS,
+)
+from .entropy import _token_bytes
+
+"""
+
+generate_many
+solve_many
+
+"""
+
+# len(secrets.token_urlsafe(96)) == 128, 96 random bytes per verifier.
+VERIFIER_ENTROPY = 96
+VERIFIER_STRIDE = 128
+
+
+class PixyBatch:
+	""" Array backed collection of Pixy objects, made by generate_many()
+
+		Verifiers are kept as one ascii buffer and challenge digests as one binary buffer,
+		a Pixy is only built when an item is accessed.
+
+		EXAMPLE:
+		>>> batch = pkce.generate_many(1000)
+		>>> len(batch)
+		1000
+		>>> batch[0]
+		Pixy(code_verifier='...', code_challenge='...', code_challenge_method='S256')
+		>>> for pixy in batch:
+		...     save(pixy)
+	"""
+	__slots__ = ('_verifiers', '_digests', '_length', '_count', 'code_challenge_method')
+
+	def __init__(self, verifiers: bytes, digests, length: int, count: int, code_challenge_method: str):
+		self._verifiers = verifiers
+		self._digests = digests  #> None for every method but 'S256'
+		self._length = length
+		self._count = count
+		self.code_challenge_method = code_challenge_method
+
+	def __len__(self):
+		return self._count
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self._make(i) for i in range(*index.indices(self._count))]
+		if index < 0:
+			index += self._count
+		if not 0 <= index < self._count:
+			raise IndexError('PixyBatch index out of range')
+		return self._make(index)
+
+	def __iter__(self):
+		for index in range(self._count):
+			yield self._make(index)
+
+	def __repr__(self):
+		return f"PixyBatch(count={self._count}, code_challenge_method='{self.code_challenge_method}')"
+
+	def _make(self, index):
+		start = index * VERIFIER_STRIDE
+		verifier = self._verifiers[start:start + self._length]
+		code_verifier = verifier.decode('ascii')
+		if self._digests is not None:
+			start = index * 32
+			code_challenge = base64.urlsafe_b64encode(self._digests[start:start + 32])[:43].decode('ascii')
+		elif self.code_challenge_method == 'plain':
+			code_challenge = code_verifier
+		else:
+			code_challenge = CHALLENGE_METHODS[self.code_challenge_method](verifier).decode('ascii')  #> registered methods, on access
+		return Pixy(
+			code_verifier=code_verifier,
+			code_challenge=code_challenge,
+			code_challenge_method=self.code_challenge_method,
+		)
+
+
+def generate_many(n: int, code_challenge_method='S256', length: int=128) -> PixyBatch:
+	""" Return a PixyBatch of n PKCE-compliant code verifiers and code challenges.
+
+		Same output as calling pkce.generate() n times, but the entropy is read with a single
+		os.urandom() call (or pkce.configure(entropy=...) source), base64 encoded in one go and hashed in a tight loop.
+
+		EXAMPLE:
+		>>> batch = pkce.generate_many(10000)
+		>>> pixy = batch[0]
+		>>> pkce.solve(**dict(pixy))
+		True
+
+		NOTE: n * 96 bytes of entropy are held in memory, split very large batches into chunks.
+	"""
+	if not isinstance(n, int) or n < 0:
+		raise ValueError("'n' must be a positive int")
+	_check_length(length)
+	_check_method(code_challenge_method, CHALLENGE_METHODS)  #> any registered method, ACCEPTED_METHODS is the server side
+	if code_challenge_method == "plain":
+		print("WARNING: The 'plain' method is depreciated and SHOULD NOT be used.")
+
+	# 96 bytes encode to exactly 128 chars (no padding), so verifier i is encoded[i*128:i*128+length]
+	encoded = base64.urlsafe_b64encode(_token_bytes(n * VERIFIER_ENTROPY))
+	if code_challenge_method != "S256":
+		return PixyBatch(encoded, None, length, n, code_challenge_method)
+
+	view = memoryview(encoded)
+	sha256 = hashlib.sha256
+	digests = b''.join([sha256(view[i:i + length]).digest() for i in range(0, n * VERIFIER_STRIDE, VERIFIER_STRIDE)])
+	return PixyBatch(encoded, digests, length, n, code_challenge_method)
+
+
+def _solve_chunk(items):
+	""" Solve a list of items, run inside an executor worker.
+	"""
+	results = []
+	append = results.append
+	for item in items:
+		if isinstance(item, Mapping):
+			append(solve(**item))
+		elif isinstance(item, Pixy):
+			append(solve(item.code_verifier, item.code_challenge, item.code_challenge_method))
+		else:
+			append(solve(*item))
+	return results
+
+
+def solve_many(iterable, executor=None, chunk_size: int=1024, prefetch: int=None):
+	""" Solve many (code_verifier, code_challenge, code_challenge_method) items, yields the
+		result of pkce.solve() for each item, in the same order.
+
+		Items can be tuples, dicts with solve() keyword names or Pixy objects.
+		The iterable is consumed lazily in chunks of 'chunk_size', pass a concurrent.futures
+		executor to spread the chunks over workers, at most 'prefetch' chunks are in flight.
+
+		EXAMPLE:
+		>>> list(pkce.solve_many([(verifier, challenge, 'S256'), (verifier, 'nope', 'S256')]))
+		[True, {'error': 'invalid_grant', 'error_description': 'code verifier failed'}]
+
+		>>> from concurrent.futures import ProcessPoolExecutor
+		>>> with ProcessPoolExecutor() as pool:
+		...     for result in pkce.solve_many(read_log(), executor=pool):
+		...         audit(result)
+	"""
+	if not isinstance(chunk_size, int) or chunk_size < 1:
+		raise ValueError("'chunk_size' must be a positive int")
+	return _solve_many(iter(iterable), executor, chunk_size, prefetch)
+
+
+def _solve_many(iterator, executor, chunk_size, prefetch):
+	for results in _map_chunks(_solve_chunk, iterator, executor, chunk_size, prefetch):
+		yield from results
+
+
+def _map_chunks(function, iterator, executor, chunk_size, prefetch=None):
+	""" Yield function(chunk) for each chunk of the iterator in order, with at most 'prefetch' chunks in flight on the executor.
+	"""
+	if executor is None:
+		while True:
+			chunk = list(islice(iterator, chunk_size))
+			if not chunk:
+				return
+			yield function(chunk)
+
+	prefetch = prefetch or 2 * (getattr(executor, '_max_workers', None) or cpu_count() or 1)
+	pending = deque()
+	try:
+		while True:
+			while len(pending) < prefetch:
+				chunk = list(islice(iterator, chunk_size))
+				if not chunk:
+					break
+				pending.append(executor.submit(function, chunk))
+			if not pending:
+				return
+			yield pending.popleft().result()
+	finally:
+		for future in pending:
+			future.cancel()
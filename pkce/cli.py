@@ -0,0 +1,296 @@
+"########################"
+"#     COMMAND LINE     #"
+"########################"
+
+import os
+import sys
+import json
+import time
+import base64
+import struct
+import argparse
+from functools import partial
+from collections import Counter
+from contextlib import redirect_stdout
+
+from .pkce import Pixy, verify, create_auth_code, _check_length, _check_method, VerifierLength, TransformAlgorithm, CHALLENGE_METHODS
+from .batch import _map_chunks, generate_many, VERIFIER_STRIDE
+
+"""
+
+python -m pkce verify
+
+	Re-check (code_verifier, code_challenge, code_challenge_method) records from JSONL logs.
+
+	$ python -m pkce verify token_log.jsonl -o results.jsonl --workers 8 --id-field request_id
+	records 1,000,000 in 5.1s, 196,078 records/s
+	OK                          998,812
+	NOT_EQUAL                     1,180
+	INVALID_RECORD                    8
+
+	Each input line is a json object with solve() keyword names (other keys are ignored) or a
+	[code_verifier, code_challenge, code_challenge_method] list. The method defaults to 'plain' like solve().
+	Each output line is the result of the same input line, in order:
+
+	{"line":1,"id":"req-1","result":"OK"}
+	{"line":2,"id":"req-2","result":"NOT_EQUAL","error":"invalid_grant","error_description":"code verifier failed"}
+
+	Input is read and results are written chunk by chunk, memory use does not grow with the input.
+
+python -m pkce generate
+
+	Bulk fixtures for load tests, valid Pixy triples and optionally auth codes from create_auth_code().
+
+	$ python -m pkce generate -n 1000000 -o fixtures.jsonl --auth-codes --code-format compact --workers 8
+	generated 1,000,000 in 4.2s, 238,095 pairs/s
+
+	{"code_verifier":"...","code_challenge":"...","code_challenge_method":"S256","auth_code":"..."}
+
+	--format binary writes a header then one record per pair, read it back with pkce.cli.read_fixtures():
+
+		header:  b'PKCEFIX1' | method (1 byte, 1 S256 2 plain) | has auth codes (1 byte)
+		record:  verifier length (1 byte) | verifier | sha256 digest (32 bytes, S256 only) | auth code length (2 bytes LE) | auth code
+
+	Auth codes are made in the workers, they need FERNET_KEY in their environment.
+
+"""
+
+INVALID_RECORD = 'INVALID_RECORD'
+_SUFFIXES = {}  #> result name -> pre-encoded end of the output line
+
+
+def _suffix(name, response=None):
+	suffix = _SUFFIXES.get(name)
+	if suffix is None:
+		fields = {'result': name, **(response or {})}
+		suffix = _SUFFIXES[name] = json.dumps(fields, separators=(',', ':')).encode()[1:] + b'\n'
+	return suffix
+
+
+def _verify_lines(items, id_field=None):
+	""" Verify a chunk of (line number, json line) items in a worker, return (output bytes, counts by result name).
+	"""
+	out = []
+	counts = Counter()
+	for number, line in items:
+		record_id = None
+		try:
+			record = json.loads(line)
+			if isinstance(record, dict):
+				if id_field is not None:
+					record_id = record.get(id_field)
+				result, response = verify(record.get('code_verifier'), record.get('code_challenge'), record.get('code_challenge_method', 'plain'))
+			elif isinstance(record, list) and 2 <= len(record) <= 3:
+				result, response = verify(*record)
+			else:
+				raise ValueError('not a record')
+			name = result.name
+			suffix = _suffix(name, response)
+		except ValueError:  #> bad json, or not a record
+			name = INVALID_RECORD
+			suffix = _suffix(name)
+		counts[name] += 1
+		prefix = b'{"line":%d,' % number
+		if record_id is not None:
+			prefix += b'"id":' + json.dumps(record_id).encode() + b','
+		out.append(prefix + suffix)
+	return b''.join(out), counts
+
+
+def _records(file):
+	for number, line in enumerate(file, 1):
+		if line.strip():
+			yield number, line
+
+
+def _shutdown(executor):
+	""" Shut the worker pool down without waiting for queued chunks, cancel_futures is python 3.9+.
+	"""
+	if sys.version_info >= (3, 9):
+		executor.shutdown(cancel_futures=True)
+	else:
+		executor.shutdown()  #> _map_chunks() already cancelled the chunks in flight
+
+
+def _open(path, mode, std):
+	""" Open 'path', '-' is 'std', a file that can not be opened exits with a one line message.
+	"""
+	if path == '-':
+		return std
+	try:
+		return open(path, mode, buffering=1 << 20) if 'w' in mode else open(path, mode)
+	except OSError as e:
+		raise SystemExit(f"can not open {path}: {e.strerror}")
+
+
+def verify_command(args):
+	source = _open(args.input, 'rb', sys.stdin.buffer)
+	try:
+		target = _open(args.output, 'wb', sys.stdout.buffer)
+	except SystemExit:
+		if source is not sys.stdin.buffer:
+			source.close()
+		raise
+	workers = (os.cpu_count() or 1) if args.workers is None else args.workers
+	executor = None
+	if workers > 1:
+		from concurrent.futures import ProcessPoolExecutor
+		executor = ProcessPoolExecutor(workers)
+	counts = Counter()
+	start = time.perf_counter()
+	try:
+		for out, chunk_counts in _map_chunks(partial(_verify_lines, id_field=args.id_field), _records(source), executor, args.chunk_size):
+			target.write(out)
+			counts.update(chunk_counts)
+		target.flush()
+	finally:
+		if executor is not None:
+			_shutdown(executor)
+		if source is not sys.stdin.buffer:
+			source.close()
+		if target is not sys.stdout.buffer:
+			target.close()
+	_summary(counts, time.perf_counter() - start)
+	return 0
+
+
+def _summary(counts, elapsed):
+	total = sum(counts.values())
+	print(f"records {total:,} in {elapsed:.1f}s, {total / (elapsed or 1e-9):,.0f} records/s", file=sys.stderr)
+	for name, count in counts.most_common():
+		print(f"{name:<24} {count:>12,}", file=sys.stderr)
+
+
+FIXTURE_MAGIC = b'PKCEFIX1'
+_FIXTURE_METHODS = {'S256': 1, 'plain': 2}
+
+
+def _generate_chunk(counts, code_challenge_method='S256', length=128, output_format='jsonl', auth_codes=False, code_format=None, client_id=None):
+	""" Generate sum(counts) pairs in a worker, return them encoded in 'output_format'.
+	"""
+	count = sum(counts)
+	with redirect_stdout(sys.stderr):  #> the 'plain' warning, stdout is the output
+		batch = generate_many(count, code_challenge_method, length)
+	verifiers, digests = batch._verifiers, batch._digests
+	binary = output_format == 'binary'
+	method = code_challenge_method.encode()
+	claims = {'code_challenge_method': code_challenge_method}
+	if client_id is not None:
+		claims['client_id'] = client_id
+	out = []
+	append = out.append
+	for index in range(count):
+		start = index * VERIFIER_STRIDE
+		verifier = verifiers[start:start + length]
+		if digests is None:
+			digest, challenge = b'', verifier
+		else:
+			digest = digests[index * 32:index * 32 + 32]
+			challenge = base64.urlsafe_b64encode(digest)[:43] if auth_codes or not binary else None
+		if binary:
+			append(bytes((length,)) + verifier + digest)
+		else:
+			append(b'{"code_verifier":"' + verifier + b'","code_challenge":"' + challenge + b'","code_challenge_method":"' + method + b'"')
+		if auth_codes:
+			claims['code_challenge'] = challenge.decode()
+			auth_code = create_auth_code(code_format=code_format, **claims).encode()
+			append(struct.pack('<H', len(auth_code)) + auth_code if binary else b',"auth_code":"' + auth_code + b'"')
+		if not binary:
+			append(b'}\n')
+	return b''.join(out)
+
+
+def _chunk_sizes(n, chunk_size):
+	return (min(chunk_size, n - done) for done in range(0, n, chunk_size))
+
+
+def read_fixtures(file):
+	""" Yield (Pixy, auth code or None) from a file written by 'generate --format binary'.
+	"""
+	header = file.read(len(FIXTURE_MAGIC) + 2)
+	if header[:len(FIXTURE_MAGIC)] != FIXTURE_MAGIC:
+		raise ValueError('not a pkce fixture file')
+	method = {value: name for name, value in _FIXTURE_METHODS.items()}[header[-2]]
+	has_auth_codes = header[-1]
+	while True:
+		length = file.read(1)
+		if not length:
+			return
+		verifier = file.read(length[0]).decode()
+		challenge = base64.urlsafe_b64encode(file.read(32))[:43].decode() if method == 'S256' else verifier
+		auth_code = None
+		if has_auth_codes:
+			auth_code = file.read(struct.unpack('<H', file.read(2))[0]).decode()
+		yield Pixy(verifier, challenge, method), auth_code
+
+
+def generate_command(args):
+	try:
+		_check_length(args.length)
+	except VerifierLength:
+		raise SystemExit(f"--length must be between 43 and 128, not {args.length}")
+	try:
+		_check_method(args.method, CHALLENGE_METHODS)
+	except TransformAlgorithm:
+		raise SystemExit(f"--method {args.method} is not a registered code_challenge_method")
+	if args.n < 0 or args.chunk_size < 1:
+		raise SystemExit("-n and --chunk-size must be positive")
+	target = _open(args.output, 'wb', sys.stdout.buffer)
+	workers = (os.cpu_count() or 1) if args.workers is None else args.workers
+	executor = None
+	if workers > 1:
+		from concurrent.futures import ProcessPoolExecutor
+		executor = ProcessPoolExecutor(workers)
+	job = partial(_generate_chunk, code_challenge_method=args.method, length=args.length, output_format=args.format,
+		auth_codes=args.auth_codes, code_format=args.code_format, client_id=args.client_id)
+	done = 0
+	start = reported = time.perf_counter()
+	try:
+		if args.format == 'binary':
+			target.write(FIXTURE_MAGIC + bytes((_FIXTURE_METHODS[args.method], bool(args.auth_codes))))
+		for out, count in zip(_map_chunks(job, _chunk_sizes(args.n, args.chunk_size), executor, 1), _chunk_sizes(args.n, args.chunk_size)):
+			target.write(out)
+			done += count
+			now = time.perf_counter()
+			if args.progress and now - reported >= args.progress:
+				print(f"generated {done:,} / {args.n:,}, {done / (now - start):,.0f} pairs/s", file=sys.stderr)
+				reported = now
+		target.flush()
+	finally:
+		if executor is not None:
+			_shutdown(executor)
+		if target is not sys.stdout.buffer:
+			target.close()
+	elapsed = time.perf_counter() - start
+	print(f"generated {done:,} in {elapsed:.1f}s, {done / (elapsed or 1e-9):,.0f} pairs/s", file=sys.stderr)
+	return 0
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog='python -m pkce', description='pkce command line tools')
+	commands = parser.add_subparsers(dest='command', required=True)
+
+	verify_parser = commands.add_parser('verify', help='verify JSONL (code_verifier, code_challenge, code_challenge_method) records')
+	verify_parser.add_argument('input', nargs='?', default='-', help='JSONL file, default stdin')
+	verify_parser.add_argument('-o', '--output', default='-', help='JSONL results file, default stdout')
+	verify_parser.add_argument('--workers', type=int, help='worker processes, default one per cpu, 1 runs in process')
+	verify_parser.add_argument('--chunk-size', type=int, default=4096, help='records per worker job')
+	verify_parser.add_argument('--id-field', help='copy this field of each record to its result, ie request_id')
+	verify_parser.set_defaults(func=verify_command)
+
+	generate_parser = commands.add_parser('generate', help='generate Pixy fixtures, and optionally auth codes, for load tests')
+	generate_parser.add_argument('-n', type=int, default=1000, help='number of pairs')
+	generate_parser.add_argument('-o', '--output', default='-', help='output file, default stdout')
+	generate_parser.add_argument('--format', choices=('jsonl', 'binary'), default='jsonl')
+	generate_parser.add_argument('--method', choices=tuple(_FIXTURE_METHODS), default='S256', help='code_challenge_method')
+	generate_parser.add_argument('--length', type=int, default=128, help='verifier length, 43 to 128')
+	generate_parser.add_argument('--auth-codes', action='store_true', help='add an auth code from create_auth_code() to each pair')
+	generate_parser.add_argument('--code-format', choices=('fernet', 'compact', 'binary'), help='auth code format')
+	generate_parser.add_argument('--client-id', help='client_id claim of the auth codes')
+	generate_parser.add_argument('--workers', type=int, help='worker processes, default one per cpu, 1 runs in process')
+	generate_parser.add_argument('--chunk-size', type=int, default=10000, help='pairs per worker job')
+	generate_parser.add_argument('--progress', type=float, default=1.0, help='seconds between throughput reports on stderr, 0 for none')
+	generate_parser.set_defaults(func=generate_command)
+
+	args = parser.parse_args(argv)
+	return args.func(args)
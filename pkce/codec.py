@@ -0,0 +1,192 @@
+"########################"
+"#   AUTH CODE CODEC    #"
+"########################"
+
+import time
+from time import perf_counter
+import json
+import base64
+from os import urandom
+
+from . import pkce as _pkce
+from .pkce import InvalidAuthCode, ReusedAuthCode
+from .replay import replay_key, code_material
+from .keyring import KeyRing, _KeySchedule, KID_MAX_LENGTH
+from .schema import PayloadSchema, DEFAULT_SCHEMA
+
+"""
+
+AuthCodeCodec
+
+	This requires extra installs
+	pip install python-jose[cryptography]
+
+
+CODE FORMATS:
+
+	'fernet'  - HS256 JWT inside a Fernet token (default), starts with 'gAAAAA'
+	'compact' - one pass AES-GCM over compact json, base64url without padding
+	'binary'  - 'compact' over the claims encoded with a pkce.PayloadSchema, the shortest code
+
+		version (1 byte) | nonce (12 bytes) | AES-GCM(claims, aad=version + audience)
+
+	version 1 is json claims, version 2 is schema encoded claims, decode() of a binary
+	code returns a pkce.LazyPayload that decodes each field on first access.
+
+	decode() detects the format from the first character, Fernet tokens always start with 'g'.
+
+	With a pkce.KeyRing either format is prefixed with the key id, 'kid.' + code.
+
+"""
+
+CODE_FORMATS = ('fernet', 'compact', 'binary')
+COMPACT_VERSION = b'\x01'
+BINARY_VERSION = b'\x02'
+
+
+class AuthCodeCodec:
+	""" Encrypt and decrypt the `Authorization Code`, build once and reuse.
+
+		The Fernet cipher and the HS256 signing key are derived once in the constructor,
+		encode() and decode() only do the signing and the encryption. Safe to share across threads.
+
+		EXAMPLE:
+		>>> codec = pkce.AuthCodeCodec(FERNET_KEY, audience="auth_code", ttl=300)
+		>>> auth_code = codec.encode(code_challenge=challenge, code_challenge_method='S256', client_id='mrsimple')
+		>>> codec.decode(auth_code)
+		{'code_challenge': '...', 'code_challenge_method': 'S256', 'client_id': 'mrsimple', 'exp': 1651454521, 'iat': 1651454221, 'aud': 'auth_code'}
+
+		NOTE: key is a Fernet key --> from cryptography.fernet import Fernet;Fernet.generate_key().decode()
+		or a pkce.KeyRing, codes then carry the key id and decode() picks the key with a dict lookup.
+		schema is the pkce.PayloadSchema of 'binary' codes, default pkce.DEFAULT_SCHEMA.
+	"""
+	__slots__ = ('key', 'audience', 'ttl', 'code_format', 'replay_store', 'schema', '_schedule', '_jwt')
+
+	def __init__(self, key, audience: str="auth_code", ttl: int=300, code_format: str="fernet", replay_store=None, schema: PayloadSchema=None):
+		from jose import jwt
+		if code_format not in CODE_FORMATS:
+			raise ValueError(f"'code_format' must be one of {CODE_FORMATS}")
+		if schema is not None and not isinstance(schema, PayloadSchema):
+			raise TypeError("'schema' must be a pkce.PayloadSchema")
+		if isinstance(key, KeyRing):
+			key.primary  #> raises without a primary key
+			self._schedule = None
+		else:
+			self._schedule = _KeySchedule(key)
+			key = self._schedule.key
+
+		self.key = key
+		self.audience = audience
+		self.ttl = ttl
+		self.code_format = code_format
+		self.replay_store = replay_store
+		self.schema = schema or DEFAULT_SCHEMA
+		self._jwt = jwt
+
+	def encode(self, claims=None, *, code_format: str=None, **kwargs) -> str:
+		""" Encode the claims as a short lived auth code, in 'code_format' (default self.code_format).
+
+			'exp', 'iat' and 'aud' are added, the callers dict is not modified.
+		"""
+		to_encode = {**claims, **kwargs} if claims else kwargs.copy()
+		timenow = int(time.time())
+		to_encode['exp'] = timenow + self.ttl  # short lived code tokens.
+		to_encode['iat'] = timenow
+		code_format = code_format or self.code_format
+		schedule, prefix = self._schedule, ''
+		if schedule is None:
+			kid, schedule = self.key.primary
+			prefix = kid.decode() + '.'
+		sink = _pkce._instrumentation
+		if code_format == 'compact':
+			return prefix + self._encode_compact(schedule, to_encode, sink)
+		if code_format == 'binary':
+			return prefix + self._encode_compact(schedule, to_encode, sink, binary=True)
+		if code_format != 'fernet':
+			raise ValueError(f"'code_format' must be one of {CODE_FORMATS}")
+		to_encode['aud'] = self.audience
+		if sink is None:
+			token = self._jwt.encode(to_encode, schedule.signing_key, 'HS256')
+			return prefix + schedule.fernet.encrypt(token.encode()).decode()
+		start = perf_counter()
+		token = self._jwt.encode(to_encode, schedule.signing_key, 'HS256')
+		now = perf_counter()
+		sink.timing('jwt_encode', now - start)
+		auth_code = schedule.fernet.encrypt(token.encode()).decode()
+		sink.timing('fernet_encrypt', perf_counter() - now)
+		return prefix + auth_code
+
+	def decode(self, auth_code, audience: str=None, replay_store=None) -> dict:
+		""" Decrypt the auth code and verify its signature, expiry and audience, return the claims.
+
+			Every code format is accepted, 'binary' codes return a pkce.LazyPayload. With a replay store (argument or self.replay_store)
+			a code that was already decoded raises ReusedAuthCode.
+		"""
+		if isinstance(auth_code, str):
+			auth_code = auth_code.encode()
+		schedule, code = self._schedule, auth_code
+		if schedule is None:
+			dot = auth_code.find(b'.', 0, KID_MAX_LENGTH + 1)  #> base64url codes never contain '.'
+			if dot == 0:
+				raise InvalidAuthCode('Empty auth code key id')
+			schedule = self.key.get(auth_code[:dot] if dot > 0 else None)
+			code = auth_code[dot + 1:]
+		sink = _pkce._instrumentation
+		if code[:1] != b'g':
+			payload = self._decode_compact(schedule, code, audience or self.audience, sink)
+		elif sink is None:
+			token = schedule.fernet.decrypt(code)
+			payload = self._jwt.decode(token, schedule.signing_key, algorithms=['HS256'], audience=audience or self.audience)
+		else:
+			start = perf_counter()
+			token = schedule.fernet.decrypt(code)
+			now = perf_counter()
+			sink.timing('fernet_decrypt', now - start)
+			payload = self._jwt.decode(token, schedule.signing_key, algorithms=['HS256'], audience=audience or self.audience)
+			sink.timing('jwt_decode', perf_counter() - now)
+		if replay_store is None:
+			replay_store = self.replay_store
+		if replay_store is not None:
+			start = perf_counter() if sink is not None else 0
+			first_use = replay_store.check_and_add(replay_key(code_material(code)), payload['exp'])  #> every spelling of a code has one key
+			if sink is not None:
+				sink.timing('replay_check', perf_counter() - start)
+			if not first_use:
+				raise ReusedAuthCode('Auth code already used')
+		return payload
+
+	def _encode_compact(self, schedule, to_encode, sink=None, binary=False):
+		nonce = urandom(12)
+		if binary:
+			version, plaintext = BINARY_VERSION, self.schema.encode(to_encode)
+		else:
+			version, plaintext = COMPACT_VERSION, json.dumps(to_encode, separators=(',', ':')).encode()
+		start = perf_counter() if sink is not None else 0
+		ciphertext = schedule.aead.encrypt(nonce, plaintext, version + self.audience.encode())
+		if sink is not None:
+			sink.timing('aead_encrypt', perf_counter() - start)
+		return base64.urlsafe_b64encode(version + nonce + ciphertext).rstrip(b'=').decode('ascii')
+
+	def _decode_compact(self, schedule, auth_code, audience, sink=None):
+		try:
+			raw = code_material(auth_code)
+		except ValueError:
+			raise InvalidAuthCode('Invalid auth code encoding')
+		version = raw[:1]
+		if version != COMPACT_VERSION and version != BINARY_VERSION:
+			raise InvalidAuthCode('Unknown auth code version')
+		start = perf_counter() if sink is not None else 0
+		try:
+			plaintext = schedule.aead.decrypt(raw[1:13], raw[13:], version + audience.encode())
+		except Exception:
+			raise InvalidAuthCode('Could not decrypt auth code')  #> wrong key, audience, version or tampered
+		if sink is not None:
+			sink.timing('aead_decrypt', perf_counter() - start)
+		if version == BINARY_VERSION:
+			payload = self.schema.decode(plaintext, audience)  #> only exp and iat are decoded here
+		else:
+			payload = json.loads(plaintext)
+			payload['aud'] = audience
+		if payload['exp'] <= time.time():
+			raise InvalidAuthCode('Auth code expired')
+		return payload
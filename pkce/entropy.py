@@ -0,0 +1,205 @@
+"########################"
+"#        ENTROPY       #"
+"########################"
+
+import os
+import time
+import hashlib
+import weakref
+import threading
+from os import urandom
+
+"""
+
+BufferedEntropy
+
+	Opt-in userspace CSPRNG for make_verifier(), make_code(), short_code() and generate_many().
+	A 32 byte key from os.urandom() is expanded in large blocks with ChaCha20 (SHAKE-256 without
+	the cryptography package) and handed out in slices, so most calls make no syscall at all.
+
+	>>> pkce.configure(entropy=True)  #> or entropy=pkce.BufferedEntropy(block_size=1 << 16)
+	>>> pkce.make_verifier()
+	>>> pkce.configure(entropy=False)  #> back to os.urandom() / secrets
+
+	Each block's first 32 bytes replace the key (fast key erasure), so the bytes already handed
+	out can not be recomputed from the current state. The key is mixed with fresh os.urandom()
+	bytes every 'reseed_bytes' bytes or 'reseed_interval' seconds, and after os.fork() in the
+	child, so parent and child never hand out the same bytes.
+
+	>>> pkce.BufferedEntropy(seed=b'benchmark-1')  #> DETERMINISTIC, SHAKE-256 of the seed, never reseeded
+
+NOTE:
+	The seeded mode is for reproducible tests and benchmarks only, NEVER use it in production:
+	anyone with the seed knows every verifier and code. Auth code nonces always come from os.urandom().
+	Bytes not yet handed out sit in memory, a smaller block_size keeps fewer of them.
+
+"""
+
+_SOURCES = weakref.WeakSet()
+_source = None  #> pkce.configure(entropy=...), None is the operating system
+
+
+class _OSBuffer:
+	""" os.urandom() read in blocks and handed out in slices, every byte is used once.
+
+		Thread-safe, dropped in the child after os.fork() so processes never share bytes.
+	"""
+
+	def __init__(self, block_size: int=4096):
+		self.block_size = block_size
+		self.syscalls = 0
+		self._buffer = b''
+		self._offset = 0
+		self._lock = threading.Lock()
+		_SOURCES.add(self)
+
+	def _block(self, size: int) -> bytes:
+		self.syscalls += 1
+		return urandom(size)
+
+	def take(self, n: int) -> bytes:
+		""" n random bytes.
+		"""
+		with self._lock:
+			end = self._offset + n
+			if end <= len(self._buffer):
+				data = self._buffer[self._offset:end]
+				self._offset = end
+				return data
+			data = self._buffer[self._offset:]
+			needed = n - len(data)
+			self._buffer = self._block(max(self.block_size, needed))
+			self._offset = needed
+			return data + self._buffer[:needed]
+
+	def reset(self):
+		""" Drop the buffered bytes, run in the child after os.fork().
+		"""
+		self._buffer = b''
+		self._offset = 0
+		self._lock = threading.Lock()
+
+
+def _chacha20():
+	""" ChaCha20 keystream function, None without the cryptography package.
+	"""
+	try:
+		from cryptography.hazmat.primitives.ciphers import Cipher, algorithms
+	except ImportError:
+		return None
+
+	def keystream(key, counter, size):
+		nonce = b'\x00\x00\x00\x00' + counter.to_bytes(12, 'little')  #> block counter 0, the block index as nonce
+		return Cipher(algorithms.ChaCha20(key, nonce), None).encryptor().update(bytes(size))
+	return keystream
+
+
+def _shake256(key, counter, size):
+	return hashlib.shake_256(key + counter.to_bytes(12, 'little')).digest(size)
+
+
+class BufferedEntropy(_OSBuffer):
+	""" Userspace CSPRNG: a key from os.urandom() expanded in blocks of 'block_size', reseeded on a schedule.
+
+		block_size: bytes generated at once, each block costs one cipher call and no syscall.
+		reseed_bytes, reseed_interval: mix in 32 fresh os.urandom() bytes after this many bytes or seconds.
+		seed: DETERMINISTIC mode for tests and benchmarks, SHAKE-256 of the seed and no reseeding. Not for production.
+	"""
+
+	def __init__(self, block_size: int=1 << 16, reseed_bytes: int=1 << 24, reseed_interval: float=300.0, seed: bytes=None):
+		super().__init__(block_size)
+		self.reseed_bytes = reseed_bytes
+		self.reseed_interval = reseed_interval
+		self.deterministic = seed is not None
+		if self.deterministic:
+			print("WARNING: seeded BufferedEntropy is deterministic, for tests and benchmarks only, NEVER production.")
+			if isinstance(seed, str):
+				seed = seed.encode()
+			self._keystream = _shake256
+			self._key = hashlib.shake_256(b'pkce deterministic entropy ' + bytes(seed)).digest(32)
+		else:
+			self._keystream = _chacha20() or _shake256
+			self._key = self._os_bytes(32)
+		self._counter = 0
+		self._generated = 0
+		self._reseeded_at = time.monotonic()
+
+	def _os_bytes(self, n):
+		self.syscalls += 1
+		return urandom(n)
+
+	def _block(self, size: int) -> bytes:
+		""" The next 'size' bytes of the stream, called with the lock held.
+		"""
+		if not self.deterministic and (self._generated >= self.reseed_bytes or time.monotonic() - self._reseeded_at >= self.reseed_interval):
+			self._reseed()
+		out = self._keystream(self._key, self._counter, size + 32)
+		self._counter += 1
+		self._generated += size
+		self._key = out[:32]  #> fast key erasure
+		return out[32:]
+
+	def _reseed(self, extra: bytes=b''):
+		fresh = b'' if self.deterministic else self._os_bytes(32)
+		self._key = hashlib.sha256(self._key + fresh + extra).digest()
+		self._counter = 0
+		self._generated = 0
+		self._reseeded_at = time.monotonic()
+
+	def reseed(self):
+		""" Mix fresh os.urandom() bytes into the key now and drop the buffered bytes.
+		"""
+		with self._lock:
+			self._reseed()
+			self._buffer = b''
+			self._offset = 0
+
+	def reset(self):
+		""" After os.fork() in the child: drop the buffered bytes and fork the key with the pid, and fresh os.urandom() bytes.
+		"""
+		super().reset()
+		self._reseed(os.getpid().to_bytes(8, 'little'))
+
+
+def _after_fork_in_child():
+	for source in list(_SOURCES):
+		source.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+_os_buffer = _OSBuffer()
+
+
+def _token_bytes(n: int) -> bytes:
+	""" n bytes from the configured source, else straight from os.urandom().
+	"""
+	source = _source
+	return urandom(n) if source is None else source.take(n)
+
+
+def _buffered_bytes(n: int) -> bytes:
+	""" n bytes from the configured source, else from the shared os.urandom() buffer.
+	"""
+	source = _source
+	return _os_buffer.take(n) if source is None else source.take(n)
+
+
+def set_entropy(source):
+	""" The entropy source of the helpers: True for a new BufferedEntropy(), a BufferedEntropy, or False / None for the OS.
+	"""
+	global _source
+	if source is True:
+		source = BufferedEntropy()
+	elif not source:
+		source = None
+	elif not callable(getattr(source, 'take', None)):
+		raise TypeError("'entropy' must be True, False or an object with take(n) -> bytes, ie pkce.BufferedEntropy()")
+	_source = source
+	return source
+
+
+def get_entropy():
+	return _source
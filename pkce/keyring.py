@@ -0,0 +1,168 @@
+"########################"
+"#       KEY RING       #"
+"########################"
+
+import re
+import time
+import base64
+import threading
+
+from .pkce import InvalidAuthCode
+
+"""
+
+KeyRing
+
+	Rotate the auth code key without invalidating the codes in flight. Each code starts with
+	the id of the key that encrypted it, 'kid.', so decoding looks the key up in a dict
+	instead of trying every key in turn like MultiFernet.
+
+	>>> ring = pkce.KeyRing({'2024-01': FERNET_KEY}, primary='2024-01', ttl=300)
+	>>> codec = pkce.AuthCodeCodec(ring)  #> or pkce.configure(key_ring=ring) for create_auth_code()
+	>>> codec.encode(code_challenge=challenge, code_challenge_method='S256')
+	'2024-01.gAAAAABid...'
+	>>> ring.rotate('2024-02', Fernet.generate_key())  #> new codes use 2024-02, 2024-01 still decodes for ttl seconds
+
+NOTE:
+	ttl must be at least the auth code lifetime. 'legacy' names the key that decodes codes
+	without a key id, ie the FERNET_KEY used before the key ring.
+
+"""
+
+KID_PATTERN = re.compile(r'^[A-Za-z0-9_\-]{1,16}$')
+KID_MAX_LENGTH = 16
+
+
+class _KeySchedule:
+	""" Fernet cipher, HS256 signing key and AES-GCM cipher derived from one Fernet key, built once per key.
+	"""
+	__slots__ = ('key', 'fernet', 'signing_key', 'aead')
+
+	def __init__(self, key):
+		from jose import jwk
+		from cryptography.fernet import Fernet
+		from cryptography.hazmat.primitives import hashes
+		from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+		from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+		if isinstance(key, str):
+			key = key.encode()
+		if not key:
+			raise ValueError("requires a key --> from cryptography.fernet import Fernet;Fernet.generate_key().decode()")
+		self.key = key
+		self.fernet = Fernet(key)
+		self.signing_key = jwk.construct(key.decode(), 'HS256')
+		aead_key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'pkce auth code v1').derive(base64.urlsafe_b64decode(key))
+		self.aead = AESGCM(aead_key)
+
+
+def _kid(kid) -> bytes:
+	if isinstance(kid, bytes):
+		kid = kid.decode('ascii', 'replace')
+	if not isinstance(kid, str) or not KID_PATTERN.match(kid):
+		raise ValueError("key id must be 1 to 16 chars of a-z A-Z 0-9 _ -")
+	return kid.encode('ascii')
+
+
+class KeyRing:
+	""" Auth code keys by key id, one primary key encrypts and every live key decrypts.
+
+		keys: {kid: fernet key}
+		primary: kid of the key new codes are encrypted with, default the last one in 'keys'.
+		ttl: seconds a retired key keeps decoding, at least the auth code lifetime.
+		legacy: kid of the key for codes without a key id.
+	"""
+
+	def __init__(self, keys: dict=None, primary: str=None, ttl: float=300, legacy: str=None):
+		self.ttl = ttl
+		self._schedules = {}  #> kid -> _KeySchedule, the decoded key material is cached per key
+		self._retired = {}  #> kid -> retired at
+		self._primary = None
+		self._legacy = None
+		self._lock = threading.Lock()
+		for kid, key in (keys or {}).items():
+			self.add(kid, key)
+		if primary is not None or self._schedules:
+			self.set_primary(primary if primary is not None else kid)
+		if legacy is not None:
+			self._legacy = self._get_kid(legacy)
+
+	def _get_kid(self, kid) -> bytes:
+		kid = _kid(kid)
+		if kid not in self._schedules:
+			raise KeyError(f"unknown key id {kid.decode()}")
+		return kid
+
+	def add(self, kid, key):
+		""" Add a key, it decodes codes right away and encrypts once it is the primary.
+		"""
+		kid = _kid(kid)
+		schedule = _KeySchedule(key)  #> validates the key
+		with self._lock:
+			self._schedules[kid] = schedule
+			self._retired.pop(kid, None)
+
+	def set_primary(self, kid):
+		with self._lock:
+			self._primary = self._get_kid(kid)
+			self._retired.pop(self._primary, None)
+
+	def rotate(self, kid, key):
+		""" Add a key as the new primary, the old primary is retired and keeps decoding for ttl seconds.
+		"""
+		previous = self._primary
+		self.add(kid, key)
+		self.set_primary(kid)
+		if previous is not None and previous != self._primary:
+			self.retire(previous)
+
+	def retire(self, kid, at: float=None):
+		""" Stop decoding with a key 'ttl' seconds after 'at' (default now), the primary can not be retired.
+		"""
+		kid = self._get_kid(kid)
+		if kid == self._primary:
+			raise ValueError("can not retire the primary key, rotate() to a new one first")
+		with self._lock:
+			self._retired[kid] = time.time() if at is None else at
+		self.purge()
+
+	def purge(self):
+		""" Drop the retired keys whose codes have all expired.
+		"""
+		now = time.time()
+		with self._lock:
+			for kid, retired_at in list(self._retired.items()):
+				if retired_at + self.ttl <= now:
+					del self._retired[kid], self._schedules[kid]
+					if self._legacy == kid:
+						self._legacy = None
+
+	@property
+	def primary(self):
+		""" (kid, _KeySchedule) of the key new codes are encrypted with.
+		"""
+		if self._primary is None:
+			raise ValueError("the key ring has no primary key")
+		return self._primary, self._schedules[self._primary]
+
+	def get(self, kid: bytes) -> _KeySchedule:
+		""" Key schedule for a key id from a code, None is the legacy key. Raises InvalidAuthCode for an unknown or expired kid.
+		"""
+		if kid is None:
+			kid = self._legacy
+		schedule = self._schedules.get(kid)
+		if schedule is None:
+			raise InvalidAuthCode('Unknown auth code key id')
+		retired_at = self._retired.get(kid)
+		if retired_at is not None and retired_at + self.ttl <= time.time():
+			self.purge()
+			raise InvalidAuthCode('Auth code key retired')
+		return schedule
+
+	def kids(self) -> list:
+		return [kid.decode() for kid in self._schedules]
+
+	def __contains__(self, kid):
+		return _kid(kid) in self._schedules
+
+	def __len__(self):
+		return len(self._schedules)
@@ -0,0 +1,125 @@
+"########################"
+"#    INSTRUMENTATION   #"
+"########################"
+
+import threading
+from bisect import bisect_left
+
+from . import pkce as _pkce
+
+"""
+
+Instrumentation
+HistogramSink
+set_instrumentation
+
+	Per stage timings and error counts for solve(), create_auth_code() and load_auth_code().
+	Disabled by default, the hot paths only check 'is not None' until a sink is set.
+
+	>>> sink = pkce.HistogramSink()
+	>>> pkce.set_instrumentation(sink)
+	>>> pkce.solve(code_verifier, code_challenge, 'S256')
+	>>> print(sink.render())  #> Prometheus text exposition
+	# TYPE pkce_stage_seconds histogram
+	pkce_stage_seconds_bucket{stage="hashing",le="1e-06"} 0
+	...
+
+STAGES:
+
+	solve:            validation, hashing, compare
+	create_auth_code: jwt_encode, fernet_encrypt (or aead_encrypt for compact codes)
+	load_auth_code:   fernet_decrypt, jwt_decode (or aead_decrypt for compact codes), replay_check
+
+"""
+
+DEFAULT_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2)
+
+
+class Instrumentation:
+	""" Base class for sinks, override timing() and error(). Both are called on the hot path, keep them cheap.
+	"""
+
+	def timing(self, stage: str, seconds: float):
+		""" One stage took 'seconds'.
+		"""
+
+	def error(self, function: str, error: str):
+		""" 'function' returned or raised the error class named 'error'.
+		"""
+
+
+class HistogramSink(Instrumentation):
+	""" In process histograms of stage timings and error counters, render() returns the Prometheus text format.
+	"""
+
+	def __init__(self, buckets=DEFAULT_BUCKETS, prefix: str='pkce'):
+		self.buckets = tuple(sorted(buckets))
+		self.prefix = prefix
+		self._histograms = {}  #> stage -> [bucket counts..., +Inf count, sum]
+		self._errors = {}  #> (function, error) -> count
+		self._lock = threading.Lock()
+
+	def timing(self, stage: str, seconds: float):
+		index = bisect_left(self.buckets, seconds)
+		with self._lock:
+			histogram = self._histograms.get(stage)
+			if histogram is None:
+				histogram = self._histograms[stage] = [0] * (len(self.buckets) + 1) + [0.0]
+			histogram[index] += 1
+			histogram[-1] += seconds
+
+	def error(self, function: str, error: str):
+		with self._lock:
+			key = (function, error)
+			self._errors[key] = self._errors.get(key, 0) + 1
+
+	def errors(self) -> dict:
+		""" {(function, error class name): count}
+		"""
+		with self._lock:
+			return dict(self._errors)
+
+	def count(self, stage: str) -> int:
+		""" Number of timings recorded for a stage.
+		"""
+		with self._lock:
+			histogram = self._histograms.get(stage)
+			return sum(histogram[:-1]) if histogram else 0
+
+	def reset(self):
+		with self._lock:
+			self._histograms.clear()
+			self._errors.clear()
+
+	def render(self) -> str:
+		""" Prometheus text exposition of the histograms and the error counters.
+		"""
+		with self._lock:
+			histograms = {stage: list(histogram) for stage, histogram in self._histograms.items()}
+			errors = dict(self._errors)
+		name = f"{self.prefix}_stage_seconds"
+		lines = [f"# HELP {name} Time spent per stage.", f"# TYPE {name} histogram"]
+		for stage, histogram in sorted(histograms.items()):
+			cumulative = 0
+			for le, count in zip(self.buckets, histogram):
+				cumulative += count
+				lines.append(f'{name}_bucket{{stage="{stage}",le="{le:g}"}} {cumulative}')
+			cumulative += histogram[-2]
+			lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {cumulative}')
+			lines.append(f'{name}_sum{{stage="{stage}"}} {histogram[-1]:.9g}')
+			lines.append(f'{name}_count{{stage="{stage}"}} {cumulative}')
+		name = f"{self.prefix}_errors_total"
+		lines += [f"# HELP {name} Errors returned or raised, by function and error class.", f"# TYPE {name} counter"]
+		for (function, error), count in sorted(errors.items()):
+			lines.append(f'{name}{{function="{function}",error="{error}"}} {count}')
+		return '\n'.join(lines) + '\n'
+
+
+def set_instrumentation(sink: Instrumentation=None):
+	""" Send timings and error counts to 'sink', None disables instrumentation.
+	"""
+	_pkce._instrumentation = sink
+
+
+def get_instrumentation():
+	return _pkce._instrumentation
@@ -0,0 +1,286 @@
+"########################"
+"#      MIDDLEWARE      #"
+"########################"
+
+import json
+from urllib.parse import unquote_to_bytes
+
+from . import pkce as _pkce
+from .pkce import InvalidRequestError, InvalidAuthCode
+
+"""
+
+WSGITokenMiddleware
+ASGITokenMiddleware
+
+	Step 5 of the flow in front of your token endpoint, stdlib only. A POST to 'path' is parsed
+	as it streams in, then load_auth_code(), compare() of client_id / redirect_uri and solve() run.
+	A failure is answered with the error class 'response' as json (400), a verified request is
+	passed on to your app with the claims of the auth code and the parsed form:
+
+		WSGI: environ['pkce.auth_code'], environ['pkce.form']
+		ASGI: scope['pkce.auth_code'], scope['pkce.form']  #> the checks run on pkce.AsyncRunner, off the event loop
+
+	>>> app = pkce.WSGITokenMiddleware(issue_tokens, path='/token', replay_store=pkce.MemoryReplayStore())
+	>>> app = pkce.ASGITokenMiddleware(issue_tokens, path='/token', replay_store=pkce.MemoryReplayStore())
+
+	def issue_tokens(environ, start_response):
+		claims = environ['pkce.auth_code']  #> client_id and redirect_uri already match the form
+		...
+
+NOTE:
+	The body is consumed, your app reads the form from 'pkce.form'. Only the token request
+	fields are kept: grant_type, code, code_verifier, client_id, redirect_uri.
+
+"""
+
+TOKEN_FIELDS = ('grant_type', 'code', 'code_verifier', 'client_id', 'redirect_uri')
+FORM_CONTENT_TYPE = b'application/x-www-form-urlencoded'
+MAX_BODY = 16384
+
+_JSON_HEADERS = [('Content-Type', 'application/json'), ('Cache-Control', 'no-store'), ('Pragma', 'no-cache')]
+_BODIES = {}  #> id(response dict) -> (response dict, json bytes)
+
+
+def _json_body(response) -> bytes:
+	cached = _BODIES.get(id(response))
+	if cached is None or cached[0] is not response:
+		cached = _BODIES[id(response)] = (response, json.dumps(response).encode())
+	return cached[1]
+
+
+class BodyTooLarge(InvalidRequestError):
+	""" token request body over 'max_body' bytes
+	"""
+	response = {"error": "invalid_request", "error_description": "request body too large"}
+
+
+class FormParser:
+	""" Incremental application/x-www-form-urlencoded parser, feed() the body chunks as they arrive then close().
+
+		Only the 'fields' are decoded, a field sent twice makes the form invalid (RFC 6749 3.2).
+	"""
+	__slots__ = ('fields', 'max_body', 'values', 'duplicate', '_pending', '_size')
+
+	def __init__(self, fields=TOKEN_FIELDS, max_body: int=MAX_BODY):
+		self.fields = frozenset(field.encode() for field in fields)
+		self.max_body = max_body
+		self.values = {}
+		self.duplicate = False
+		self._pending = b''
+		self._size = 0
+
+	def feed(self, chunk: bytes):
+		""" Parse every complete 'name=value' in the chunk, keep the tail for the next one. Raises BodyTooLarge.
+		"""
+		self._size += len(chunk)
+		if self._size > self.max_body:
+			raise BodyTooLarge()
+		if self._pending:
+			chunk = self._pending + chunk
+		end = chunk.rfind(b'&')
+		if end < 0:
+			self._pending = bytes(chunk)
+			return
+		self._pending = bytes(chunk[end + 1:])
+		self._fields(chunk[:end].split(b'&'))
+
+	def _fields(self, pairs):
+		fields, values = self.fields, self.values
+		for pair in pairs:
+			name, _, value = pair.partition(b'=')
+			if name not in fields:
+				if b'%' not in name and b'+' not in name:
+					continue
+				name = unquote_to_bytes(name.replace(b'+', b' '))
+				if name not in fields:
+					continue
+			if name in values:
+				self.duplicate = True
+			values[name] = value
+
+	def close(self) -> dict:
+		""" The parsed {field: str}, values that are not utf-8 are dropped.
+		"""
+		if self._pending:
+			self._fields((self._pending,))
+			self._pending = b''
+		form = {}
+		for name, value in self.values.items():
+			if b'%' in value or b'+' in value:
+				value = unquote_to_bytes(value.replace(b'+', b' '))
+			try:
+				form[name.decode()] = value.decode()
+			except UnicodeDecodeError:
+				pass
+		return form
+
+
+def _utf8(value):
+	return value.encode() if isinstance(value, str) else value
+
+
+class TokenVerifier:
+	""" The token endpoint checks on a parsed form, shared by both middlewares.
+
+		codec: a pkce.AuthCodeCodec, default the module codec of pkce.load_auth_code().
+		replay_store: makes each code single use.
+		admission: a pkce.AdmissionControl, abusive clients and failed codes are rejected before any decryption.
+	"""
+
+	def __init__(self, codec=None, replay_store=None, admission=None, audience: str="auth_code"):
+		self.codec = codec
+		self.replay_store = replay_store
+		self.admission = admission
+		self.audience = audience
+
+	def verify(self, form: dict):
+		""" (claims, None) for a verified token request, else (None, error 'response' dict).
+		"""
+		if form.get('grant_type') != 'authorization_code' or not form.get('code'):
+			return None, InvalidRequestError.response
+		auth_code, client_id = form['code'], form.get('client_id')
+		admission = self.admission
+		try:
+			if admission is not None:
+				payload = admission.load_auth_code(auth_code, client_id, self.audience, self.replay_store, self.codec)
+			elif self.codec is not None:
+				payload = self.codec.decode(auth_code, self.audience, self.replay_store)
+			else:
+				payload = _pkce.load_auth_code(auth_code, self.audience, self.replay_store)
+		except (InvalidRequestError, InvalidAuthCode) as e:
+			return None, e.response
+		except Exception:  #> Fernet / jwt errors
+			return None, InvalidAuthCode.response
+		for name in ('client_id', 'redirect_uri'):
+			expected = payload.get(name)
+			if expected is not None and not _pkce.compare(_utf8(expected), _utf8(form.get(name))):  #> compare_digest() raises TypeError on non-ascii str
+				if admission is not None:
+					admission.failure(client_id, auth_code)
+				return None, InvalidAuthCode.response
+		challenge, method = payload.get('code_challenge'), payload.get('code_challenge_method', 'plain')
+		if admission is not None:
+			result = admission.solve(form.get('code_verifier'), challenge, method, client_id, auth_code, admit=False)
+		else:
+			result = _pkce.solve(form.get('code_verifier'), challenge, method)
+		if result is not True:
+			return None, result
+		return payload, None
+
+
+class WSGITokenMiddleware:
+	""" WSGI middleware verifying the PKCE token request on POST 'path', other requests go straight to 'app'.
+
+		The remaining keyword arguments are the TokenVerifier ones.
+	"""
+
+	def __init__(self, app, path: str='/token', max_body: int=MAX_BODY, chunk_size: int=4096, **kwargs):
+		self.app = app
+		self.path = path
+		self.max_body = max_body
+		self.chunk_size = chunk_size
+		self.verifier = TokenVerifier(**kwargs)
+
+	def __call__(self, environ, start_response):
+		if environ.get('PATH_INFO') != self.path or environ.get('REQUEST_METHOD') != 'POST':
+			return self.app(environ, start_response)
+		if not environ.get('CONTENT_TYPE', '').startswith(FORM_CONTENT_TYPE.decode()):
+			return self._error(start_response, InvalidRequestError.response)
+		parser = FormParser(max_body=self.max_body)
+		stream = environ['wsgi.input']
+		try:
+			remaining = int(environ.get('CONTENT_LENGTH') or 0)
+		except ValueError:
+			return self._error(start_response, InvalidRequestError.response)
+		try:
+			if remaining > self.max_body:
+				raise BodyTooLarge()
+			while remaining > 0:
+				chunk = stream.read(min(remaining, self.chunk_size))
+				if not chunk:
+					break
+				remaining -= len(chunk)
+				parser.feed(chunk)
+		except BodyTooLarge as e:
+			return self._error(start_response, e.response, '413 Content Too Large')
+		form = parser.close()
+		if parser.duplicate:
+			return self._error(start_response, InvalidRequestError.response)
+		payload, response = self.verifier.verify(form)
+		if response is not None:
+			return self._error(start_response, response)
+		environ['pkce.auth_code'] = payload
+		environ['pkce.form'] = form
+		return self.app(environ, start_response)
+
+	@staticmethod
+	def _error(start_response, response, status='400 Bad Request'):
+		body = _json_body(response)
+		start_response(status, _JSON_HEADERS + [('Content-Length', str(len(body)))])
+		return [body]
+
+
+_ASGI_JSON_HEADERS = [(name.lower().encode(), value.encode()) for name, value in _JSON_HEADERS]
+
+
+class ASGITokenMiddleware:
+	""" ASGI middleware verifying the PKCE token request on POST 'path', other requests go straight to 'app'.
+
+		The checks run on 'runner' (a pkce.AsyncRunner, default the one of pkce.configure_async()),
+		so the decryption and the hashing never block the event loop. The remaining keyword arguments are the TokenVerifier ones.
+	"""
+
+	def __init__(self, app, path: str='/token', max_body: int=MAX_BODY, runner=None, **kwargs):
+		self.app = app
+		self.path = path
+		self.max_body = max_body
+		self.runner = runner
+		self.verifier = TokenVerifier(**kwargs)
+
+	async def __call__(self, scope, receive, send):
+		if scope['type'] != 'http' or scope['path'] != self.path or scope['method'] != 'POST':
+			return await self.app(scope, receive, send)
+		content_type = b''
+		for name, value in scope.get('headers', ()):
+			if name == b'content-type':
+				content_type = value
+				break
+		if not content_type.startswith(FORM_CONTENT_TYPE):
+			return await self._error(send, InvalidRequestError.response)
+		parser = FormParser(max_body=self.max_body)
+		try:
+			while True:
+				message = await receive()
+				if message['type'] == 'http.disconnect':
+					return
+				parser.feed(message.get('body', b''))
+				if not message.get('more_body'):
+					break
+		except BodyTooLarge as e:
+			return await self._error(send, e.response, 413)
+		form = parser.close()
+		if parser.duplicate:
+			return await self._error(send, InvalidRequestError.response)
+		runner = self.runner
+		if runner is None:
+			from . import aio
+			runner = aio._runner
+		payload, response = await runner.run(self.verifier.verify, form)
+		if response is not None:
+			return await self._error(send, response)
+		consumed = False
+
+		async def replay_receive():
+			nonlocal consumed
+			if consumed:
+				return await receive()
+			consumed = True
+			return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+		await self.app({**scope, 'pkce.auth_code': payload, 'pkce.form': form}, replay_receive, send)
+
+	@staticmethod
+	async def _error(send, response, status=400):
+		body = _json_body(response)
+		await send({'type': 'http.response.start', 'status': status, 'headers': _ASGI_JSON_HEADERS + [(b'content-length', str(len(body)).encode())]})
+		await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,151 @@
+"########################"
+"#  PENDING AUTH CODES  #"
+"########################"
+
+import sys
+import time
+import hashlib
+import secrets
+import threading
+from typing import NamedTuple
+
+from . import pkce as _pkce
+from .replay import replay_key
+from .schema import _digest
+from .wheel import TimingWheel
+
+"""
+
+PendingAuthorizationStore
+
+	Step 4 of the flow, the server keeps the `Code Challenge` with the `Authorization Code`
+	until the client exchanges the code with its `Code Verifier`.
+
+	>>> store = pkce.PendingAuthorizationStore(ttl=300)
+	>>> store.put(auth_code, code_challenge, 'S256', client_id='mrsimple', redirect_uri='https://a.b/cb', state=state)
+	>>> result, entry = store.redeem(auth_code, code_verifier)  #> the entry is deleted either way
+	>>> result
+	True
+	>>> entry.client_id
+	'mrsimple'
+	>>> store.redeem(auth_code, code_verifier)
+	({'error': 'invalid_grant', 'error_description': 'authorization code invalid'}, None)
+
+NOTE:
+	Entries are keyed by a 16 byte hash of the code, an S256 challenge is kept as its 32 byte
+	digest and client_id / redirect_uri are interned, so repeated values are stored once.
+	Expiry runs on a hierarchical timing wheel advanced by put() and redeem(), no timers and no scans.
+
+"""
+
+
+class PendingAuthorization(NamedTuple):
+	""" One pending code, code_challenge is the raw sha256 digest for S256 and the ascii bytes for other methods.
+	"""
+	code_challenge: bytes
+	code_challenge_method: str
+	client_id: str
+	redirect_uri: str
+	state: str
+	expires_at: float
+
+
+class PendingAuthorizationStore:
+	""" In process store of auth code -> PendingAuthorization, sharded dicts with a lock and a timing wheel per shard.
+	"""
+
+	def __init__(self, ttl: float=300, shards: int=16, tick: float=1.0):
+		self.ttl = ttl
+		now = time.time()
+		self._shards = [{} for _ in range(shards)]
+		self._wheels = [TimingWheel(tick, now=now) for _ in range(shards)]
+		self._locks = [threading.Lock() for _ in range(shards)]
+
+	def put(self, auth_code, code_challenge, code_challenge_method='S256', client_id=None, redirect_uri=None, state=None, ttl: float=None):
+		""" Save a code with its challenge until redeemed or 'ttl' seconds pass.
+
+			Raises the same errors as pkce.solve() checks for a missing challenge or an unsupported method.
+		"""
+		_pkce._check_challenge(code_challenge)
+		_pkce._check_method(code_challenge_method)
+		if isinstance(code_challenge, str):
+			if not code_challenge.isascii():
+				raise _pkce.InvalidRequestError('code_challenge is not ascii')
+			code_challenge = code_challenge.encode('ascii')
+		if code_challenge_method == 'S256':
+			digest = _digest(bytes(code_challenge).decode('latin-1'))  #> None unless it round trips, non-ascii bytes included
+			if digest is None or len(digest) != 32:  #> 42 chars + '=' can round trip as 31 bytes
+				raise _pkce.InvalidRequestError('S256 code_challenge is a 43 character base64url digest')
+			code_challenge = digest
+		else:
+			code_challenge = bytes(code_challenge)
+		now = time.time()
+		expires_at = now + (self.ttl if ttl is None else ttl)
+		entry = PendingAuthorization(
+			code_challenge,
+			sys.intern(code_challenge_method),
+			sys.intern(client_id) if client_id is not None else None,
+			sys.intern(redirect_uri) if redirect_uri is not None else None,
+			state,
+			expires_at,
+		)
+		key = replay_key(auth_code)
+		index = key[0] % len(self._shards)
+		with self._locks[index]:
+			self._expire(index, now)
+			self._shards[index][key] = entry
+			self._wheels[index].schedule(key, expires_at)
+
+	def redeem(self, auth_code, code_verifier, client_id=None, redirect_uri=None):
+		""" Delete the code and solve its challenge in one step, return (result, entry).
+
+			result is True or an error 'response' dict, like pkce.solve(). entry is None when the
+			code is unknown or expired, or when client_id / redirect_uri are given and do not match.
+		"""
+		key = replay_key(auth_code)
+		index = key[0] % len(self._shards)
+		now = time.time()
+		with self._locks[index]:
+			entry = self._shards[index].pop(key, None)
+			self._expire(index, now)
+		if entry is None or entry.expires_at <= now:
+			return _pkce.InvalidAuthCode.response, None
+		if (client_id is not None and client_id != entry.client_id) or (redirect_uri is not None and redirect_uri != entry.redirect_uri):
+			return _pkce.InvalidAuthCode.response, None
+		return _pkce._SOLVE_RESPONSES[_solve_entry(entry, code_verifier)], entry
+
+	def _expire(self, index, now):
+		shard = self._shards[index]
+		for key in self._wheels[index].advance(now):
+			entry = shard.get(key)
+			if entry is not None and entry.expires_at <= now:
+				del shard[key]
+
+	def expire(self):
+		""" Drop every expired entry now, put() and redeem() do this for their own shard.
+		"""
+		now = time.time()
+		for index, lock in enumerate(self._locks):
+			with lock:
+				self._expire(index, now)
+
+	def __len__(self):
+		return sum(len(shard) for shard in self._shards)
+
+	def __contains__(self, auth_code):
+		key = replay_key(auth_code)
+		entry = self._shards[key[0] % len(self._shards)].get(key)
+		return entry is not None and entry.expires_at > time.time()
+
+
+def _solve_entry(entry, code_verifier) -> _pkce.SolveResult:
+	verifier = _pkce._verifier_bytes(code_verifier)
+	if verifier is None:
+		return _pkce.SolveResult.INVALID_VERIFIER
+	if entry.code_challenge_method == 'S256':
+		verifier = hashlib.sha256(verifier).digest()
+	else:
+		verifier = _pkce.CHALLENGE_METHODS[entry.code_challenge_method](verifier)
+	if secrets.compare_digest(verifier, entry.code_challenge):
+		return _pkce.SolveResult.OK
+	return _pkce.SolveResult.NOT_EQUAL
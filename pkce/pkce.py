@@ -154,13 +154,21 @@ import secrets
 import hashlib
 import base64
 import re
+import enum
 from os import getenv
-from dataclasses import dataclass, asdict, astuple
-from copy import deepcopy
+from time import perf_counter
+from types import MappingProxyType
+from dataclasses import dataclass
+
+from . import entropy as _entropy
 
 CODE_VERIFIER_PATTERN = re.compile(r'^[a-zA-Z0-9\-._~]{43,128}$')
-FERNET_KEY = getenv('FERNET_KEY', '').encode()
-VERBOSE_PKCE = getenv('VERBOSE_PKCE', '')
+# Same charset as CODE_VERIFIER_PATTERN as a byte table, bytes.translate(None, CODE_VERIFIER_CHARSET) leaves only the bad bytes.
+CODE_VERIFIER_CHARSET = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~'
+FERNET_KEY = getenv('FERNET_KEY', '').encode()  #> change at runtime with pkce.configure(fernet_key=...)
+VERBOSE_PKCE = getenv('VERBOSE_PKCE', '')  #> change at runtime with pkce.configure(verbose=...)
+KEY_RING = None  #> pkce.configure(key_ring=pkce.KeyRing(...)), used instead of FERNET_KEY
+_instrumentation = None  #> pkce.set_instrumentation(sink)
 # APPLICATION_NAME="auth_server"
 
 # from cryptography.fernet import Fernet
@@ -194,30 +202,89 @@ def verbose(*args):
 		print(*args)
 
 
+def configure(fernet_key=None, verbose=None, key_ring=None, accepted_methods=None, entropy=None):
+	""" Set FERNET_KEY and VERBOSE_PKCE at runtime, instead of the environment read at import.
+
+		Arguments left as None are unchanged, the default auth code codec is rebuilt on next use.
+		key_ring: a pkce.KeyRing, create_auth_code() and load_auth_code() use it instead of FERNET_KEY,
+			pass False to go back to FERNET_KEY.
+		accepted_methods: the code_challenge_method names this server accepts, ie ['S256'],
+			each must be in CHALLENGE_METHODS. Default every registered method.
+		entropy: True or a pkce.BufferedEntropy, make_verifier(), make_code(), short_code() and generate_many()
+			take their random bytes from it instead of the OS, pass False to go back.
+
+		EXAMPLE:
+		>>> pkce.configure(fernet_key=secrets_manager.get('FERNET_KEY'), verbose=False)
+		>>> pkce.configure(key_ring=pkce.KeyRing({'k1': key1, 'k2': key2}, primary='k2', legacy='k1'))
+		>>> pkce.configure(accepted_methods=['S256'])  #> refuse 'plain'
+		>>> pkce.configure(entropy=True)  #> buffered userspace CSPRNG, fewer syscalls
+	"""
+	global FERNET_KEY, VERBOSE_PKCE, KEY_RING, ACCEPTED_METHODS, _accepted_transforms, _default_codec
+	if fernet_key is not None:
+		FERNET_KEY = fernet_key.encode() if isinstance(fernet_key, str) else bytes(fernet_key)
+		_default_codec = None
+	if key_ring is not None:
+		KEY_RING = key_ring or None
+		_default_codec = None
+	if verbose is not None:
+		VERBOSE_PKCE = '1' if verbose else ''
+	if accepted_methods is not None:
+		unknown = [method for method in accepted_methods if method not in CHALLENGE_METHODS]
+		if unknown or not accepted_methods:
+			raise ValueError(f"'accepted_methods' must be registered methods, not {unknown}")
+		ACCEPTED_METHODS = tuple(accepted_methods)
+		_accepted_transforms = {method: CHALLENGE_METHODS[method] for method in ACCEPTED_METHODS}  #> rebound, never seen half built by solve()
+	if entropy is not None:
+		_entropy.set_entropy(entropy)
+
+
 "###################"
 "#     MODELS      #"
 "###################"
 
 
-@dataclass
+@dataclass(frozen=True, init=False)
 class Pixy:
 	""" PKCE wrapper class
+
+		Immutable and slotted, hashable and compared by value.
+		pixy.dict(), pixy.tuple() and dict(pixy) build the result directly, no deep copy.
 	"""
+	__slots__ = ('code_verifier', 'code_challenge', 'code_challenge_method')
 	code_verifier: str
 	code_challenge: str
 	code_challenge_method: str
+
+	def __init__(self, code_verifier: str, code_challenge: str, code_challenge_method: str):
+		# slot descriptors skip the frozen __setattr__, about twice as fast as the generated __init__
+		_set_verifier(self, code_verifier)
+		_set_challenge(self, code_challenge)
+		_set_method(self, code_challenge_method)
 	
 	def dict(self):
-		return asdict(self)
+		return {
+			'code_verifier': self.code_verifier,
+			'code_challenge': self.code_challenge,
+			'code_challenge_method': self.code_challenge_method,
+		}
 	
 	def tuple(self):
-		return astuple(self)
+		return (self.code_verifier, self.code_challenge, self.code_challenge_method)
 	
 	def __iter__(self):
-		return iter(self.__dict__.items())
+		return iter((
+			('code_verifier', self.code_verifier),
+			('code_challenge', self.code_challenge),
+			('code_challenge_method', self.code_challenge_method),
+		))
+
+	def __reduce__(self):
+		return (Pixy, self.tuple())
+
 
-	def __cmp__(self, dict_):
-	    return self.__cmp__(self.__dict__, dict_)
+_set_verifier = Pixy.__dict__['code_verifier'].__set__
+_set_challenge = Pixy.__dict__['code_challenge'].__set__
+_set_method = Pixy.__dict__['code_challenge_method'].__set__
 
 
 "###################"
@@ -255,6 +322,67 @@ class InvalidRequestError(Exception):
 	response = {"error": "invalid_request", "error_description": "verifier is out of spec"}
 
 
+class InvalidAuthCode(Exception):
+	""" auth code could not be decrypted, has expired or is for another audience
+	"""
+	response = {"error": "invalid_grant", "error_description": "authorization code invalid"}
+
+
+class ReusedAuthCode(InvalidAuthCode):
+	""" auth code was already exchanged, it may only be used once
+	"""
+	response = {"error": "invalid_grant", "error_description": "authorization code already used"}
+
+
+class TooManyRequests(InvalidRequestError):
+	""" client_id is over its request rate, see pkce.AdmissionControl
+	"""
+	response = {"error": "invalid_request", "error_description": "too many requests"}
+
+
+class RejectedAuthCode(InvalidAuthCode):
+	""" auth code failed recently or is over its attempts, see pkce.AdmissionControl
+	"""
+	response = {"error": "invalid_grant", "error_description": "authorization code rejected"}
+
+
+UNKNOWN_ERROR = {"error": "invalid_request", "error_description": "unknown error"}
+
+
+"###################"
+"#     RESULTS     #"
+"###################"
+
+
+class SolveResult(enum.IntEnum):
+	""" Outcome of pkce.verify(), OK is 0 so a failure is truthy.
+	"""
+	OK = 0
+	INVALID_VERIFIER = 1
+	MISSING_CHALLENGE = 2
+	UNSUPPORTED_METHOD = 3
+	NOT_EQUAL = 4
+	UNKNOWN_ERROR = 5
+
+
+# Exception raised for each failed result, for callers who want to raise.
+SOLVE_ERRORS = {
+	SolveResult.INVALID_VERIFIER: InvalidRequestError,
+	SolveResult.MISSING_CHALLENGE: MissingChallenge,
+	SolveResult.UNSUPPORTED_METHOD: TransformAlgorithm,
+	SolveResult.NOT_EQUAL: NotEqual,
+}
+
+# solve() return value for each result, the exceptions' own response dicts.
+_SOLVE_RESPONSES = {result: error.response for result, error in SOLVE_ERRORS.items()}
+_SOLVE_RESPONSES[SolveResult.OK] = True
+_SOLVE_RESPONSES[SolveResult.UNKNOWN_ERROR] = UNKNOWN_ERROR
+
+# verify() return value for each result, pre-built (result, read-only response) pairs.
+_VERIFY_RESULTS = {result: (result, MappingProxyType(dict(response))) for result, response in _SOLVE_RESPONSES.items() if result}
+_VERIFY_RESULTS[SolveResult.OK] = (SolveResult.OK, None)
+
+
 "###################"
 "#     HELPERS     #"
 "###################"
@@ -269,32 +397,118 @@ def _check_length(length=None):
 	raise VerifierLength(f"Too short: 'code_verifier' must be between 43 and 128")
 
 
+def _verifier_bytes(code_verifier):
+	""" Return the verifier as ascii bytes, or None when it is out of spec.
+
+		Accepts str, bytes, bytearray or memoryview, checked against CODE_VERIFIER_CHARSET.
+	"""
+	if isinstance(code_verifier, str):
+		if not code_verifier.isascii():
+			return None
+		code_verifier = code_verifier.encode('ascii')
+	elif isinstance(code_verifier, (bytearray, memoryview)):
+		code_verifier = bytes(code_verifier)
+	elif not isinstance(code_verifier, bytes):
+		return None
+	if 43 <= len(code_verifier) <= 128 and not code_verifier.translate(None, CODE_VERIFIER_CHARSET):
+		return code_verifier
+	return None
+
+
 def _check_verifier(code_verifier=None):
 	""" Check verifier is correct format
 	"""
 	# CODE_VERIFIER_PATTERN = re.compile(r'^[a-zA-Z0-9\-._~]{43,128}$')
-	if isinstance(code_verifier, str):
-		if CODE_VERIFIER_PATTERN.match(code_verifier):
-			return True
+	if _verifier_bytes(code_verifier) is not None:
+		return True
 	raise InvalidRequestError('Invalid "code_verifier"')
 
 
 def _check_challenge(code_challenge=None):
 	""" Check a challenge is the right type
 	"""
-	if isinstance(code_challenge, str):
+	if isinstance(code_challenge, (str, bytes, bytearray, memoryview)):
 		return True
 	raise MissingChallenge('PKCE is required')
 
 
 def _check_method(code_challenge_method=None, accepted_methods=None):
-	""" Check a method is accepted
+	""" Check a method is accepted, by default one of ACCEPTED_METHODS
 	"""
-	if code_challenge_method in (accepted_methods or ['S256', 'plain']):
-		return True
+	try:
+		if code_challenge_method in (accepted_methods or _accepted_transforms):
+			return True
+	except TypeError:  #> unhashable
+		pass
 	raise TransformAlgorithm('transform algorithm not supported')
 
 
+"######################"
+"#     TRANSFORMS     #"
+"######################"
+
+
+def s256_transform(code_verifier: bytes) -> bytes:
+	""" This is the default method to generate a code_challenge using SHA256
+
+		BASE64URL-ENCODE(SHA256(ASCII(code_verifier))) == code_challenge
+
+		NOTE: https://datatracker.ietf.org/doc/html/rfc7636#appendix-A
+	"""
+	return base64.urlsafe_b64encode(hashlib.sha256(code_verifier).digest())[:43]  #> 43 chars, the trailing '=' removed as per spec
+
+
+def plain_transform(code_verifier: bytes) -> bytes:
+	""" no tranformations is done
+	"""
+	return code_verifier
+
+
+def sha512_transform(code_verifier: bytes) -> bytes:
+	""" BASE64URL-ENCODE(SHA512(ASCII(code_verifier))), 86 chars. Not in RFC 7636, for internal deployments.
+	"""
+	return base64.urlsafe_b64encode(hashlib.sha512(code_verifier).digest())[:86]
+
+
+def blake2b_transform(code_verifier: bytes) -> bytes:
+	""" BASE64URL-ENCODE(BLAKE2b-256(ASCII(code_verifier))), 43 chars. Not in RFC 7636, for internal deployments.
+	"""
+	return base64.urlsafe_b64encode(hashlib.blake2b(code_verifier, digest_size=32).digest())[:43]
+
+
+# code_challenge_method -> transform(verifier bytes) -> challenge bytes, built once at import.
+CHALLENGE_METHODS = {
+	"S256": s256_transform,
+	"plain": plain_transform,
+}
+ACCEPTED_METHODS = tuple(CHALLENGE_METHODS)  #> change with pkce.configure(accepted_methods=...)
+_accepted_transforms = dict(CHALLENGE_METHODS)  #> the accepted subset of CHALLENGE_METHODS, one lookup in solve()
+
+
+def register_method(name: str, transform, accept: bool=True):
+	""" Add a code_challenge_method, transform(verifier bytes) returns the challenge as base64url bytes.
+
+		accept: also add it to ACCEPTED_METHODS, so solve() accepts it.
+
+		EXAMPLE:
+		>>> pkce.register_method('S512', pkce.sha512_transform)
+		>>> pixy = pkce.generate('S512')
+		>>> pkce.solve(pixy.code_verifier, pixy.code_challenge, 'S512')
+		True
+
+		NOTE: only S256 and plain are in RFC 7636, other methods only work between your own clients and servers.
+	"""
+	global ACCEPTED_METHODS, _accepted_transforms
+	if not isinstance(name, str) or not name or not callable(transform):
+		raise ValueError("register_method() takes a method name and a callable")
+	if name in CHALLENGE_METHODS:
+		raise ValueError(f"'{name}' is already registered")
+	CHALLENGE_METHODS[name] = transform
+	if accept:
+		ACCEPTED_METHODS += (name,)
+		_accepted_transforms = {**_accepted_transforms, name: transform}
+
+
 
 "################"
 "#     CORE     #"
@@ -342,74 +556,135 @@ def make_verifier(length: int=128) -> str:
 		NOTE: len(secrets.token_urlsafe(96)) == 128
 	""" 
 	_check_length(length)
+	source = _entropy._source
+	if source is not None:  #> pkce.configure(entropy=...)
+		return base64.urlsafe_b64encode(source.take(96))[:length].decode('ascii')
 	code_verifier = secrets.token_urlsafe(96)[:length]
 	return code_verifier
 
 
-def make_challenge(code_verifier: str, code_challenge_method="S256") -> str:
+def make_challenge(code_verifier, code_challenge_method="S256") -> str:
 	""" Create the challenge by hashing the verifier
 		
 		ie return the hash the password (code_verifier)
 		Return the PKCE-compliant code challenge for a given verifier.
 
+		code_verifier can be a str, bytes or memoryview, the challenge is always a str.
+		code_challenge_method is any method of CHALLENGE_METHODS, ACCEPTED_METHODS only limits what solve() accepts.
 	"""
-	def sha256_method(code_verifier: str) -> str:
-		""" This is the default method to generate a code_challenge using SHA256
-
-			BASE64URL-ENCODE(SHA256(ASCII(code_verifier))) == code_challenge
-			
-			NOTE: https://datatracker.ietf.org/doc/html/rfc7636#appendix-A
-		"""
-		hashed_verifier = hashlib.sha256(code_verifier.encode('ascii')).digest()
-		encoded_verifier = base64.urlsafe_b64encode(hashed_verifier)
-		code_challenge = encoded_verifier.decode('ascii').rstrip('=') # removing trailing '=' as per spec
-		return code_challenge #> sG28713i0hoCxpJvEpQi2lgPm14Fz6jYf8V5UUg7J9A
-
-	challenge_function = {
-		"S256": sha256_method,
-		"plain": lambda code_verifier: code_verifier, #> no tranformations is done
-	}
-
-	_check_verifier(code_verifier)
-	_check_method(code_challenge_method)
-	
-	code_challenge = challenge_function.get(code_challenge_method)(code_verifier)
-	return code_challenge
+	verifier = _verifier_bytes(code_verifier)
+	if verifier is None:
+		raise InvalidRequestError('Invalid "code_verifier"')
+	try:
+		transform = CHALLENGE_METHODS.get(code_challenge_method)
+	except TypeError:  #> unhashable
+		transform = None
+	if transform is None:
+		raise TransformAlgorithm('transform algorithm not supported')
+	return transform(verifier).decode('ascii')  #> sG28713i0hoCxpJvEpQi2lgPm14Fz6jYf8V5UUg7J9A
 
 
 def solve(code_verifier=None, code_challenge=None, code_challenge_method="plain") -> bool:
 	""" Solve code_challenge by hashing code_verifier and safly comparing strings. 
 		default solve method is 'plain' as per the spec (default generate method is S256)
+
+		Returns True or the 'response' dict of the matching error class,
+		nothing is raised, use pkce.verify() to get a SolveResult.
+	"""
+	if _instrumentation is None:
+		return _SOLVE_RESPONSES[_verify(code_verifier, code_challenge, code_challenge_method)]
+	return _SOLVE_RESPONSES[_verify_instrumented(_instrumentation, 'solve', code_verifier, code_challenge, code_challenge_method)]
+
+
+def verify(code_verifier=None, code_challenge=None, code_challenge_method="plain"):
+	""" Same checks as solve(), returns a pre-built (SolveResult, response) pair, no exceptions and no allocations.
+
+		response is None on success, else a read-only mapping shaped like the error class 'response'.
+
+		EXAMPLE:
+		>>> result, response = pkce.verify(code_verifier, code_challenge, 'S256')
+		>>> result
+		<SolveResult.OK: 0>
+		>>> pkce.verify('hello', code_challenge, 'S256')
+		(<SolveResult.INVALID_VERIFIER: 1>, mappingproxy({'error': 'invalid_request', 'error_description': 'verifier is out of spec'}))
+		>>> if result:
+		...     raise pkce.SOLVE_ERRORS[result]()  #> if you prefer exceptions
+	"""
+	if _instrumentation is None:
+		return _VERIFY_RESULTS[_verify(code_verifier, code_challenge, code_challenge_method)]
+	return _VERIFY_RESULTS[_verify_instrumented(_instrumentation, 'verify', code_verifier, code_challenge, code_challenge_method)]
+
+
+def _verify(code_verifier, code_challenge, code_challenge_method) -> SolveResult:
+	""" The checks of _check_verifier, _check_challenge and _check_method without raising, then hash and compare.
+
+		Works on bytes, a str challenge is ascii encoded and compared as bytes.
 	"""
+	verifier = _verifier_bytes(code_verifier)
+	if verifier is None:
+		return SolveResult.INVALID_VERIFIER
+	if not isinstance(code_challenge, (str, bytes, bytearray, memoryview)):
+		return SolveResult.MISSING_CHALLENGE
 	try:
-		_check_verifier(code_verifier) #> InvalidRequestError
-		_check_challenge(code_challenge) #> MissingChallenge
-		_check_method(code_challenge_method) #> TransformAlgorithm
-		
-		if secrets.compare_digest(make_challenge(code_verifier, code_challenge_method), code_challenge) is True:
-			return True
+		transform = _accepted_transforms.get(code_challenge_method)
+	except TypeError:  #> unhashable
+		return SolveResult.UNSUPPORTED_METHOD
+	if transform is None:
+		return SolveResult.UNSUPPORTED_METHOD
+	expected = transform(verifier)
+	if isinstance(code_challenge, str):
+		if not code_challenge.isascii():
+			verbose('non-ascii code_challenge')
+			return SolveResult.UNKNOWN_ERROR
+		code_challenge = code_challenge.encode('ascii')
+	if secrets.compare_digest(expected, code_challenge):
+		return SolveResult.OK
+	return SolveResult.NOT_EQUAL
 
-		raise NotEqual('Could not solve')
-		
-	except TransformAlgorithm as e:
-		# return {"error": "invalid_request", "error_description": "transform algorithm not supported"}
-		return e.response
 
-	except MissingChallenge as e:
-		# return {"error": "invalid_request", "error_description": "code challenge required"}
-		return e.response
+# Error class names for the instrumentation error counts.
+_RESULT_ERROR_NAMES = {result: error.__name__ for result, error in SOLVE_ERRORS.items()}
+_RESULT_ERROR_NAMES[SolveResult.UNKNOWN_ERROR] = 'UnknownError'
 
-	except NotEqual as e:
-		# return {"error": "invalid_grant", "error_description": "code_challenge failed"}
-		return e.response
 
-	except InvalidRequestError as e:
-		# return {"error": "invalid_request", "error_description": "verifier is out of spec"}
-		return e.response
-	
-	except Exception as e:
-		verbose(e)
-		return {"error": "invalid_request", "error_description": "unknown error"}
+def _verify_instrumented(sink, function, code_verifier, code_challenge, code_challenge_method) -> SolveResult:
+	""" _verify() with the validation, hashing and compare stages timed, and the error class counted.
+	"""
+	start = perf_counter()
+	result = None
+	verifier = _verifier_bytes(code_verifier)
+	try:
+		transform = _accepted_transforms.get(code_challenge_method)
+	except TypeError:  #> unhashable
+		transform = None
+	if verifier is None:
+		result = SolveResult.INVALID_VERIFIER
+	elif not isinstance(code_challenge, (str, bytes, bytearray, memoryview)):
+		result = SolveResult.MISSING_CHALLENGE
+	elif transform is None:
+		result = SolveResult.UNSUPPORTED_METHOD
+	elif isinstance(code_challenge, str):
+		if code_challenge.isascii():
+			code_challenge = code_challenge.encode('ascii')
+		else:
+			verbose('non-ascii code_challenge')
+			result = SolveResult.UNKNOWN_ERROR
+	now = perf_counter()
+	sink.timing('validation', now - start)
+
+	if result is None:
+		start = now
+		expected = transform(verifier)
+		if transform is not plain_transform:
+			now = perf_counter()
+			sink.timing('hashing', now - start)
+			start = now
+		result = SolveResult.OK if secrets.compare_digest(expected, code_challenge) else SolveResult.NOT_EQUAL
+		sink.timing('compare', perf_counter() - start)
+
+	if result:
+		sink.error(function, _RESULT_ERROR_NAMES[result])
+	return result
 
 
 ###########################
@@ -420,31 +695,31 @@ def solve(code_verifier=None, code_challenge=None, code_challenge_method="plain"
 
 
 
+_default_codec = None
+
+
+def _get_codec():
+	""" Return the module level AuthCodeCodec for KEY_RING or FERNET_KEY, built on first use.
+	"""
+	global _default_codec
+	key = KEY_RING if KEY_RING is not None else FERNET_KEY
+	if _default_codec is None or _default_codec.key is not key and _default_codec.key != key:
+		assert key, "requires a FERNET_KEY env --> from cryptography.fernet import Fernet;Fernet.generate_key().decode()"
+		from .codec import AuthCodeCodec
+		_default_codec = AuthCodeCodec(key)
+	return _default_codec
+
+
 # create_auth_code(challenge, method)
-def create_auth_code(**kwargs):
+def create_auth_code(*, code_format=None, **kwargs):
 	""" Create a auth code to send back to the client.
 		encrypt this auth code with the 'code_challenge' and 'code_challenge_method'
 
 		code: a temporary code that may only be exchanged once and expires 5 minutes after issuance.
+		code_format: 'fernet' (default), 'compact' or 'binary' (pkce.DEFAULT_SCHEMA), load_auth_code() reads each.
+
+		NOTE: thin wrapper over pkce.AuthCodeCodec(FERNET_KEY).encode()
 	"""
-	from uuid import uuid4
-	from jose import jwt
-	from cryptography.fernet import Fernet
-	assert FERNET_KEY, "requires a FERNET_KEY env --> from cryptography.fernet import Fernet;Fernet.generate_key().decode()"
-	
-	f = Fernet(FERNET_KEY)
-	# >>> pip install cryptography
-	# >>> from cryptography.fernet import Fernet
-	# >>> key = Fernet.generate_key() #> b'iN54fNs-JzmP7IjO3qoPSCcdo-739wWRTnP9yL8ioy0='
-	# >>> f = Fernet(key)
-	# >>> token = f.encrypt(b"my deep dark secret")
-	# >>> token
-	# b'...'
-	# >>> f.decrypt(token)
-	# b'my deep dark secret'
-
-	# to_encode = kwargs.copy()
-	to_encode = deepcopy(kwargs)
 	# {
 	#  'response_type': 'code',
 	#  'code_challenge': '8DYG5kCYPIRgohDiacrdNjvKJcSZZw5EcLWSy4V0PVY',
@@ -455,45 +730,28 @@ def create_auth_code(**kwargs):
 	#  'state': '5PcvTI9DSWD3y7ad8JGncUlZZGDjue1NyWB4FkblstE',
 	#  'nonce': 'xQ9dPSTiqrCnUsFRBKwfAewWDZIhbvWfwpeYSKdByta'
 	# }
-	audience="auth_code"
-	timenow = jwt.datetime.utcnow()
-	to_encode.update({'exp': timenow + jwt.timedelta(minutes=5)}) # short lived code tokens.
-	to_encode.update({'iat': timenow})
-	to_encode.update({'aud': audience})
-	# to_encode.update({'iss': "auth_server"})
-	# to_encode.update({'sub': "auth_code"})
-	# to_encode.update({'typ': "auth_code"})
-	# to_encode.update({'jti': str(uuid4())})
-
-	token = jwt.encode(to_encode, FERNET_KEY.decode(), 'HS256')
-	verbose(token)
-	encrypted_code = f.encrypt(token.encode()).decode()
+	encrypted_code = _get_codec().encode(kwargs, code_format=code_format)
 	verbose('encrypted_code', encrypted_code)
 	return encrypted_code
 
 
-def load_auth_code(auth_code, audience="auth_code"):
+def load_auth_code(auth_code, audience="auth_code", replay_store=None):
 	""" Create a auth code to send back to the client.
 		encrypt this auth code with the 'code_challenge' and 'code_challenge_method'
 
 		This requires extra installs
 		pip install python-jose[cryptography]
+
+		replay_store: a pkce.MemoryReplayStore or pkce.SQLiteReplayStore, raises ReusedAuthCode on the second load.
+
+		NOTE: thin wrapper over pkce.AuthCodeCodec(FERNET_KEY).decode(), the code format is detected.
 	"""
 	try:
-		from jose import jwt
-		from cryptography.fernet import Fernet
-		assert FERNET_KEY, "requires a FERNET_KEY env --> from cryptography.fernet import Fernet;Fernet.generate_key().decode()"
-		f = Fernet(FERNET_KEY)
-
-		token = f.decrypt(auth_code.encode()).decode()
-		# token = f.decrypt(enc.encode()).decode()
-
-		# print(FERNET_KEY)
-		payload = jwt.decode(token, FERNET_KEY.decode(), algorithms=['HS256'], audience="auth_code")
-		assert payload.get('aud') == audience, 'Wrong aud'
-		return payload
+		return _get_codec().decode(auth_code, audience, replay_store)
 	except Exception as e:
 		verbose(e)
+		if _instrumentation is not None:
+			_instrumentation.error('load_auth_code', type(e).__name__)
 		raise e
 		# decryption error
 		# error spliting
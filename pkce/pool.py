@@ -0,0 +1,133 @@
+"########################"
+"#      PIXY POOL       #"
+"########################"
+
+import os
+import threading
+import weakref
+from collections import deque
+
+from .pkce import generate, _check_length, _check_method, CHALLENGE_METHODS
+from .batch import generate_many
+
+"""
+
+PixyPool
+
+"""
+
+_POOLS = weakref.WeakSet()
+
+
+class PixyPool:
+	""" Opt-in pool of pre-generated Pixy objects, kept filled by a background thread.
+
+		pool.get() pops a ready Pixy, the entropy read and hashing happen off the request thread.
+		When the pool is empty get() falls back to pkce.generate() and counts a miss.
+		After os.fork() the child drops every pre-generated Pixy and refills, so forked workers never share verifiers.
+
+		EXAMPLE:
+		>>> pool = pkce.PixyPool(size=1024, low_watermark=256)
+		>>> pixy = pool.get()
+		>>> pool.stats()
+		{'hits': 1, 'misses': 0, 'refills': 1, 'ready': 1023}
+		>>> pool.close()
+	"""
+
+	def __init__(self, size: int=1024, low_watermark: int=None, code_challenge_method='S256', length: int=128):
+		if not isinstance(size, int) or size < 1:
+			raise ValueError("'size' must be a positive int")
+		low_watermark = size // 4 if low_watermark is None else low_watermark
+		if not 0 <= low_watermark < size:
+			raise ValueError("'low_watermark' must be between 0 and size")
+		_check_length(length)
+		_check_method(code_challenge_method, CHALLENGE_METHODS)
+
+		self.size = size
+		self.low_watermark = low_watermark
+		self.code_challenge_method = code_challenge_method
+		self.length = length
+		self.hits = 0
+		self.misses = 0
+		self.refills = 0
+		self._ready = deque()
+		self._wakeup = threading.Event()
+		self._closed = False
+		self._thread = None
+		self._start()
+		_POOLS.add(self)
+
+	def get(self):
+		""" Return a ready Pixy, never waits for the background thread.
+		"""
+		if self._thread is None:
+			self._start()
+		try:
+			pixy = self._ready.popleft()
+			self.hits += 1
+		except IndexError:
+			self.misses += 1
+			pixy = generate(self.code_challenge_method, self.length)
+		if len(self._ready) <= self.low_watermark:
+			self._wakeup.set()
+		return pixy
+
+	def stats(self):
+		""" Return the hit/miss/refill counters and the number of ready Pixy objects.
+		"""
+		return {'hits': self.hits, 'misses': self.misses, 'refills': self.refills, 'ready': len(self._ready)}
+
+	def close(self):
+		""" Stop the background thread and drop every pre-generated Pixy.
+		"""
+		self._closed = True
+		self._wakeup.set()
+		self._thread = None
+		self._ready.clear()
+		_POOLS.discard(self)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def _start(self):
+		if self._closed:
+			raise RuntimeError('PixyPool is closed')
+		self._wakeup.set()
+		self._thread = threading.Thread(target=self._run, name='PixyPool', daemon=True)
+		self._thread.start()
+
+	def _run(self):
+		ready, wakeup = self._ready, self._wakeup
+		while True:
+			wakeup.wait()
+			wakeup.clear()
+			if self._closed:
+				ready.clear()  #> close() may have cleared it while a refill was running
+				return
+			missing = self.size - len(ready)
+			if missing > 0:
+				batch = generate_many(missing, self.code_challenge_method, self.length)
+				if self._closed:
+					continue
+				ready.extend(batch)
+				self.refills += 1
+
+	def _after_fork(self):
+		""" Child side of os.fork(), threads do not survive a fork and the ready Pixy objects belong to the parent.
+		"""
+		self._ready = deque()
+		self._wakeup = threading.Event()
+		self._thread = None
+		self.hits = self.misses = self.refills = 0
+
+
+def _after_fork_in_child():
+	for pool in list(_POOLS):
+		pool._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,328 @@
+"########################"
+"#   REPLAY PROTECTION  #"
+"########################"
+
+import os
+import sys
+import time
+import math
+import base64
+import hashlib
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+"""
+
+MemoryReplayStore
+SQLiteReplayStore
+RotatingBloomFilter
+
+	An `Authorization Code` may only be exchanged once, a replay store remembers every code
+	that was loaded until it expires.
+
+	>>> store = pkce.MemoryReplayStore()
+	>>> pkce.load_auth_code(auth_code, replay_store=store)
+	{...}
+	>>> pkce.load_auth_code(auth_code, replay_store=store)
+	pkce.ReusedAuthCode: Auth code already used
+
+"""
+
+
+def replay_key(auth_code) -> bytes:
+	""" 16 byte key for an auth code, the store never keeps the code itself.
+	"""
+	if isinstance(auth_code, str):
+		auth_code = auth_code.encode()
+	return hashlib.sha256(auth_code).digest()[:16]
+
+
+_NOT_STRICT = frozenset(b'+/=')
+
+
+def code_material(code) -> bytes:
+	""" The decoded bytes of an auth code without its 'kid.' prefix, the same for every spelling the decoders accept.
+
+		Fernet codes ('g...') are decoded like Fernet does, characters outside base64url are dropped.
+		The compact formats are strict base64url without padding. Raises ValueError when not base64.
+	"""
+	if isinstance(code, str):
+		code = code.encode()
+	if code[:1] == b'g':
+		return base64.urlsafe_b64decode(code)
+	if _NOT_STRICT.intersection(code):
+		raise ValueError('not base64url without padding')
+	return base64.b64decode(code + b'=' * (-len(code) % 4), altchars=b'-_', validate=True)
+
+
+_B64URL = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+_TO_URLSAFE = bytes.maketrans(b'+/', b'-_')
+_NOT_B64URL = bytes(sorted(set(range(256)) - set(_B64URL) - set(b'+/')))
+_UNUSED_BITS = {length: bytes.maketrans(_B64URL, bytes(_B64URL[i & mask] for i in range(64))) for length, mask in ((2, 0b110000), (3, 0b111100))}
+
+
+def canonical_code(code) -> bytes:
+	""" The base64url text of an auth code (without its 'kid.' prefix) as the decoders read it, without decoding it.
+
+		'+/' are '-_', other characters and padding are dropped and the unused bits of the last
+		character are cleared, so two spellings with the same code_material() give the same bytes.
+	"""
+	if isinstance(code, str):
+		code = code.encode()
+	code = code.translate(_TO_URLSAFE, _NOT_B64URL)  #> one pass, deletes then maps
+	unused = _UNUSED_BITS.get(len(code) % 4)
+	if unused is not None and unused[code[-1]] != code[-1]:
+		code = code[:-1] + bytes((unused[code[-1]],))
+	return code
+
+
+class RotatingBloomFilter:
+	""" Two generation Bloom filter, a key added is remembered for at least 'rotate_every' seconds.
+
+		Used in front of a replay store, a code that is not in the filter has never been seen
+		and skips the exact lookup. 'rotate_every' must be at least the auth code lifetime.
+	"""
+
+	def __init__(self, capacity: int=1_000_000, error_rate: float=0.001, rotate_every: float=300):
+		self.bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+		self.hashes = max(1, min(8, round(self.bits / capacity * math.log(2))))
+		self.rotate_every = rotate_every
+		self._current = bytearray((self.bits + 7) // 8)
+		self._previous = bytearray(len(self._current))
+		self._rotated_at = time.monotonic()
+		self._lock = threading.Lock()
+
+	def _positions(self, key: bytes):
+		digest = hashlib.blake2b(key, digest_size=4 * self.hashes).digest()
+		return [int.from_bytes(digest[i:i + 4], 'little') % self.bits for i in range(0, 4 * self.hashes, 4)]
+
+	def _rotate(self):
+		now = time.monotonic()
+		if now - self._rotated_at >= self.rotate_every:
+			self._previous = self._current if now - self._rotated_at < 2 * self.rotate_every else bytearray(len(self._current))
+			self._current = bytearray(len(self._current))
+			self._rotated_at = now
+
+	def add(self, key: bytes) -> bool:
+		""" Add key, return True if it may have been added before.
+		"""
+		positions = self._positions(key)
+		with self._lock:
+			self._rotate()
+			current, previous = self._current, self._previous
+			seen = True
+			for position in positions:
+				byte, bit = position >> 3, 1 << (position & 7)
+				if not current[byte] & bit:
+					seen = False
+					current[byte] |= bit
+			if not seen:
+				seen = all(previous[position >> 3] & (1 << (position & 7)) for position in positions)
+			return seen
+
+	def __contains__(self, key: bytes) -> bool:
+		positions = self._positions(key)
+		with self._lock:
+			self._rotate()
+			return any(all(bits[position >> 3] & (1 << (position & 7)) for position in positions) for bits in (self._current, self._previous))
+
+	def memory_usage(self) -> int:
+		return 2 * len(self._current)
+
+
+class ReplayStore(ABC):
+	""" Base class, check_and_add(key, expires_at) returns False when the key was already used.
+	"""
+
+	def __init__(self, bloom: RotatingBloomFilter=None):
+		self.bloom = bloom
+		self.lookups = 0
+		self.hits = 0
+		self.bloom_skips = 0
+
+	@abstractmethod
+	def check_and_add(self, key: bytes, expires_at: float) -> bool:
+		""" Add key, False when it was already added and has not expired.
+		"""
+
+	@abstractmethod
+	def __len__(self):
+		""" Number of keys kept.
+		"""
+
+	@abstractmethod
+	def memory_usage(self) -> int:
+		""" Bytes used by the kept keys.
+		"""
+
+	def stats(self):
+		""" Replay hit rate, Bloom filter skips and memory use in bytes.
+		"""
+		lookups = self.lookups or 1
+		return {
+			'lookups': self.lookups,
+			'hits': self.hits,
+			'hit_rate': self.hits / lookups,
+			'bloom_skips': self.bloom_skips,
+			'bloom_skip_rate': self.bloom_skips / lookups,
+			'entries': len(self),
+			'memory_bytes': self.memory_usage() + (self.bloom.memory_usage() if self.bloom is not None else 0),
+		}
+
+
+class MemoryReplayStore(ReplayStore):
+	""" In process replay store, sharded dicts of key -> expiry with a lock per shard.
+
+		Codes are inserted in roughly expiry order, so expired entries are dropped from the front
+		of each shard as new ones are added.
+	"""
+
+	def __init__(self, shards: int=16, bloom: RotatingBloomFilter=None):
+		super().__init__(bloom)
+		self._shards = [{} for _ in range(shards)]
+		self._locks = [threading.Lock() for _ in range(shards)]
+
+	def check_and_add(self, key: bytes, expires_at: float) -> bool:
+		index = key[0] % len(self._shards)
+		shard = self._shards[index]
+		now = time.time()
+		with self._locks[index]:
+			self.lookups += 1
+			if self.bloom is not None and not self.bloom.add(key):
+				self.bloom_skips += 1
+			else:
+				expires = shard.get(key)
+				if expires is not None and expires > now:
+					self.hits += 1
+					return False
+				shard.pop(key, None)
+			shard[key] = expires_at
+			self._expire(shard, now)
+			return True
+
+	def _expire(self, shard, now, limit=8):
+		for key in list(_first(shard, limit)):
+			if shard[key] > now:
+				return
+			del shard[key]
+
+	def __len__(self):
+		return sum(len(shard) for shard in self._shards)
+
+	def memory_usage(self) -> int:
+		entries = len(self)
+		return sum(sys.getsizeof(shard) for shard in self._shards) + entries * (sys.getsizeof(b'x' * 16) + sys.getsizeof(1.0))
+
+
+def _first(shard, limit):
+	for count, key in enumerate(shard):
+		if count == limit:
+			return
+		yield key
+
+
+class SQLiteReplayStore(ReplayStore):
+	""" Replay store in a local SQLite file in WAL mode, shared by every worker on a host.
+
+		batch_size=1 (default) is exact: each key is checked and added by one upsert in a
+		'BEGIN IMMEDIATE' transaction, a code is never accepted twice, even by two workers at once.
+
+		batch_size > 1 buffers new keys and writes them in batches, or after 'flush_interval' seconds.
+		Faster, but ALLOWS REPLAYS ACROSS WORKERS: another worker does not see a key until it is flushed.
+
+		No Bloom filter, it only knows the keys of its own process and would skip the shared lookup.
+	"""
+
+	def __init__(self, path: str, batch_size: int=1, flush_interval: float=0.05, bloom: RotatingBloomFilter=None):
+		if bloom is not None:
+			raise ValueError("SQLiteReplayStore is shared between processes, a per process Bloom filter would skip replays from other workers")
+		if batch_size < 1:
+			raise ValueError("'batch_size' must be at least 1")
+		super().__init__()
+		self.path = path
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		self._pending = {}
+		self._flushed_at = time.monotonic()
+		self._flushes = 0
+		self._lock = threading.Lock()
+		self._connect()
+
+	def _connect(self):
+		self._pid = os.getpid()
+		self._db = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+		self._db.execute('PRAGMA journal_mode=WAL')
+		self._db.execute('PRAGMA synchronous=NORMAL')
+		self._db.execute('CREATE TABLE IF NOT EXISTS used_codes (key BLOB PRIMARY KEY, expires REAL NOT NULL) WITHOUT ROWID')
+
+	def check_and_add(self, key: bytes, expires_at: float) -> bool:
+		now = time.time()
+		with self._lock:
+			if self._pid != os.getpid():  #> forked, the connection belongs to the parent
+				self._pending = {}
+				self._connect()
+			self.lookups += 1
+			if self.batch_size == 1:
+				return self._check_and_add_exact(key, expires_at, now)
+			expires = self._pending.get(key)
+			if expires is None:
+				row = self._db.execute('SELECT expires FROM used_codes WHERE key = ?', (key,)).fetchone()
+				expires = row[0] if row else None
+			if expires is not None and expires > now:
+				self.hits += 1
+				return False
+			self._pending[key] = expires_at
+			if len(self._pending) >= self.batch_size or time.monotonic() - self._flushed_at >= self.flush_interval:
+				self._flush(now)
+			return True
+
+	def _check_and_add_exact(self, key, expires_at, now):
+		""" Insert the key, or replace it if expired, first use is decided by changes() in the same transaction.
+		"""
+		with self._db:
+			self._db.execute('BEGIN IMMEDIATE')
+			self._db.execute(
+				'INSERT INTO used_codes VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET expires = excluded.expires WHERE used_codes.expires <= ?',
+				(key, expires_at, now),
+			)
+			first_use = self._db.execute('SELECT changes()').fetchone()[0] == 1
+			self._flushes += 1
+			if self._flushes % 100 == 0:
+				self._db.execute('DELETE FROM used_codes WHERE expires <= ?', (now,))
+		if not first_use:
+			self.hits += 1
+		return first_use
+
+	def flush(self):
+		""" Write buffered keys now.
+		"""
+		with self._lock:
+			self._flush(time.time())
+
+	def _flush(self, now):
+		if self._pending:
+			with self._db:
+				self._db.execute('BEGIN IMMEDIATE')
+				self._db.executemany('INSERT OR REPLACE INTO used_codes VALUES (?, ?)', self._pending.items())
+				self._flushes += 1
+				if self._flushes % 100 == 0:
+					self._db.execute('DELETE FROM used_codes WHERE expires <= ?', (now,))
+			self._pending = {}
+		self._flushed_at = time.monotonic()
+
+	def close(self):
+		self.flush()
+		self._db.close()
+
+	def __len__(self):
+		with self._lock:
+			return self._db.execute('SELECT COUNT(*) FROM used_codes').fetchone()[0] + len(self._pending)
+
+	def memory_usage(self) -> int:
+		""" Size of the database pages plus the write buffer.
+		"""
+		with self._lock:
+			pages = self._db.execute('PRAGMA page_count').fetchone()[0]
+			page_size = self._db.execute('PRAGMA page_size').fetchone()[0]
+			return pages * page_size + sys.getsizeof(self._pending)
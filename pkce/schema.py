@@ -0,0 +1,281 @@
+"########################"
+"#    PAYLOAD SCHEMA    #"
+"########################"
+
+import json
+import base64
+import struct
+from itertools import accumulate
+from collections.abc import Mapping
+
+"""
+
+PayloadSchema
+
+	Binary encoding of the auth code claims for code_format='binary'. Each declared field gets
+	a one byte id, an S256 challenge is stored as its 32 byte digest, the method as one byte
+	and 'exp'/'iat' as 4 byte ints. Claims that are not in the schema still round trip, as json.
+
+	>>> schema = pkce.PayloadSchema(['code_challenge', 'code_challenge_method', 'client_id', 'redirect_uri', 'state'])
+	>>> codec = pkce.AuthCodeCodec(FERNET_KEY, code_format='binary', schema=schema)
+	>>> payload = codec.decode(codec.encode(code_challenge=challenge, code_challenge_method='S256', client_id='mrsimple'))
+	>>> payload['code_challenge']  #> only this field is decoded
+	'UJFi4jeGi8t9IiYecJm7-1JWklXMDIKOaDHkYXqCw0k'
+
+LAYOUT:
+
+	exp (4 bytes) | iat (4 bytes) | count (1 byte) | field ids (count bytes) | value lengths (count bytes) | values
+
+		challenge: the 32 byte digest, or the str for a value that is not a 43 char base64url digest
+		method:    one byte index into METHODS, or the str
+		str:       utf-8
+		int:       8 bytes signed
+		json:      compact json, field id 0 holds every claim not in the schema
+
+	A field id with the 0x80 bit set holds the str fallback. With the 0x80 bit set in count
+	the value lengths are 2 bytes each. Reading one field is a bytes.find() of its id and a slice.
+
+NOTE:
+	Encoder and decoder must use the same schema, add new fields at the end and never reorder them.
+
+"""
+
+FIELD_TYPES = ('str', 'int', 'challenge', 'method')
+METHODS = ('S256', 'plain')
+MAX_FIELDS = 127
+_METHOD_IDS = {method: bytes((index,)) for index, method in enumerate(METHODS)}
+_EXTRA = 0
+_FALLBACK = 0x80
+_TIMES = struct.Struct('<II')
+_INT = struct.Struct('<q')
+_HEADER = _TIMES.size + 1
+_LENGTHS = {}  #> (count, wide) -> struct of the value lengths
+_MISSING = object()
+
+
+def _decode_str(data, start, end, fallback):
+	return data[start:end].decode()
+
+
+def _decode_int(data, start, end, fallback):
+	return _INT.unpack_from(data, start)[0]
+
+
+def _decode_challenge(data, start, end, fallback):
+	if fallback:
+		return data[start:end].decode()
+	return base64.urlsafe_b64encode(data[start:end])[:43].decode('ascii')
+
+
+def _decode_method(data, start, end, fallback):
+	if fallback:
+		return data[start:end].decode()
+	return METHODS[data[start]]
+
+
+def _decode_json(data, start, end, fallback):
+	return json.loads(data[start:end])
+
+
+_DECODERS = {'str': _decode_str, 'int': _decode_int, 'challenge': _decode_challenge, 'method': _decode_method}
+
+
+def _lengths(count, wide):
+	lengths = _LENGTHS.get((count, wide))
+	if lengths is None:
+		lengths = _LENGTHS[count, wide] = struct.Struct(f"<{count}{'H' if wide else 'B'}")
+	return lengths
+
+
+class PayloadSchema:
+	""" Declared auth code claims, a list of names (type 'str') or a {name: type} dict in a fixed order.
+
+		Types: 'str', 'int', 'challenge' and 'method', code_challenge and code_challenge_method
+		default to 'challenge' and 'method'. At most 127 fields.
+	"""
+
+	def __init__(self, fields):
+		if not isinstance(fields, Mapping):
+			fields = {name: _DEFAULT_TYPES.get(name, 'str') for name in fields}
+		if not 0 < len(fields) <= MAX_FIELDS:
+			raise ValueError(f"a schema has 1 to {MAX_FIELDS} fields")
+		for name, field_type in fields.items():
+			if field_type not in FIELD_TYPES:
+				raise ValueError(f"'{name}' has an unknown type '{field_type}', use one of {FIELD_TYPES}")
+			if name in ('exp', 'iat', 'aud'):
+				raise ValueError(f"'{name}' is always encoded, leave it out of the schema")
+		self.fields = dict(fields)
+		self.ids = {name: field_id for field_id, name in enumerate(self.fields, 1)}
+		self._names = [None] + list(self.fields)
+		self._decoders = [_decode_json] + [_DECODERS[field_type] for field_type in self.fields.values()]
+
+	def encode(self, claims: dict) -> bytes:
+		""" Binary encoding of the claims, 'exp' and 'iat' are required ints.
+		"""
+		field_ids = bytearray()
+		values = []
+		extra = {}
+		ids, fields = self.ids, self.fields
+		for name, value in claims.items():
+			if name in ('exp', 'iat', 'aud'):
+				continue
+			field_id = ids.get(name)
+			if field_id is None or value is None:
+				extra[name] = value
+				continue
+			field_type = fields[name]
+			if field_type == 'int':
+				if type(value) is not int or not -2**63 <= value < 2**63:
+					extra[name] = value  #> not the declared type
+					continue
+				value = _INT.pack(value)
+			elif not isinstance(value, str):
+				extra[name] = value
+				continue
+			elif field_type == 'challenge':
+				digest = _digest(value)
+				if digest is None:
+					field_id |= _FALLBACK
+					value = value.encode()
+				else:
+					value = digest
+			elif field_type == 'method':
+				method_id = _METHOD_IDS.get(value)
+				if method_id is None:
+					field_id |= _FALLBACK
+					value = value.encode()
+				else:
+					value = method_id
+			else:
+				value = value.encode()
+			field_ids.append(field_id)
+			values.append(value)
+		if extra:
+			field_ids.append(_EXTRA)
+			values.append(json.dumps(extra, separators=(',', ':')).encode())
+		sizes = [len(value) for value in values]
+		wide = bool(sizes) and max(sizes) > 0xff
+		if wide and max(sizes) > 0xffff:
+			raise ValueError('auth code claims over 65535 bytes')
+		count = len(values)
+		header = _TIMES.pack(claims['exp'], claims['iat']) + bytes((count | (_FALLBACK if wide else 0),))
+		return b''.join((header, field_ids, _lengths(count, wide).pack(*sizes), *values))
+
+	def decode(self, data: bytes, audience: str=None) -> 'LazyPayload':
+		return LazyPayload(self, data, audience)
+
+
+_DEFAULT_TYPES = {'code_challenge': 'challenge', 'code_challenge_method': 'method'}
+
+
+def _digest(challenge: str):
+	""" The 32 byte digest of an S256 style challenge, None when it does not round trip exactly.
+	"""
+	if len(challenge) != 43 or not challenge.isascii():
+		return None
+	try:
+		digest = base64.urlsafe_b64decode(challenge + '=')
+	except ValueError:
+		return None
+	if base64.urlsafe_b64encode(digest)[:43] != challenge.encode('ascii'):
+		return None
+	return digest
+
+
+class LazyPayload(Mapping):
+	""" Read-only claims of a binary auth code, each field is decoded the first time it is read.
+
+		Behaves like the dict load_auth_code() returns for the other formats, dict(payload) copies it.
+	"""
+	__slots__ = ('_schema', '_data', '_cache', '_ids', '_offsets', '_complete')
+
+	def __init__(self, schema: PayloadSchema, data: bytes, audience: str=None):
+		self._schema = schema
+		self._data = data
+		exp, iat = _TIMES.unpack_from(data, 0)
+		self._cache = {'exp': exp, 'iat': iat}
+		if audience is not None:
+			self._cache['aud'] = audience
+		self._ids = None
+		self._complete = False
+
+	def _index(self):
+		""" Field ids and value offsets, read on the first field access.
+		"""
+		data = self._data
+		count, wide = data[_TIMES.size] & ~_FALLBACK, data[_TIMES.size] & _FALLBACK
+		start = _HEADER + count
+		self._ids = data[_HEADER:start]
+		self._offsets = list(accumulate(_lengths(count, wide).unpack_from(data, start), initial=start + count * (2 if wide else 1)))
+
+	def __getitem__(self, name):
+		value = self._cache.get(name, _MISSING)
+		if value is _MISSING:
+			value = self.get(name, _MISSING)
+			if value is _MISSING:
+				raise KeyError(name)
+		return value
+
+	def get(self, name, default=None):
+		cache = self._cache
+		value = cache.get(name, _MISSING)
+		if value is not _MISSING or self._complete:
+			return default if value is _MISSING else value
+		field_id = self._schema.ids.get(name)
+		if field_id is not None:
+			if self._ids is None:
+				self._index()
+			index = self._ids.find(field_id)
+			fallback = index < 0
+			if fallback:
+				index = self._ids.find(field_id | _FALLBACK)
+			if index >= 0:
+				offsets = self._offsets
+				value = cache[name] = self._schema._decoders[field_id](self._data, offsets[index], offsets[index + 1], fallback)
+				return value
+		self._decode_all()  #> undeclared claims, or a value that was not the declared type, are in the json
+		return cache.get(name, default)
+
+	def __contains__(self, name):
+		return self.get(name, _MISSING) is not _MISSING
+
+	def _decode_all(self):
+		if self._complete:
+			return
+		if self._ids is None:
+			self._index()
+		data, offsets, decoders, names, cache = self._data, self._offsets, self._schema._decoders, self._schema._names, self._cache
+		for index, field_id in enumerate(self._ids):
+			fallback = field_id & _FALLBACK
+			field_id &= ~_FALLBACK
+			value = decoders[field_id](data, offsets[index], offsets[index + 1], fallback)
+			if field_id == _EXTRA:
+				for name, extra in value.items():
+					cache.setdefault(name, extra)
+			else:
+				cache.setdefault(names[field_id], value)
+		self._complete = True
+
+	def __iter__(self):
+		self._decode_all()
+		return iter(self._cache)
+
+	def __len__(self):
+		self._decode_all()
+		return len(self._cache)
+
+	def __repr__(self):
+		return f"LazyPayload({dict(self)})"
+
+
+# The claims in the create_auth_code() docstring example.
+DEFAULT_SCHEMA = PayloadSchema([
+	'response_type',
+	'code_challenge',
+	'code_challenge_method',
+	'client_id',
+	'redirect_uri',
+	'scope',
+	'state',
+	'nonce',
+])
@@ -0,0 +1,226 @@
+"########################"
+"#      PIXY STORE      #"
+"########################"
+
+import os
+import mmap
+import time
+import fcntl
+import struct
+import hashlib
+import threading
+import weakref
+
+from .pkce import Pixy, _check_method
+
+"""
+
+PixyStore
+
+	Step 2 / step 6 on the client, keep the Pixy by state (or by challenge) until the callback.
+	The table lives in a memory-mapped file, every worker on the host that opens the same path
+	sees the same entries, so the callback can land on any gunicorn worker.
+
+	>>> store = pkce.PixyStore('/tmp/pixy.store', capacity=65536, ttl=600)
+	>>> store.put(state, pixy)
+	>>> pixy = store.pop(state)  #> in the callback, maybe in another worker, None if unknown or expired
+
+NOTE:
+	Fixed size open addressing table, capacity slots of 284 bytes (~18MB for 65536), keys are the
+	first 16 bytes of sha256(key). Writers take an exclusive fcntl.lockf() on the file and
+	readers a shared one, with a thread lock in front as lockf() locks belong to the process.
+	Keep capacity at about twice the number of live entries.
+
+"""
+
+MAGIC = b'PKCEPXY1'
+_HEADER = struct.Struct('<8sI')
+HEADER_SIZE = 64
+#> status, method, verifier length, challenge length, key, expires_at, verifier, challenge
+_SLOT = struct.Struct('<BBBB16sd128s128s')
+SLOT_SIZE = _SLOT.size
+
+EMPTY, USED, DELETED = 0, 1, 2
+_METHODS = {'S256': 1, 'plain': 2}
+_METHOD_NAMES = {value: name for name, value in _METHODS.items()}
+
+_STORES = weakref.WeakSet()
+
+
+def _key(key) -> bytes:
+	if isinstance(key, str):
+		key = key.encode()
+	return hashlib.sha256(key).digest()[:16]
+
+
+class PixyStore:
+	""" Memory-mapped hash table of key -> Pixy shared by the processes of one host, entries expire after 'ttl' seconds.
+
+		An existing file keeps its own capacity, 'capacity' is only used to create it.
+	"""
+
+	def __init__(self, path: str, capacity: int=65536, ttl: float=600):
+		if not isinstance(capacity, int) or capacity < 1:
+			raise ValueError("'capacity' must be a positive int")
+		self.path = path
+		self.ttl = ttl
+		self._lock = threading.Lock()
+		self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+		fcntl.lockf(self._fd, fcntl.LOCK_EX)  #> first worker creates the file, the others wait
+		try:
+			if os.fstat(self._fd).st_size < HEADER_SIZE:
+				os.ftruncate(self._fd, HEADER_SIZE + capacity * SLOT_SIZE)
+				os.pwrite(self._fd, _HEADER.pack(MAGIC, capacity), 0)
+			magic, capacity = _HEADER.unpack(os.pread(self._fd, _HEADER.size, 0))
+			if magic != MAGIC:
+				raise ValueError(f"{path} is not a PixyStore file")
+		except BaseException:
+			os.close(self._fd)  #> also releases the lock
+			raise
+		fcntl.lockf(self._fd, fcntl.LOCK_UN)
+		self.capacity = capacity
+		self._mm = mmap.mmap(self._fd, HEADER_SIZE + capacity * SLOT_SIZE)
+		_STORES.add(self)
+
+	def _find(self, key: bytes, now: float):
+		""" Return (slot of key or None, first reusable slot or None), expired entries count as reusable.
+		"""
+		mm, capacity = self._mm, self.capacity
+		index = int.from_bytes(key[:8], 'little') % capacity
+		reusable = None
+		for _ in range(capacity):
+			offset = HEADER_SIZE + index * SLOT_SIZE
+			status = mm[offset]
+			if status == EMPTY:
+				return None, index if reusable is None else reusable
+			if status == USED and mm[offset + 4:offset + 20] == key:
+				if struct.unpack_from('<d', mm, offset + 20)[0] > now:
+					return index, None
+				return None, index  #> expired, the key can not be further along
+			if reusable is None and (status == DELETED or struct.unpack_from('<d', mm, offset + 20)[0] <= now):
+				reusable = index
+			index = (index + 1) % capacity
+		return None, reusable
+
+	def _read(self, index) -> Pixy:
+		_, method, verifier_length, challenge_length, _, _, verifier, challenge = _SLOT.unpack_from(self._mm, HEADER_SIZE + index * SLOT_SIZE)
+		return Pixy(verifier[:verifier_length].decode(), challenge[:challenge_length].decode(), _METHOD_NAMES[method])
+
+	def _delete(self, index):
+		""" Mark a slot deleted, or empty when the next slot is empty so probes stay short.
+		"""
+		mm, capacity = self._mm, self.capacity
+		if mm[HEADER_SIZE + (index + 1) % capacity * SLOT_SIZE] != EMPTY:
+			mm[HEADER_SIZE + index * SLOT_SIZE] = DELETED
+			return
+		for _ in range(capacity):
+			mm[HEADER_SIZE + index * SLOT_SIZE] = EMPTY
+			index = (index - 1) % capacity
+			if mm[HEADER_SIZE + index * SLOT_SIZE] != DELETED:
+				return
+
+	def put(self, key, pixy: Pixy, ttl: float=None):
+		""" Save pixy under key (state or code_challenge), replaces an existing entry.
+		"""
+		_check_method(pixy.code_challenge_method, _METHODS)
+		verifier, challenge = pixy.code_verifier.encode(), pixy.code_challenge.encode()
+		if len(verifier) > 128 or len(challenge) > 128:
+			raise ValueError('code_verifier and code_challenge are at most 128 chars')
+		key = _key(key)
+		now = time.time()
+		expires_at = now + (self.ttl if ttl is None else ttl)
+		with self._lock:
+			fcntl.lockf(self._fd, fcntl.LOCK_EX)
+			try:
+				index, reusable = self._find(key, now)
+				if index is None:
+					if reusable is None:
+						raise RuntimeError('PixyStore is full')
+					index = reusable
+				_SLOT.pack_into(self._mm, HEADER_SIZE + index * SLOT_SIZE, USED, _METHODS[pixy.code_challenge_method],
+					len(verifier), len(challenge), key, expires_at, verifier, challenge)
+			finally:
+				fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+	def get(self, key) -> Pixy:
+		""" Return the Pixy saved under key, None when unknown or expired.
+		"""
+		key = _key(key)
+		with self._lock:
+			fcntl.lockf(self._fd, fcntl.LOCK_SH)
+			try:
+				index, _ = self._find(key, time.time())
+				return None if index is None else self._read(index)
+			finally:
+				fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+	def pop(self, key) -> Pixy:
+		""" Return and delete the Pixy saved under key in one step, None when unknown or expired.
+		"""
+		key = _key(key)
+		with self._lock:
+			fcntl.lockf(self._fd, fcntl.LOCK_EX)
+			try:
+				index, _ = self._find(key, time.time())
+				if index is None:
+					return None
+				pixy = self._read(index)
+				self._delete(index)
+				return pixy
+			finally:
+				fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+	def purge(self) -> int:
+		""" Delete every expired entry, returns how many. put() reuses expired slots without it.
+		"""
+		now = time.time()
+		purged = 0
+		with self._lock:
+			fcntl.lockf(self._fd, fcntl.LOCK_EX)
+			try:
+				for index in range(self.capacity):
+					offset = HEADER_SIZE + index * SLOT_SIZE
+					if self._mm[offset] == USED and struct.unpack_from('<d', self._mm, offset + 20)[0] <= now:
+						self._delete(index)
+						purged += 1
+			finally:
+				fcntl.lockf(self._fd, fcntl.LOCK_UN)
+		return purged
+
+	def __len__(self):
+		""" Live entries, scans the table.
+		"""
+		now = time.time()
+		mm = self._mm
+		return sum(1 for index in range(self.capacity)
+			if mm[HEADER_SIZE + index * SLOT_SIZE] == USED and struct.unpack_from('<d', mm, HEADER_SIZE + index * SLOT_SIZE + 20)[0] > now)
+
+	def __contains__(self, key):
+		return self.get(key) is not None
+
+	def close(self):
+		if self._mm is not None:
+			self._mm.close()
+			os.close(self._fd)
+			self._mm = None
+			_STORES.discard(self)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def _after_fork(self):
+		""" Child side of os.fork(), the mapping and the file are shared, a thread lock held by another thread is not released.
+		"""
+		self._lock = threading.Lock()
+
+
+def _after_fork_in_child():
+	for store in list(_STORES):
+		store._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child=_after_fork_in_child)
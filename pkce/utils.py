@@ -3,18 +3,37 @@
 "#   HELPER FUNCTIONS   #"
 "########################"
 
-import re
 import base64
-from os import urandom
-import uuid
+import secrets
+
+from . import entropy as _entropy
+from .entropy import _buffered_bytes
 
 """
 
 make_code
+make_codes
 short_code
 
 """
 
+CODE_ALPHABET = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+# Rejection sampling: bytes 0..247 map to CODE_ALPHABET[byte % 62], bytes 248..255 are dropped so every char is equally likely.
+_CODE_LIMIT = 256 - 256 % len(CODE_ALPHABET)
+_CODE_TABLE = bytes(CODE_ALPHABET[byte % len(CODE_ALPHABET)] if byte < _CODE_LIMIT else 0 for byte in range(256))
+_CODE_REJECT = bytes(range(_CODE_LIMIT, 256))
+
+
+def _alphanumeric(n: int) -> bytes:
+	""" Exactly n unbiased alphanumeric chars.
+	"""
+	chars = b''
+	while len(chars) < n:
+		missing = n - len(chars)
+		chars += _buffered_bytes(missing + (missing >> 4) + 4).translate(_CODE_TABLE, _CODE_REJECT)
+	return chars[:n]
+
+
 def make_code(n: int = 43):
 	""" helper to make a urlsafe short code.
 		
@@ -28,14 +47,26 @@ def make_code(n: int = 43):
 			>>> pkce.make_code(1000)  #> 'uSnR4ZOJC7qX4jBl3iq78jDxgZgoEvN1jSBWgBOy8yaRx1VtgRnRj5DZmveuQdiqODw7cNPrKFstZNm3bEExEe0sPorBa9PSy5W3EdhiSyaKP9betvBw1eActMwswSi5'
 			>>> pkce.make_code(None)  #> 'OPRzvCKeSY8Ucq4BErEQ4a7SwOa6eOu5nFmwmweqKr2eVW3QpR5k1QvPLbU5ktfakmMvFUmHRcNRZpkNesg3FSI53xT19G9Vxf2f1fGyZlFbmmj8exFFxiEML15aaJIL'
 		
-		REQUIRES:
-			import re;import base64;from os import urandom
+		NOTE: always exactly n chars from [a-zA-Z0-9], n outside 43..128 gives 128 chars.
+	"""
+	n = 128 if not isinstance(n, int) else n
+	n = 128 if not 43 <= n <= 128 else n
+	return _alphanumeric(n).decode('ascii')
+
+
+def make_codes(count: int, n: int = 43) -> list:
+	""" 'count' codes from make_code(n), the entropy for all of them is taken at once.
+
+		EXAMPLE:
+			>>> pkce.make_codes(3, 43)
+			['Xf0Q...', 'p2Lk...', 'Zr8a...']
 	"""
+	if not isinstance(count, int) or count < 0:
+		raise ValueError("'count' must be a positive int")
 	n = 128 if not isinstance(n, int) else n
 	n = 128 if not 43 <= n <= 128 else n
-	short_code_raw = base64.urlsafe_b64encode(urandom(n*2)).decode('utf-8')
-	short_code = re.sub('[^a-zA-Z0-9]+', '', short_code_raw)
-	return short_code[:n]
+	chars = _alphanumeric(count * n).decode('ascii')
+	return [chars[i:i + n] for i in range(0, count * n, n)]
 
 
 def short_code():
@@ -50,5 +81,7 @@ def short_code():
 			import secrets
 			from uuid import uuid4 
 	"""
+	if _entropy._source is not None:  #> pkce.configure(entropy=...)
+		return base64.urlsafe_b64encode(_entropy._source.take(24)).decode('ascii')
 	return secrets.token_urlsafe(24) #> 'sPYPr1evEU0EpROcqCAKz4yiDB2EzVTa'
-	return uuid.uuid4().hex #> 'ca1ecea7e6fb47ef8c306ebc51d326d4'
+	# return uuid.uuid4().hex #> 'ca1ecea7e6fb47ef8c306ebc51d326d4'
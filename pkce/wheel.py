@@ -0,0 +1,95 @@
+"########################"
+"#     TIMING WHEEL     #"
+"########################"
+
+import time
+from array import array
+
+"""
+
+TimingWheel
+
+	Hierarchical timing wheel, O(1) to schedule a key and O(1) amortised to expire it.
+
+	Level 0 has one slot per tick, a slot on level L covers slots**L ticks. A key goes in the
+	lowest level where its deadline shares the current block of slots**(L+1) ticks, when a
+	higher level slot comes due its keys cascade down to a finer level, or expire.
+
+	>>> wheel = TimingWheel(tick=1.0)
+	>>> wheel.schedule('code', time.time() + 300)
+	>>> wheel.advance()  #> keys whose deadline passed since the last call
+	[]
+
+"""
+
+
+class TimingWheel:
+	""" Expiry schedule for keys, advance() returns the keys whose deadline passed.
+
+		Keys are not removed when they are deleted elsewhere, the owner checks that an expired
+		key is still due before dropping it.
+	"""
+
+	def __init__(self, tick: float=1.0, slots: int=64, levels: int=4, now: float=None):
+		self.tick = tick
+		self.slots = slots
+		self.levels = levels
+		self._keys = [[[] for _ in range(slots)] for _ in range(levels)]
+		self._ticks = [[array('q') for _ in range(slots)] for _ in range(levels)]  #> deadline tick of each key, 8 bytes instead of an int object
+		self._current = int((time.time() if now is None else now) // tick)  #> last tick processed
+
+	def schedule(self, key, deadline: float):
+		""" Add key, advance() returns it on the first tick at or after 'deadline'.
+		"""
+		deadline_tick = -int(-deadline // self.tick)  #> ceil
+		self._insert(key, max(deadline_tick, self._current + 1))
+
+	def _insert(self, key, deadline_tick):
+		slots, current = self.slots, self._current
+		top = slots ** self.levels
+		target = deadline_tick
+		if target // top != current // top:  #> beyond the top level, park at the end of it and re-insert later
+			target = max((current // top + 1) * top - 1, current + 1)
+		span = slots
+		for level in range(self.levels):
+			if target // span == current // span:
+				slot = (target * slots // span) % slots
+				break
+			span *= slots
+		else:
+			level, slot = 0, target % slots  #> target == current + 1 on a top block boundary
+		self._keys[level][slot].append(key)
+		self._ticks[level][slot].append(deadline_tick)
+
+	def _drain(self, level, slot, expired):
+		keys = self._keys[level][slot]
+		if keys:
+			ticks = self._ticks[level][slot]
+			self._keys[level][slot], self._ticks[level][slot] = [], array('q')
+			current = self._current
+			for key, deadline_tick in zip(keys, ticks):
+				if deadline_tick <= current:
+					expired.append(key)
+				else:
+					self._insert(key, deadline_tick)
+
+	def advance(self, now: float=None) -> list:
+		""" Process every tick up to 'now', return the keys that expired.
+		"""
+		end = int((time.time() if now is None else now) // self.tick)
+		expired = []
+		slots = self.slots
+		while self._current < end:
+			self._current += 1
+			current = self._current
+			span = slots
+			for level in range(1, self.levels):  #> cascade the higher levels whose slot starts now
+				if current % span:
+					break
+				self._drain(level, (current // span) % slots, expired)
+				span *= slots
+			self._drain(0, current % slots, expired)
+		return expired
+
+	def __len__(self):
+		return sum(len(keys) for wheel in self._keys for keys in wheel)
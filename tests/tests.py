@@ -151,4 +151,1102 @@ def test():
 	assert solve(None, False, 'S256') == verifier_length
 
 
-	print('All tests passed')
\ No newline at end of file
+	print('All tests passed')
+
+def test_generate_many():
+	batch = pkce.generate_many(50)
+	assert len(batch) == 50
+	pixies = list(batch)
+	assert len({pixy.code_verifier for pixy in pixies}) == 50
+	for pixy in pixies:
+		assert len(pixy.code_verifier) == 128
+		assert pixy.code_challenge == pkce.make_challenge(pixy.code_verifier)
+		assert pkce.solve(**asdict(pixy)) is True
+	assert batch[-1] == pixies[-1]
+	assert batch[10:12] == pixies[10:12]
+
+	batch = pkce.generate_many(5, length=43)
+	assert all(len(pixy.code_verifier) == 43 and pkce.solve(**asdict(pixy)) is True for pixy in batch)
+	assert all(pixy.code_challenge == pixy.code_verifier for pixy in pkce.generate_many(5, 'plain'))
+	assert len(pkce.generate_many(0)) == 0
+
+	try:
+		pkce.generate_many(5, 'hello')
+		assert False
+	except pkce.TransformAlgorithm:
+		pass
+
+
+def test_solve_many():
+	from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+	pixy = pkce.generate()
+	verifier, challenge, method = pixy.code_verifier, pixy.code_challenge, pixy.code_challenge_method
+	items = [
+		(verifier, challenge, method),
+		(verifier, challenge),
+		(verifier + 'hello', challenge, method),
+		(verifier, None, method),
+		(verifier, challenge, 'hello'),
+		(verifier, challenge + 'é', method),
+		(None, None, None),
+		{'code_verifier': verifier, 'code_challenge': verifier},
+		pixy,
+	]
+	expected = [pkce.solve(*item) if isinstance(item, tuple) else pkce.solve(**dict(item)) for item in items]
+
+	assert list(pkce.solve_many(items)) == expected
+	assert list(pkce.solve_many(items, chunk_size=2)) == expected
+	with ThreadPoolExecutor(2) as pool:
+		assert list(pkce.solve_many(items * 10, executor=pool, chunk_size=3)) == expected * 10
+	with ProcessPoolExecutor(2) as pool:
+		assert list(pkce.solve_many(iter(items * 10), executor=pool, chunk_size=4)) == expected * 10
+
+	try:
+		pkce.solve_many(items, chunk_size=0)
+		assert False
+	except ValueError:
+		pass
+
+
+def test_pixy_pool():
+	import os
+	import time
+
+	with pkce.PixyPool(size=64, low_watermark=16) as pool:
+		for _ in range(100):
+			if pool.stats()['ready'] == 64:
+				break
+			time.sleep(0.01)
+		pixies = [pool.get() for _ in range(80)]
+		assert all(pkce.solve(**asdict(pixy)) is True for pixy in pixies)
+		assert len({pixy.code_verifier for pixy in pixies}) == 80
+		stats = pool.stats()
+		assert stats['hits'] + stats['misses'] == 80
+		assert stats['hits'] >= 64 and stats['refills'] >= 1
+
+		if hasattr(os, 'fork'):
+			parent_ready = {pixy.code_verifier for pixy in list(pool._ready)}
+			read, write = os.pipe()
+			pid = os.fork()
+			if pid == 0:
+				try:
+					verifier = pool.get().code_verifier
+					shared = verifier in parent_ready or bool(parent_ready & {p.code_verifier for p in pool._ready})
+					os.write(write, b'shared' if shared else b'ok')
+				finally:
+					os._exit(0)
+			os.close(write)
+			os.waitpid(pid, 0)
+			assert os.read(read, 16) == b'ok'
+			os.close(read)
+
+	try:
+		pool.get()
+		assert False
+	except RuntimeError:
+		pass
+
+	# closed while the first refill runs, the refill is dropped
+	pool = pkce.PixyPool(size=4096)
+	thread = pool._thread
+	pool.close()
+	thread.join(10)
+	assert not thread.is_alive() and pool.stats()['ready'] == 0
+
+
+def test_auth_code_codec():
+	from cryptography.fernet import Fernet
+
+	pixy = pkce.generate()
+	codec = pkce.AuthCodeCodec(Fernet.generate_key(), ttl=60)
+	claims = {'code_challenge': pixy.code_challenge, 'code_challenge_method': 'S256', 'client_id': 'mrsimple'}
+	auth_code = codec.encode(claims, state='xyz')
+	assert 'exp' not in claims
+
+	payload = codec.decode(auth_code)
+	assert payload['code_challenge'] == pixy.code_challenge
+	assert payload['state'] == 'xyz'
+	assert payload['aud'] == 'auth_code'
+	assert payload['exp'] - payload['iat'] == 60
+	assert pkce.solve(pixy.code_verifier, payload['code_challenge'], payload['code_challenge_method']) is True
+
+	for bad in (pkce.AuthCodeCodec(Fernet.generate_key()).encode(claims), auth_code[:-4], ''):
+		try:
+			codec.decode(bad)
+			assert False
+		except Exception:
+			pass
+	try:
+		codec.decode(auth_code, audience='other')
+		assert False
+	except Exception:
+		pass
+
+	expired = pkce.AuthCodeCodec(codec.key, ttl=-10).encode(claims)
+	try:
+		codec.decode(expired)
+		assert False
+	except Exception:
+		pass
+
+	# module functions are wrappers over a default codec built from FERNET_KEY
+	assert pkce.load_auth_code(pkce.create_auth_code(**claims))['client_id'] == 'mrsimple'
+	assert pkce.pkce._get_codec() is pkce.pkce._get_codec()
+
+
+def test_compact_auth_code():
+	from cryptography.fernet import Fernet
+
+	pixy = pkce.generate()
+	codec = pkce.AuthCodeCodec(Fernet.generate_key())
+	claims = {'code_challenge': pixy.code_challenge, 'code_challenge_method': 'S256', 'client_id': 'mrsimple'}
+
+	compact = codec.encode(claims, code_format='compact')
+	fernet = codec.encode(claims)
+	assert not compact.startswith('g') and fernet.startswith('gAAAAA')
+	assert len(compact) < len(fernet) / 2
+	assert codec.decode(compact) == codec.decode(fernet)
+
+	import base64
+	raw = base64.urlsafe_b64decode(compact + '=' * (-len(compact) % 4))
+	as_binary = base64.urlsafe_b64encode(b'\x02' + raw[1:]).rstrip(b'=').decode()  #> version byte flipped to binary
+	for bad in (compact[:-2], compact[:5] + ('A' if compact[5] != 'A' else 'B') + compact[6:], as_binary, 'A', '!!!!'):
+		try:
+			codec.decode(bad)
+			assert False
+		except pkce.InvalidAuthCode as e:
+			assert e.response['error'] == 'invalid_grant'
+	for bad in (
+		pkce.AuthCodeCodec(Fernet.generate_key()).encode(claims, code_format='compact'),
+		pkce.AuthCodeCodec(codec.key, ttl=-1).encode(claims, code_format='compact'),
+		pkce.AuthCodeCodec(codec.key, audience='other').encode(claims, code_format='compact'),
+	):
+		try:
+			codec.decode(bad)
+			assert False
+		except pkce.InvalidAuthCode:
+			pass
+
+	assert pkce.load_auth_code(pkce.create_auth_code(code_format='compact', **claims))['client_id'] == 'mrsimple'
+	try:
+		codec.encode(claims, code_format='hello')
+		assert False
+	except ValueError:
+		pass
+
+
+def test_replay_store(tmp_path):
+	import time
+	from cryptography.fernet import Fernet
+
+	codec = pkce.AuthCodeCodec(Fernet.generate_key())
+	stores = [
+		pkce.MemoryReplayStore(),
+		pkce.MemoryReplayStore(shards=2, bloom=pkce.RotatingBloomFilter(capacity=1000)),
+		pkce.SQLiteReplayStore(str(tmp_path / 'used.db'), batch_size=4),
+		pkce.SQLiteReplayStore(str(tmp_path / 'exact.db')),
+	]
+	for store in stores:
+		codes = [codec.encode(code_challenge=str(i), code_format=('compact', 'fernet')[i % 2]) for i in range(10)]
+		for auth_code in codes:
+			assert codec.decode(auth_code, replay_store=store)['code_challenge']
+		for auth_code in codes:
+			try:
+				codec.decode(auth_code, replay_store=store)
+				assert False
+			except pkce.ReusedAuthCode as e:
+				assert e.response == {"error": "invalid_grant", "error_description": "authorization code already used"}
+		stats = store.stats()
+		assert stats['lookups'] == 20 and stats['hits'] == 10 and stats['hit_rate'] == 0.5
+		assert stats['entries'] == 10 and stats['memory_bytes'] > 0
+		if store.bloom is not None:
+			assert stats['bloom_skips'] == 10
+
+	# other spellings of a used code are the same code
+	from pkce.replay import code_material, canonical_code
+	store = pkce.MemoryReplayStore()
+	for code_format in pkce.codec.CODE_FORMATS:
+		auth_code = codec.encode(code_challenge='x', code_format=code_format)
+		codec.decode(auth_code, replay_store=store)
+		if code_format == 'fernet':
+			spellings = [auth_code + '==', auth_code + '!', auth_code + '\n', auth_code.replace('-', '+').replace('_', '/')]
+		else:
+			spellings = [code for code in (auth_code[:-1] + c for c in 'AQgw') if code != auth_code and code_material(code) == code_material(auth_code)]
+			for bad in (auth_code + '==', auth_code + '\n', auth_code.replace('-', '+').replace('_', '/') if '-' in auth_code or '_' in auth_code else '!'):
+				try:
+					codec.decode(bad, replay_store=store)
+					assert False
+				except pkce.InvalidAuthCode:
+					pass
+		for spelling in spellings:
+			assert canonical_code(spelling) == canonical_code(auth_code)
+			try:
+				codec.decode(spelling, replay_store=store)
+				assert False
+			except pkce.ReusedAuthCode:
+				pass
+
+	# expired entries do not count as a replay and are dropped
+	store = pkce.MemoryReplayStore(shards=1)
+	assert store.check_and_add(b'a' * 16, time.time() - 1)
+	assert store.check_and_add(b'a' * 16, time.time() + 60)
+	assert not store.check_and_add(b'a' * 16, time.time() + 60)
+	assert store.check_and_add(b'b' * 16, time.time() + 60) and len(store) == 2
+
+	# a second worker sees the key right away, expired keys can be used again
+	path = str(tmp_path / 'shared.db')
+	first, second = pkce.SQLiteReplayStore(path), pkce.SQLiteReplayStore(path)
+	assert first.check_and_add(b'c' * 16, time.time() + 60)
+	assert not second.check_and_add(b'c' * 16, time.time() + 60)
+	assert second.check_and_add(b'e' * 16, time.time() - 1) and first.check_and_add(b'e' * 16, time.time() + 60)
+	try:
+		pkce.SQLiteReplayStore(path, bloom=pkce.RotatingBloomFilter(capacity=100))
+		assert False
+	except ValueError:
+		pass
+
+	# two workers racing on one key, exactly one wins
+	import threading
+	barrier = threading.Barrier(8)
+	results = []
+
+	def race(store):
+		barrier.wait()
+		results.append(store.check_and_add(b'f' * 16, time.time() + 60))
+
+	threads = [threading.Thread(target=race, args=(pkce.SQLiteReplayStore(path),)) for _ in range(8)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert sorted(results) == [False] * 7 + [True]
+
+	try:
+		pkce.replay.ReplayStore()
+		assert False
+	except TypeError:
+		pass
+
+	bloom = pkce.RotatingBloomFilter(capacity=100, rotate_every=0.05)
+	assert not bloom.add(b'd' * 16) and bloom.add(b'd' * 16) and b'd' * 16 in bloom
+	time.sleep(0.06)
+	assert b'd' * 16 in bloom  #> still in the previous generation
+	time.sleep(0.11)
+	assert b'd' * 16 not in bloom
+
+	auth_code = pkce.create_auth_code(code_challenge='x')
+	store = pkce.MemoryReplayStore()
+	pkce.load_auth_code(auth_code, replay_store=store)
+	try:
+		pkce.load_auth_code(auth_code, replay_store=store)
+		assert False
+	except pkce.InvalidAuthCode:
+		pass
+
+
+def test_async():
+	import asyncio
+
+	pixies = list(pkce.generate_many(20))
+
+	async def main():
+		runner = pkce.AsyncRunner(max_workers=2, max_pending=8, max_batch=5)
+		results = await asyncio.gather(*(runner.solve(**asdict(pixy)) for pixy in pixies))
+		assert results == [True] * 20
+		assert await runner.solve(pixies[0].code_verifier, 'nope', 'S256') == pkce.NotEqual.response
+
+		assert await pkce.solve_async(**asdict(pixies[0])) is True
+		auth_code = await pkce.create_auth_code_async(code_challenge=pixies[0].code_challenge, code_format='compact')
+		assert (await pkce.load_auth_code_async(auth_code))['code_challenge'] == pixies[0].code_challenge
+		try:
+			await pkce.load_auth_code_async(auth_code[:-3])
+			assert False
+		except pkce.InvalidAuthCode:
+			pass
+		runner.shutdown()
+
+	asyncio.run(main())
+
+
+def test_pixy():
+	import pickle
+	import dataclasses
+
+	pixy = pkce.generate()
+	assert pixy.dict() == dict(pixy) == asdict(pixy)
+	assert pixy.tuple() == dataclasses.astuple(pixy) == (pixy.code_verifier, pixy.code_challenge, pixy.code_challenge_method)
+	assert pkce.solve(**dict(pixy)) is True and pkce.solve(*pixy.tuple()) is True
+
+	same = pkce.Pixy(*pixy.tuple())
+	assert same == pixy and hash(same) == hash(pixy) and len({pixy, same}) == 1
+	assert pixy != pkce.generate() and pixy != pixy.dict()
+	assert pickle.loads(pickle.dumps(pixy)) == pixy
+
+	assert not hasattr(pixy, '__dict__')
+	try:
+		pixy.code_verifier = 'hello'
+		assert False
+	except dataclasses.FrozenInstanceError:
+		pass
+
+
+def test_verify():
+	from types import MappingProxyType
+
+	pixy = pkce.generate()
+	verifier, challenge = pixy.code_verifier, pixy.code_challenge
+	cases = [
+		((verifier, challenge, 'S256'), pkce.SolveResult.OK, True),
+		((verifier + 'hello', challenge, 'S256'), pkce.SolveResult.INVALID_VERIFIER, pkce.InvalidRequestError.response),
+		((verifier, None, 'S256'), pkce.SolveResult.MISSING_CHALLENGE, pkce.MissingChallenge.response),
+		((verifier, challenge, 'hello'), pkce.SolveResult.UNSUPPORTED_METHOD, pkce.TransformAlgorithm.response),
+		((verifier, challenge, 'plain'), pkce.SolveResult.NOT_EQUAL, pkce.NotEqual.response),
+		((verifier, challenge + 'é', 'S256'), pkce.SolveResult.UNKNOWN_ERROR, pkce.UNKNOWN_ERROR),
+	]
+	for args, result, response in cases:
+		assert pkce.solve(*args) == response
+		first, second = pkce.verify(*args), pkce.verify(*args)
+		assert first is second  #> pre-built
+		assert first[0] is result and bool(result) is (result is not pkce.SolveResult.OK)
+		if result:
+			assert isinstance(first[1], MappingProxyType) and first[1] == response
+		else:
+			assert first[1] is None
+
+	result, response = pkce.verify(verifier, challenge, 'plain')
+	try:
+		raise pkce.SOLVE_ERRORS[result]('Could not solve')
+	except pkce.NotEqual as e:
+		assert e.response == response
+	try:
+		response['error'] = 'hello'
+		assert False
+	except TypeError:
+		pass
+
+
+def test_bytes_input():
+	pixy = pkce.generate()
+	verifier, challenge = pixy.code_verifier, pixy.code_challenge
+	raw_verifier, raw_challenge = verifier.encode(), challenge.encode()
+
+	assert pkce.make_challenge(raw_verifier) == pkce.make_challenge(memoryview(raw_verifier)) == challenge
+	assert pkce.make_challenge(bytearray(raw_verifier), 'plain') == verifier
+	for args in (
+		(raw_verifier, raw_challenge, 'S256'),
+		(memoryview(raw_verifier), memoryview(raw_challenge), 'S256'),
+		(verifier, raw_challenge, 'S256'),
+		(raw_verifier, challenge, 'S256'),
+		(raw_verifier, verifier, 'plain'),
+		(memoryview(b'x' + raw_verifier)[1:], bytearray(raw_verifier), 'plain'),
+	):
+		assert pkce.solve(*args) is True
+
+	assert pkce.solve(raw_verifier, raw_challenge[:-1] + (b'A' if raw_challenge[-1:] != b'A' else b'E'), 'S256') == pkce.NotEqual.response
+	assert pkce.solve(raw_verifier, None, 'S256') == pkce.MissingChallenge.response
+	for bad in (raw_verifier[:42], raw_verifier + b'!', b'\xff' * 50, 'é' * 50, raw_verifier + b'a' * 100, 12345):
+		assert pkce.solve(bad, raw_challenge, 'S256') == pkce.InvalidRequestError.response
+		try:
+			pkce._check_verifier(bad)
+			assert False
+		except pkce.InvalidRequestError:
+			pass
+	assert pkce.solve(verifier, challenge + 'é', 'hello') == pkce.TransformAlgorithm.response
+
+
+def test_instrumentation():
+	from cryptography.fernet import Fernet
+
+	pixy = pkce.generate()
+	sink = pkce.HistogramSink()
+	pkce.set_instrumentation(sink)
+	try:
+		assert pkce.get_instrumentation() is sink
+		assert pkce.solve(*pixy.tuple()) is True
+		assert pkce.solve(pixy.code_verifier, pixy.code_challenge, 'plain') == pkce.NotEqual.response
+		assert pkce.solve('hello', pixy.code_challenge, 'S256') == pkce.InvalidRequestError.response
+		assert pkce.verify(pixy.code_verifier, pixy.code_challenge, 'S512')[0] is pkce.SolveResult.UNSUPPORTED_METHOD
+		assert pkce.solve(pixy.code_verifier, pixy.code_challenge + 'é', 'S256') == pkce.UNKNOWN_ERROR
+
+		codec = pkce.AuthCodeCodec(Fernet.generate_key())
+		codec.decode(codec.encode(code_challenge='x'), replay_store=pkce.MemoryReplayStore())
+		codec.decode(codec.encode(code_challenge='x', code_format='compact'))
+		auth_code = pkce.create_auth_code(code_challenge='x', code_format='compact')
+		for bad in (auth_code[:-3], pkce.create_auth_code(code_challenge='x')[:-3]):
+			try:
+				pkce.load_auth_code(bad)
+				assert False
+			except Exception:
+				pass
+	finally:
+		pkce.set_instrumentation(None)
+
+	assert sink.count('validation') == 5 and sink.count('hashing') == 1 and sink.count('compare') == 2
+	for stage in ('jwt_encode', 'fernet_encrypt', 'fernet_decrypt', 'jwt_decode', 'aead_encrypt', 'aead_decrypt', 'replay_check'):
+		assert sink.count(stage) >= 1, stage
+	errors = sink.errors()
+	assert errors[('solve', 'NotEqual')] == 1 and errors[('solve', 'InvalidRequestError')] == 1
+	assert errors[('verify', 'TransformAlgorithm')] == 1 and errors[('solve', 'UnknownError')] == 1
+	assert errors[('load_auth_code', 'InvalidAuthCode')] == 1 and errors[('load_auth_code', 'InvalidToken')] == 1
+
+	text = sink.render()
+	assert '# TYPE pkce_stage_seconds histogram' in text
+	assert 'pkce_stage_seconds_count{stage="validation"} 5' in text
+	assert 'pkce_stage_seconds_bucket{stage="hashing",le="+Inf"} 1' in text
+	assert 'pkce_errors_total{function="solve",error="NotEqual"} 1' in text
+
+	pkce.solve(*pixy.tuple())
+	assert sink.count('validation') == 5  #> disabled
+
+
+def test_import_time():
+	""" `import pkce` only loads pkce/__init__.py, run with -s to see the import time.
+	"""
+	import sys
+	import subprocess
+
+	code = "import sys, pkce; print(','.join(sorted(sys.modules)))"
+	process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+	modules = set(process.stdout.strip().split(','))
+	for heavy in ('pkce.pkce', 'hashlib', 'secrets', 'dataclasses', 'asyncio', 'sqlite3', 'jose', 'cryptography'):
+		assert heavy not in modules, heavy
+
+	cumulative = {line.split('|')[2].strip(): int(line.split('|')[1]) for line in process.stderr.splitlines() if line.startswith('import time:') and '|' in line and 'cumulative' not in line}
+	print(f"\nimport pkce: {cumulative['pkce']} us")  #> informational, the sys.modules checks above are the test
+
+	# attributes load their submodule on first use
+	code = "import sys, pkce; pkce.generate; print('pkce.pkce' in sys.modules, 'pkce.codec' in sys.modules, 'generate' in dir(pkce))"
+	assert subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split() == ['True', 'False', 'True']
+
+
+def test_configure():
+	from cryptography.fernet import Fernet
+
+	fernet_key, verbose = pkce.pkce.FERNET_KEY, pkce.pkce.VERBOSE_PKCE
+	try:
+		key = Fernet.generate_key()
+		pkce.configure(fernet_key=key.decode(), verbose=True)
+		assert pkce.pkce.FERNET_KEY == key and pkce.pkce.VERBOSE_PKCE
+		auth_code = pkce.create_auth_code(code_challenge='x')
+		assert pkce.AuthCodeCodec(key).decode(auth_code)['code_challenge'] == 'x'
+
+		pkce.configure(fernet_key=Fernet.generate_key(), verbose=False)
+		assert not pkce.pkce.VERBOSE_PKCE
+		try:
+			pkce.load_auth_code(auth_code)
+			assert False
+		except Exception:
+			pass
+	finally:
+		pkce.configure(fernet_key=fernet_key, verbose=bool(verbose))
+
+	try:
+		pkce.hello
+		assert False
+	except AttributeError:
+		pass
+
+
+def test_make_code():
+	import os
+	import string
+
+	alphabet = set(string.ascii_letters + string.digits)
+	for n, length in ((43, 43), (60, 60), (128, 128), (None, 128), ('', 128), (0, 128), (10, 128), (1000, 128)):
+		for _ in range(50):
+			code = pkce.make_code(n)
+			assert len(code) == length and set(code) <= alphabet
+	assert len(pkce.make_code()) == 43
+
+	codes = pkce.make_codes(200, 50)
+	assert len(codes) == 200 and len(set(codes)) == 200
+	assert all(len(code) == 50 and set(code) <= alphabet for code in codes)
+	assert pkce.make_codes(0) == []
+
+	# after a fork the child does not reuse the parent's buffered entropy
+	if hasattr(os, 'fork'):
+		pkce.make_code()
+		read, write = os.pipe()
+		pid = os.fork()
+		if pid == 0:
+			try:
+				os.write(write, pkce.make_code().encode())
+			finally:
+				os._exit(0)
+		os.close(write)
+		os.waitpid(pid, 0)
+		assert os.read(read, 64).decode() != pkce.make_code()
+		os.close(read)
+
+
+def test_make_code_uniform():
+	""" Chi-squared test over the 62 chars, 61 degrees of freedom, p < 1e-6 above ~125.
+	"""
+	import string
+	from collections import Counter
+
+	counts = Counter(''.join(pkce.make_codes(2000, 62)))
+	expected = 2000 * 62 / 62
+	chi_squared = sum((counts[char] - expected) ** 2 / expected for char in string.ascii_letters + string.digits)
+	assert len(counts) == 62
+	assert chi_squared < 125, chi_squared
+
+
+def test_pending_store():
+	from pkce.wheel import TimingWheel
+
+	store = pkce.PendingAuthorizationStore(ttl=300)
+	pixy = pkce.generate()
+	code = pkce.make_code()
+	store.put(code, pixy.code_challenge, 'S256', client_id='mrsimple', redirect_uri='https://a.b/cb', state='xyz')
+	assert code in store and len(store) == 1
+	result, entry = store.redeem(code, pixy.code_verifier, client_id='mrsimple')
+	assert result is True and entry.client_id == 'mrsimple' and entry.state == 'xyz'
+	assert store.redeem(code, pixy.code_verifier) == (pkce.InvalidAuthCode.response, None)
+	assert len(store) == 0
+
+	# a wrong verifier still uses up the code
+	store.put(code, pixy.code_challenge, 'S256')
+	assert store.redeem(code, 'x' * 43)[0] == pkce.NotEqual.response
+	assert store.redeem(code, pixy.code_verifier)[1] is None
+
+	plain = pkce.generate('plain')
+	store.put(code, plain.code_challenge, 'plain', client_id='mrsimple')
+	assert store.redeem(code, plain.code_verifier, client_id='other') == (pkce.InvalidAuthCode.response, None)
+	store.put(code, plain.code_challenge, 'plain')
+	assert store.redeem(code, plain.code_verifier)[0] is True
+
+	store.put(code, pixy.code_challenge, 'S256', ttl=-1)
+	assert code not in store
+	assert store.redeem(code, pixy.code_verifier)[1] is None
+
+	for challenge, method, error in ((None, 'S256', pkce.MissingChallenge), (pixy.code_challenge, 'S512', pkce.TransformAlgorithm), ('abc', 'S256', pkce.InvalidRequestError),
+			('*' * 43, 'S256', pkce.InvalidRequestError), ('A' * 41 + '**', 'S256', pkce.InvalidRequestError), (b'\xff' * 43, 'S256', pkce.InvalidRequestError),
+			(pixy.code_challenge[:41] + 'A=', 'S256', pkce.InvalidRequestError)):  #> round trips as 31 bytes
+		try:
+			store.put(code, challenge, method)
+			assert False
+		except error:
+			pass
+
+	# keys come out on the first advance() at or after their deadline, across levels and past the top level
+	wheel = TimingWheel(tick=1.0, slots=4, levels=2, now=1000)
+	deadlines = {key: 1000 + delay for key, delay in enumerate((0.5, 1, 3, 4, 5, 17, 40, 100))}
+	for key, deadline in deadlines.items():
+		wheel.schedule(key, deadline)
+	assert len(wheel) == 8
+	expired = {}
+	for now in range(1000, 1120, 3):
+		for key in wheel.advance(now):
+			expired[key] = now
+	assert all(deadlines[key] <= now < deadlines[key] + 3 for key, now in expired.items())
+	assert len(expired) == 8 and len(wheel) == 0
+
+
+def test_pixy_store(tmp_path):
+	import os
+
+	path = str(tmp_path / 'pixy.store')
+	with pkce.PixyStore(path, capacity=64, ttl=600) as store:
+		pixy, plain = pkce.generate(), pkce.generate('plain', 43)
+		store.put('state-1', pixy)
+		store.put(plain.code_challenge, plain)
+		assert store.get('state-1') == pixy and 'state-1' in store and len(store) == 2
+		assert store.pop(plain.code_challenge) == plain
+		assert store.pop(plain.code_challenge) is None and store.get('other') is None
+
+		store.put('expired', pixy, ttl=-1)
+		assert store.get('expired') is None and len(store) == 1
+		assert store.purge() == 1
+
+		# fill the table, deleted and expired slots are reused
+		for i in range(63):
+			store.put(f'key-{i}', pixy)
+		try:
+			store.put('one-too-many', pixy)
+			assert False
+		except RuntimeError:
+			pass
+		for i in range(63):
+			assert store.pop(f'key-{i}') == pixy
+		assert len(store) == 1
+
+		# another process opening the same file sees the entries, and a forked child shares the mapping
+		with pkce.PixyStore(path, capacity=1) as other:
+			assert other.capacity == 64 and other.get('state-1') == pixy
+		if hasattr(os, 'fork'):
+			pid = os.fork()
+			if pid == 0:
+				try:
+					store.put('from-child', store.pop('state-1'))
+				finally:
+					os._exit(0)
+			os.waitpid(pid, 0)
+			assert store.get('state-1') is None and store.get('from-child') == pixy
+
+	try:
+		with open(path, 'r+b') as f:
+			f.write(b'garbage!')
+		pkce.PixyStore(path)
+		assert False
+	except ValueError:
+		pass
+
+
+def test_key_ring():
+	from cryptography.fernet import Fernet
+
+	old, new = Fernet.generate_key(), Fernet.generate_key()
+	claims = {'code_challenge': pkce.generate().code_challenge, 'code_challenge_method': 'S256'}
+	legacy_code = pkce.AuthCodeCodec(old).encode(claims)
+
+	ring = pkce.KeyRing({'k1': old}, ttl=300, legacy='k1')
+	codec = pkce.AuthCodeCodec(ring)
+	k1_codes = [codec.encode(claims), codec.encode(claims, code_format='compact')]
+	assert all(code.startswith('k1.') for code in k1_codes)
+
+	ring.rotate('k2', new)
+	k2_code = codec.encode(claims)
+	assert k2_code.startswith('k2.') and ring.kids() == ['k1', 'k2']
+	for code in k1_codes + [k2_code, legacy_code]:
+		assert codec.decode(code)['code_challenge'] == claims['code_challenge']
+
+	# the legacy key decodes a k1 code without its kid, it is still the same code for the replay store
+	store = pkce.MemoryReplayStore()
+	for code in k1_codes:
+		codec.decode(code, replay_store=store)
+		for spelling in (code.split('.', 1)[1], '.' + code.split('.', 1)[1]):
+			try:
+				codec.decode(spelling, replay_store=store)
+				assert False
+			except (pkce.ReusedAuthCode, pkce.InvalidAuthCode) as e:
+				assert isinstance(e, pkce.ReusedAuthCode) == (spelling[0] != '.')
+
+	# the retired key stops decoding once its codes have expired
+	ring.retire('k1', at=0)
+	assert 'k1' not in ring and len(ring) == 1
+	for code in k1_codes + [legacy_code, 'k9.' + k2_code[3:]]:
+		try:
+			codec.decode(code)
+			assert False
+		except pkce.InvalidAuthCode:
+			pass
+	assert codec.decode(k2_code)
+
+	for bad in (lambda: ring.retire('k2'), lambda: ring.add('no.dots', new), lambda: pkce.AuthCodeCodec(pkce.KeyRing())):
+		try:
+			bad()
+			assert False
+		except ValueError:
+			pass
+
+	fernet_key = pkce.pkce.FERNET_KEY
+	try:
+		pkce.configure(key_ring=ring)
+		assert pkce.create_auth_code(**claims).startswith('k2.')
+		assert pkce.load_auth_code(k2_code)['code_challenge'] == claims['code_challenge']
+	finally:
+		pkce.configure(fernet_key=fernet_key, key_ring=False)
+	assert not pkce.create_auth_code(**claims).startswith('k2.')
+
+
+def test_cli_verify(tmp_path, capsys):
+	import json
+	from pkce.cli import main
+
+	pixy = pkce.generate()
+	lines = [
+		json.dumps({'request_id': 'a', **pixy.dict()}),
+		json.dumps({'request_id': 'b', 'code_verifier': pixy.code_verifier, 'code_challenge': 'x' * 43, 'code_challenge_method': 'S256'}),
+		'',
+		'{not json',
+		json.dumps(list(pixy.tuple())),
+		json.dumps({'code_verifier': 'short', 'code_challenge': 'short'}),
+	] * 3
+	source, target = tmp_path / 'in.jsonl', tmp_path / 'out.jsonl'
+	source.write_text('\n'.join(lines) + '\n')
+
+	outputs = []
+	for workers in ('1', '2'):
+		assert main(['verify', str(source), '-o', str(target), '--workers', workers, '--chunk-size', '4', '--id-field', 'request_id']) == 0
+		outputs.append(target.read_bytes())
+	assert outputs[0] == outputs[1]
+	results = [json.loads(line) for line in outputs[0].splitlines()]
+	assert [result['line'] for result in results] == [n for n, line in enumerate(lines, 1) if line]
+	assert results[0] == {'line': 1, 'id': 'a', 'result': 'OK'}
+	assert results[1] == {'line': 2, 'id': 'b', 'result': 'NOT_EQUAL', **pkce.NotEqual.response}
+	assert [result['result'] for result in results[2:5]] == ['INVALID_RECORD', 'OK', 'INVALID_VERIFIER']
+
+	summary = capsys.readouterr().err
+	assert 'records 15 ' in summary and 'OK' in summary and 'INVALID_RECORD' in summary
+
+	for argv in (['verify', str(tmp_path / 'missing.jsonl')], ['verify', str(source), '-o', str(tmp_path / 'no' / 'out.jsonl')]):
+		try:
+			main(argv)
+			assert False
+		except SystemExit as e:
+			assert str(e).startswith('can not open ') and 'No such file' in str(e)
+
+
+def test_cli_shutdown(monkeypatch):
+	import sys
+	from pkce.cli import _shutdown
+
+	class Executor:
+		def shutdown(self, wait=True):  #> python 3.8, no cancel_futures
+			self.closed = True
+
+	executor = Executor()
+	monkeypatch.setattr(sys, 'version_info', (3, 8, 18))
+	_shutdown(executor)
+	assert executor.closed
+
+
+def test_cli_generate(tmp_path, capsys):
+	import json
+	from pkce.cli import main, read_fixtures
+
+	target = tmp_path / 'fixtures.jsonl'
+	assert main(['generate', '-n', '25', '-o', str(target), '--workers', '1', '--chunk-size', '10', '--auth-codes', '--client-id', 'mrsimple']) == 0
+	records = [json.loads(line) for line in target.read_text().splitlines()]
+	assert len(records) == 25 and len({record['code_verifier'] for record in records}) == 25
+	for record in records:
+		auth_code = record.pop('auth_code')
+		assert pkce.solve(**record) is True
+		assert pkce.load_auth_code(auth_code)['client_id'] == 'mrsimple'
+	assert 'generated 25 in' in capsys.readouterr().err
+
+	for argv, message in (
+		(['generate', '--length', '10'], '--length must be between 43 and 128, not 10'),
+		(['generate', '-n', '-1'], '-n and --chunk-size must be positive'),
+	):
+		try:
+			main(argv + ['-o', str(target)])
+			assert False
+		except SystemExit as e:
+			assert str(e) == message
+
+	for method, length in (('S256', 128), ('plain', 43)):
+		target = tmp_path / f'fixtures-{method}.bin'
+		main(['generate', '-n', '12', '-o', str(target), '--format', 'binary', '--method', method, '--length', str(length),
+			'--workers', '2', '--chunk-size', '5', '--auth-codes', '--code-format', 'compact'])
+		with open(target, 'rb') as f:
+			fixtures = list(read_fixtures(f))
+		assert len(fixtures) == 12
+		for pixy, auth_code in fixtures:
+			assert len(pixy.code_verifier) == length and pkce.solve(*pixy.tuple()) is True
+			assert pkce.load_auth_code(auth_code)['code_challenge'] == pixy.code_challenge
+
+
+def test_benchmark_regressions(tmp_path, capsys):
+	import json
+	from benchmarks.suite import regressions, main
+
+	def report(**cases):
+		return {'meta': {}, 'results': {name: {'ops_per_sec': ops, 'p50_us': p50, 'p99_us': p99} for name, (ops, p50, p99) in cases.items()}}
+
+	baseline = report(solve=(1000, 10, 20), generate=(500, 20, 40), gone=(1, 1, 1))
+	assert regressions(baseline, report(solve=(950, 10.5, 21), generate=(500, 20, 40), new=(1, 1, 1)), 0.10) == []
+	found = regressions(baseline, report(solve=(850, 10, 20), generate=(500, 20, 50)), 0.10)
+	assert [(name, metric) for name, metric, *_ in found] == [('solve', 'ops_per_sec'), ('generate', 'p99_us')]
+	assert regressions(baseline, report(solve=(850, 10, 20), generate=(500, 20, 50)), 0.30) == []
+
+	paths = []
+	for name, data in (('baseline', baseline), ('ok', report(solve=(1100, 9, 19))), ('slow', report(solve=(800, 10, 20)))):
+		paths.append(str(tmp_path / f'{name}.json'))
+		with open(paths[-1], 'w') as f:
+			json.dump(data, f)
+	assert main(['compare', paths[0], paths[1]]) == 0
+	assert main(['compare', paths[0], paths[2]]) == 1
+	assert main(['compare', paths[0], paths[2], '--threshold', '0.25']) == 0
+	assert 'REGRESSION solve ops_per_sec' in capsys.readouterr().out
+
+
+def test_challenge_methods():
+	import hashlib
+	import base64
+
+	assert set(pkce.CHALLENGE_METHODS) >= {'S256', 'plain'}
+	verifier = pkce.make_verifier()
+	assert pkce.make_challenge(verifier) == base64.urlsafe_b64encode(hashlib.sha256(verifier.encode()).digest()).decode().rstrip('=')
+	assert pkce.make_challenge(verifier, 'plain') == verifier
+	for method in ('S999', None, ['S256']):
+		assert pkce.solve(verifier, verifier, method) == pkce.TransformAlgorithm.response
+		try:
+			pkce.make_challenge(verifier, method)
+			assert False
+		except pkce.TransformAlgorithm:
+			pass
+
+	challenge_methods, accepted_methods = dict(pkce.CHALLENGE_METHODS), pkce.pkce.ACCEPTED_METHODS
+	try:
+		pkce.register_method('B2B', pkce.blake2b_transform)
+		pkce.register_method('S512', pkce.sha512_transform, accept=False)
+		try:
+			pkce.register_method('S256', pkce.sha512_transform)
+			assert False
+		except ValueError:
+			pass
+		pixy = pkce.generate('B2B')
+		assert len(pixy.code_challenge) == 43 and pkce.solve(*pixy.tuple()) is True
+		assert pkce.solve(pixy.code_verifier, pkce.generate('B2B').code_challenge, 'B2B') == pkce.NotEqual.response
+		batch = pkce.generate_many(3, 'B2B')
+		assert all(pkce.solve(*pixy.tuple()) is True for pixy in batch)
+		s512 = pkce.generate('S512')  #> registered but not accepted, clients can still make it
+		assert s512.code_challenge == pkce.sha512_transform(s512.code_verifier.encode()).decode()
+		last = pkce.generate_many(2, 'S512')[1]
+		assert last.code_challenge == pkce.make_challenge(last.code_verifier, 'S512')
+		assert pkce.solve(*s512.tuple()) == pkce.TransformAlgorithm.response
+
+		store = pkce.PendingAuthorizationStore()
+		store.put('code', pixy.code_challenge, 'B2B')
+		assert store.redeem('code', pixy.code_verifier)[0] is True
+
+		# a server that only accepts S256
+		pkce.configure(accepted_methods=['S256'])
+		assert pkce.solve(verifier, verifier, 'plain') == pkce.TransformAlgorithm.response
+		assert pkce.verify(*pixy.tuple())[0] == pkce.SolveResult.UNSUPPORTED_METHOD
+		assert pkce.generate('plain').code_challenge_method == 'plain'  #> the accepted set does not limit clients
+		assert pkce.make_challenge(verifier, 'B2B') == pkce.blake2b_transform(verifier.encode()).decode()
+		plain = pkce.Pixy(verifier, verifier, 'plain')
+		assert list(pkce.solve_many([plain.tuple()])) == [pkce.TransformAlgorithm.response]
+		try:
+			pkce.configure(accepted_methods=['S256', 'nope'])
+			assert False
+		except ValueError:
+			pass
+	finally:
+		pkce.CHALLENGE_METHODS.clear()
+		pkce.CHALLENGE_METHODS.update(challenge_methods)
+		pkce.configure(accepted_methods=accepted_methods)
+	assert pkce.solve(verifier, verifier, 'plain') is True and 'B2B' not in pkce.CHALLENGE_METHODS
+
+
+def test_payload_schema():
+	from cryptography.fernet import Fernet
+
+	pixy = pkce.generate()
+	codec = pkce.AuthCodeCodec(Fernet.generate_key(), code_format='binary', replay_store=pkce.MemoryReplayStore())
+	claims = {'code_challenge': pixy.code_challenge, 'code_challenge_method': 'S256', 'client_id': 'mrsimple',
+		'redirect_uri': 'http://127.0.0.1:5007/auth/callback', 'state': pkce.make_code(), 'extra': [1, 'two'], 'nonce': None}
+	binary = codec.encode(claims)
+	compact = codec.encode(claims, code_format='compact')
+	assert len(binary) < len(compact) - 60
+	payload = codec.decode(binary)
+	assert isinstance(payload, pkce.LazyPayload)
+	assert payload['code_challenge'] == pixy.code_challenge and payload['aud'] == 'auth_code'
+	assert dict(payload) == codec.decode(compact)
+	try:
+		codec.decode(binary)
+		assert False
+	except pkce.ReusedAuthCode:
+		pass
+	assert codec.decode(codec.encode(claims, code_format='compact'))['exp'] == payload['exp']
+	assert pkce.load_auth_code(pkce.create_auth_code(code_format='binary', **claims))['state'] == claims['state']
+	for bad in (binary[:-2], pkce.AuthCodeCodec(codec.key, ttl=-1, code_format='binary').encode(claims)):
+		try:
+			codec.decode(bad)
+			assert False
+		except pkce.InvalidAuthCode:
+			pass
+
+	# fallbacks for values that are not the declared type
+	schema = pkce.PayloadSchema({'code_challenge': 'challenge', 'code_challenge_method': 'method', 'n': 'int', 's': 'str'})
+	claims = {'exp': 2, 'iat': 1, 'code_challenge': 'x' * 128, 'code_challenge_method': 'B2B', 'n': -5, 's': 'é' * 200}
+	payload = schema.decode(schema.encode(claims))
+	assert payload['s'] == claims['s'] and payload['n'] == -5 and 'missing' not in payload
+	assert dict(payload) == claims
+	assert dict(schema.decode(schema.encode({**claims, 'n': 'five', 'code_challenge': 'A' * 43}))) == {**claims, 'n': 'five', 'code_challenge': 'A' * 43}
+	for bad in ({'a': 'float'}, ['exp'], []):
+		try:
+			pkce.PayloadSchema(bad)
+			assert False
+		except ValueError:
+			pass
+
+
+def test_admission_control():
+	import time
+	from cryptography.fernet import Fernet
+
+	codec = pkce.AuthCodeCodec(Fernet.generate_key())
+	pixy = pkce.generate()
+	auth_code = codec.encode(code_challenge=pixy.code_challenge, code_challenge_method='S256')
+	admission = pkce.AdmissionControl(client_rate=0.001, client_burst=3, failure_cost=1, code_attempts=2, negative_ttl=0.2, shards=4)
+
+	# a failing client is turned away before solve() runs
+	wrong = pkce.make_verifier()
+	assert [admission.solve(wrong, pixy.code_challenge, 'S256', client_id='abuser') for _ in range(3)] == [
+		pkce.NotEqual.response, pkce.NotEqual.response, pkce.TooManyRequests.response]
+	assert admission.admit(client_id='abuser') == pkce.TooManyRequests.response
+	assert admission.admit(client_id='other') is True
+
+	# a code that failed is rejected without decrypting until negative_ttl passes
+	tampered = auth_code[:-8] + 'AAAAAAAA'
+	try:
+		admission.load_auth_code(tampered, codec=codec)
+		assert False
+	except Exception as e:
+		assert not isinstance(e, pkce.RejectedAuthCode)  #> the decryption error
+	try:
+		admission.load_auth_code(tampered, codec=codec)
+		assert False
+	except pkce.RejectedAuthCode as e:
+		assert e.response['error'] == 'invalid_grant'
+	for spelling in (tampered + '=', tampered + '==', tampered + '\n', 'k1.' + tampered, tampered.replace('-', '+').replace('_', '/')):
+		assert admission.admit(auth_code=spelling) == pkce.RejectedAuthCode.response
+	time.sleep(0.25)
+	assert admission.admit(auth_code=tampered) is True
+
+	# per code attempts
+	payload = admission.load_auth_code(auth_code, client_id='mrsimple', codec=codec)
+	assert admission.solve(pixy.code_verifier, payload['code_challenge'], 'S256', client_id='mrsimple', auth_code=auth_code, admit=False) is True
+	assert admission.admit(auth_code=auth_code) is True
+	assert admission.admit(auth_code=auth_code) == pkce.RejectedAuthCode.response
+
+	# memory is bounded
+	small = pkce.AdmissionControl(max_entries=8, shards=2)
+	for i in range(100):
+		small.admit(client_id=f'client{i}', auth_code=f'code{i}')
+		small.failure(auth_code=f'code{i}')
+	assert small.stats()['clients'] <= 8 and small.stats()['codes'] <= 8 and small.stats()['failed_codes'] <= 8
+
+
+def test_token_middleware():
+	import io
+	import json
+	import asyncio
+	from urllib.parse import urlencode
+	from cryptography.fernet import Fernet
+
+	codec = pkce.AuthCodeCodec(Fernet.generate_key(), code_format='compact')
+	pixy = pkce.generate()
+	claims = {'code_challenge': pixy.code_challenge, 'code_challenge_method': 'S256', 'client_id': 'mrsimple', 'redirect_uri': 'https://a.b/cb?x=1'}
+
+	def form(**changes):
+		fields = {'grant_type': 'authorization_code', 'code': codec.encode(claims), 'code_verifier': pixy.code_verifier,
+			'client_id': 'mrsimple', 'redirect_uri': 'https://a.b/cb?x=1', 'scope': 'ignored', **changes}
+		return urlencode({name: value for name, value in fields.items() if value is not None}).encode()
+
+	# incremental parsing, a field split across chunks
+	body = form() + b'&code=again'
+	parser = pkce.FormParser()
+	for i in range(0, len(body), 7):
+		parser.feed(body[i:i + 7])
+	parsed = parser.close()
+	assert parsed['redirect_uri'] == 'https://a.b/cb?x=1' and 'scope' not in parsed and parser.duplicate
+
+	def wsgi_app(environ, start_response):
+		start_response('200 OK', [('Content-Type', 'application/json')])
+		return [json.dumps({'client_id': environ['pkce.auth_code']['client_id']}).encode()]
+
+	wsgi = pkce.WSGITokenMiddleware(wsgi_app, codec=codec, replay_store=pkce.MemoryReplayStore(), chunk_size=16)
+
+	def wsgi_call(body, content_type='application/x-www-form-urlencoded', path='/token'):
+		environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': content_type,
+			'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body)}
+		status = []
+		out = b''.join(wsgi(environ, lambda s, headers: status.append(s)))
+		return int(status[0][:3]), json.loads(out)
+
+	assert wsgi_call(form()) == (200, {'client_id': 'mrsimple'})
+	assert wsgi_call(form(code_verifier=pkce.make_verifier())) == (400, pkce.NotEqual.response)
+	assert wsgi_call(form(client_id='other')) == (400, pkce.InvalidAuthCode.response)
+	assert wsgi_call(form(redirect_uri='https://a.b/cb?x=\u00e9')) == (400, pkce.InvalidAuthCode.response)
+	assert wsgi_call(form(grant_type='password')) == (400, pkce.InvalidRequestError.response)
+	assert wsgi_call(form(code='nope')) == (400, pkce.InvalidAuthCode.response)
+	assert wsgi_call(form(), content_type='application/json') == (400, pkce.InvalidRequestError.response)
+	assert wsgi_call(form() + b'&pad=' + b'x' * 20000)[0] == 413
+	code = codec.encode(claims)
+	assert wsgi_call(form(code=code))[0] == 200
+	assert wsgi_call(form(code=code)) == (400, pkce.ReusedAuthCode.response)
+
+	async def asgi_app(scope, receive, send):
+		assert (await receive())['body'] == b''
+		await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+		await send({'type': 'http.response.body', 'body': scope['pkce.auth_code']['client_id'].encode()})
+
+	asgi = pkce.ASGITokenMiddleware(asgi_app, codec=codec, admission=pkce.AdmissionControl(client_burst=100))
+
+	async def asgi_call(body):
+		messages = [{'type': 'http.request', 'body': body[i:i + 50], 'more_body': i + 50 < len(body)} for i in range(0, len(body), 50)]
+		sent = []
+
+		async def receive():
+			return messages.pop(0)
+
+		async def send(message):
+			sent.append(message)
+
+		scope = {'type': 'http', 'path': '/token', 'method': 'POST', 'headers': [(b'content-type', b'application/x-www-form-urlencoded')]}
+		await asgi(scope, receive, send)
+		return sent[0]['status'], sent[1]['body']
+
+	async def main():
+		return await asyncio.gather(asgi_call(form()), asgi_call(form(code_verifier=pkce.make_verifier())), asgi_call(form(redirect_uri='\u00e9')))
+
+	(status, body), (bad_status, bad_body), (uri_status, uri_body) = asyncio.run(main())
+	assert (status, body) == (200, b'mrsimple')
+	assert bad_status == 400 and json.loads(bad_body) == pkce.NotEqual.response
+	assert uri_status == 400 and json.loads(uri_body) == pkce.InvalidAuthCode.response
+
+	# a non-ascii redirect_uri in the code matches the same value in the form
+	claims['redirect_uri'] = 'https://a.b/caf\u00e9'
+	assert wsgi_call(form(redirect_uri='https://a.b/caf\u00e9')) == (200, {'client_id': 'mrsimple'})
+
+
+def test_buffered_entropy():
+	import os
+	import threading
+
+	# deterministic mode reproduces the same verifiers, codes and batches
+	results = []
+	for _ in range(2):
+		pkce.configure(entropy=pkce.BufferedEntropy(seed=b'tests', block_size=1024))
+		try:
+			results.append((pkce.make_verifier(), pkce.make_code(), pkce.short_code(), pkce.generate_many(3)[2]))
+		finally:
+			pkce.configure(entropy=False)
+	assert results[0] == results[1]
+	verifier, code, state, pixy = results[0]
+	assert len(verifier) == 128 and len(code) == 43 and len(state) == 32
+	pkce._check_verifier(verifier)
+	assert pkce.solve(*pixy.tuple()) is True
+	assert pkce.get_entropy() is None and pkce.make_verifier() != verifier
+
+	# few syscalls, every byte handed out once across threads
+	entropy = pkce.BufferedEntropy(block_size=4096)
+	chunks = []
+
+	def take():
+		chunks.extend(entropy.take(16) for _ in range(500))
+
+	threads = [threading.Thread(target=take) for _ in range(4)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert len(set(chunks)) == 2000 and entropy.syscalls == 1
+	entropy.reseed()
+	assert entropy.syscalls == 2
+
+	seeded = pkce.BufferedEntropy(seed='fork', block_size=64)
+	parent = seeded.take(16)
+	if hasattr(os, 'fork'):
+		read, write = os.pipe()
+		pid = os.fork()
+		if pid == 0:
+			os.write(write, seeded.take(16) + entropy.take(16))
+			os._exit(0)
+		os.waitpid(pid, 0)
+		child = os.read(read, 32)
+		os.close(read), os.close(write)
+		assert child[:16] != seeded.take(16) and child[16:] != entropy.take(16)
+	assert parent == pkce.BufferedEntropy(seed='fork', block_size=64).take(16)
+
+	try:
+		pkce.configure(entropy='yes')
+		assert False
+	except TypeError:
+		pass